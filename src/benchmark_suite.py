@@ -0,0 +1,377 @@
+"""
+Suíte de benchmark das quatro análises em dados sintéticos de 10k a 10M linhas.
+
+Para cada (pipeline, tamanho):
+
+- o CSV vem de `synthetic.write_csv` com semente fixa e fica em
+  `.cache/synthetic/` (gerar 10M de linhas leva minutos e não entra na conta);
+- o pipeline roda num subprocesso novo, para o pico de memória de um tamanho
+  não herdar o do anterior e os imports não serem contados duas vezes; cada
+  etapa é medida pelo `profiling.Profiler` (tempo de parede, CPU, pico de RSS
+  e memória acrescentada) e o trace vai para `<out>/traces/`;
+- as etapas viram linhas em `<out>/results.csv` com o commit
+  (`git describe --always --dirty`), a data e o caminho do trace, sem apagar
+  execuções anteriores.
+
+As etapas reproduzem o que os notebooks fazem com os módulos de src/
+(cache colunar, dtypes compactos, agregações, índices, grids com cache de
+fold, classificador em streaming, MinHash). Etapas que não escalam (o explode
+do notebook de filmes, o grid de KNN, TF-IDF em memória) têm um limite de
+linhas em `STAGE_LIMITS`; acima dele a etapa aparece como 'pulada'.
+
+`compare` cruza dois commits do results.csv (padrão: os dois últimos) com
+`profiling.compare_traces` em cada (pipeline, tamanho) medido nos dois e sai
+com código 1 se alguma etapa regrediu.
+
+Uso:
+
+    python src/benchmark_suite.py run                      # 4 pipelines x 10k, 100k, 1M
+    python src/benchmark_suite.py run --pipelines heart news --sizes 10000 100000
+    python src/benchmark_suite.py run --sizes 10000000     # 10M (vários GB de disco e RAM)
+    python src/benchmark_suite.py compare                  # dois últimos commits medidos
+    python src/benchmark_suite.py compare abc1234 def5678 --tolerance 0.2
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from synthetic import write_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_OUT = ROOT / 'reports' / 'benchmarks'
+DATA_CACHE = ROOT / '.cache' / 'synthetic'
+
+# Maior número de linhas em que cada etapa ainda roda
+STAGE_LIMITS = {
+    ('news', 'clean_text'): 1_000_000,
+    ('news', 'tfidf'): 1_000_000,
+    ('news', 'MultinomialNB'): 1_000_000,
+    ('news', 'quase-duplicatas'): 1_000_000,
+    ('heart', 'grid KNN'): 100_000,
+    ('heart', 'permutation importance'): 1_000_000,
+    ('imdb', 'explode do notebook'): 1_000_000,
+}
+
+RESULT_COLUMNS = ['commit', 'data', 'pipeline', 'linhas', 'etapa', 'situacao', 'wall_s', 'cpu_s',
+                  'rss_pico_mb', 'rss_extra_mb', 'trace']
+
+
+class Stages:
+    """
+    Abre etapas do profiler respeitando `STAGE_LIMITS`: `enabled(nome)` diz se
+    a etapa roda neste tamanho e anota as puladas.
+    """
+
+    def __init__(self, prof, pipeline, n_rows):
+        self.prof = prof
+        self.pipeline = pipeline
+        self.n_rows = n_rows
+        self.skipped = []
+
+    def enabled(self, name):
+        limit = STAGE_LIMITS.get((self.pipeline, name))
+        if limit is not None and self.n_rows > limit:
+            self.skipped.append(name)
+            return False
+        return True
+
+    def __call__(self, name):
+        return self.prof.stage(name)
+
+
+def run_vehicles(path, stages, workdir):
+    from binned_scatter import binned_scatter
+    from compact_dtypes import optimize_dtypes
+    from dataset_cache import VEHICLE_RECIPE, load_dataset
+    from dedup import duplicated_rows
+    from groupagg import vehicle_tables
+    from sorted_index import PriceQueries, SortedIndex
+
+    with stages('load_dataset (CSV)'):
+        load_dataset(path, VEHICLE_RECIPE, cache_dir=workdir, sep=',')
+    with stages('load_dataset (cache)'):
+        df = load_dataset(path, VEHICLE_RECIPE, cache_dir=workdir, sep=',')
+    with stages('optimize_dtypes'):
+        df, _ = optimize_dtypes(df)
+    with stages('vehicle_tables'):
+        vehicle_tables(df)
+    with stages('duplicated_rows'):
+        duplicated_rows(df)
+    with stages('índice de preço'):
+        queries = PriceQueries(df, SortedIndex.build(df['price']))
+        queries.at_least(90000)
+        queries.top(10)
+        queries.bottom(10)
+    with stages('binned_scatter'):
+        binned_scatter(df['mileage'], df['price'], 2025 - df['year'].to_numpy())
+
+
+def run_news(path, stages, workdir):
+    from dedup import NearDuplicates
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from streaming_text import StreamingTextClassifier, is_test_row
+    from text_preprocess import clean_text
+
+    with stages('read_csv'):
+        df = pd.read_csv(path)
+        texts = (df['Title'].fillna('') + ' ' + df['Description'].fillna('')).tolist()
+        y = df['Class Index'].to_numpy()
+        test = is_test_row(np.arange(len(df)))
+    if stages.enabled('clean_text'):
+        with stages('clean_text'):
+            texts = [clean_text(text) for text in texts]
+    if stages.enabled('tfidf'):
+        with stages('tfidf'):
+            vectorizer = TfidfVectorizer(max_features=50_000, ngram_range=(1, 2), min_df=2)
+            X_train = vectorizer.fit_transform([t for t, keep in zip(texts, test) if not keep])
+            X_test = vectorizer.transform([t for t, keep in zip(texts, test) if keep])
+        if stages.enabled('MultinomialNB'):
+            with stages('MultinomialNB'):
+                MultinomialNB(alpha=0.1).fit(X_train, y[~test]).predict(X_test)
+    del texts
+    with stages('streaming SGD'):
+        clf = StreamingTextClassifier(preprocessor=None, n_features=1 << 18)
+        clf.fit_csv(path, chunksize=50_000)
+        clf.evaluate_csv(path, chunksize=50_000)
+    if stages.enabled('quase-duplicatas'):
+        with stages('quase-duplicatas'):
+            NearDuplicates().update_csv(path, chunksize=50_000).labels()
+
+
+def run_heart(path, stages, workdir):
+    from fold_cache import (HEART_CAT_COLS, HEART_NUM_COLS, FoldCachedGridSearchCV, FoldPreprocessCache,
+                            benchmark_grids, heart_preprocess)
+    from perm_importance import batched_permutation_importance
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.pipeline import Pipeline
+
+    with stages('read_csv'):
+        df = pd.read_csv(path)
+        X, y = df.drop(columns='target'), df['target']
+    preprocess = heart_preprocess(HEART_CAT_COLS, HEART_NUM_COLS)
+    with stages('FoldPreprocessCache'):
+        folds = FoldPreprocessCache(preprocess, X, y, StratifiedKFold(5, shuffle=True, random_state=42),
+                                    memmap_dir=workdir)
+    best = None
+    for name, model, grid in benchmark_grids():
+        stage = f'grid {name}'
+        if not stages.enabled(stage):
+            continue
+        with stages(stage):
+            search = FoldCachedGridSearchCV(Pipeline([('preprocess', preprocess), ('model', model)]), grid,
+                                            folds, scoring='f1').fit(X, y)
+        if name == 'LogisticRegression':
+            best = search.best_estimator_
+    folds.close()
+    if stages.enabled('permutation importance'):
+        with stages('permutation importance'):
+            batched_permutation_importance(best, X, y, scoring='f1', n_repeats=5, random_state=42)
+
+
+def run_imdb(path, stages, workdir):
+    from dataset_cache import IMDB_RECIPE, load_dataset
+    from multivalue import encode_columns, genre_roi, notebook_aggregations
+
+    with stages('load_dataset (CSV)'):
+        df = load_dataset(path, IMDB_RECIPE, cache_dir=workdir)
+    with stages('encode_columns'):
+        encoded = encode_columns(df)
+    genres = encoded['genre']
+    with stages('genre_roi'):
+        genre_roi(genres, df['budget'], df['gross_world_wide'])
+    with stages('indicações por gênero'):
+        genres.group_sum(df['nomination'])
+    with stages('contagens por lista'):
+        for column in encoded.values():
+            column.value_counts()
+    if stages.enabled('explode do notebook'):
+        with stages('explode do notebook'):
+            notebook_aggregations(df)
+
+
+PIPELINES = {
+    'vehicles': run_vehicles,
+    'news': run_news,
+    'heart': run_heart,
+    'imdb': run_imdb,
+}
+
+
+def git_commit(cwd=ROOT):
+    try:
+        out = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=cwd, capture_output=True,
+                             text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+    return out.stdout.strip()
+
+
+def dataset_path(name, n_rows, seed=0, cache_dir=DATA_CACHE):
+    """
+    CSV sintético de `name` com `n_rows` linhas, gerado só na primeira vez.
+    """
+    path = Path(cache_dir) / f'{name}-{n_rows}-s{seed}.csv'
+    if not path.exists():
+        start = time.perf_counter()
+        write_csv(name, path, n_rows, seed)
+        print(f'  gerado {path.name} em {time.perf_counter() - start:.1f}s', file=sys.stderr)
+    return path
+
+
+def run_pipeline(name, path, n_rows, trace_dir, commit):
+    """
+    Roda um pipeline sob o profiler (no processo atual) e grava o trace.
+    """
+    from profiling import Profiler
+    from streaming_text import peak_rss_mb
+
+    prof = Profiler(f'{name}-{n_rows}-{commit}', trace_dir=trace_dir)
+    stages = Stages(prof, name, n_rows)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='benchmark_suite_') as workdir:
+        PIPELINES[name](path, stages, workdir)
+    return {'trace': str(prof.save()), 'puladas': stages.skipped, 'total_s': time.perf_counter() - start,
+            'pico_rss_mb': peak_rss_mb()}
+
+
+def _result_rows(name, n_rows, commit, result):
+    from profiling import aggregate, load_trace
+
+    table = aggregate(load_trace(result['trace']))
+    table = table[~table['caminho'].str.contains(';')]
+    rows = pd.DataFrame({
+        'etapa': table['caminho'], 'situacao': 'ok', 'wall_s': table['wall_s'], 'cpu_s': table['cpu_s'],
+        'rss_pico_mb': table['rss_pico_mb'], 'rss_extra_mb': table['rss_extra_mb'],
+    })
+    extra = [{'etapa': stage, 'situacao': 'pulada'} for stage in result['puladas']]
+    extra.append({'etapa': 'total', 'situacao': 'ok', 'wall_s': result['total_s'],
+                  'rss_pico_mb': result['pico_rss_mb']})
+    rows = pd.concat([rows, pd.DataFrame(extra)], ignore_index=True)
+    rows.insert(0, 'linhas', n_rows)
+    rows.insert(0, 'pipeline', name)
+    rows.insert(0, 'data', datetime.now().isoformat(timespec='seconds'))
+    rows.insert(0, 'commit', commit)
+    rows['trace'] = result['trace']
+    return rows[RESULT_COLUMNS]
+
+
+def append_results(rows, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows.to_csv(path, mode='a', header=not path.exists(), index=False)
+
+
+def run_suite(pipelines=tuple(PIPELINES), sizes=DEFAULT_SIZES, out=DEFAULT_OUT, seed=0, data_dir=DATA_CACHE):
+    """
+    Cada (pipeline, tamanho) num subprocesso; acrescenta as etapas ao
+    `<out>/results.csv` e devolve o DataFrame desta execução e o número de falhas.
+    """
+    out = Path(out)
+    commit = git_commit()
+    frames, failures = [], 0
+    for n_rows in sizes:
+        for name in pipelines:
+            print(f'{name} {n_rows:,} linhas', file=sys.stderr)
+            path = dataset_path(name, n_rows, seed, data_dir)
+            proc = subprocess.run(
+                [sys.executable, __file__, '_single', name, str(path), str(n_rows), str(out / 'traces'), commit],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                failures += 1
+                print(f'  falhou:\n{proc.stderr}', file=sys.stderr)
+                continue
+            rows = _result_rows(name, n_rows, commit, json.loads(proc.stdout.strip().splitlines()[-1]))
+            append_results(rows, out / 'results.csv')
+            frames.append(rows)
+    results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=RESULT_COLUMNS)
+    return results, failures
+
+
+def compare_commits(results_path, before=None, after=None, tolerance=0.2, min_seconds=0.05, min_mb=10.0):
+    """
+    `compare_traces` entre o trace mais recente de cada (pipeline, tamanho)
+    em `before` e em `after` (padrão: os dois últimos commits do arquivo).
+    """
+    from profiling import compare_traces, load_trace
+
+    results = pd.read_csv(results_path)
+    results = results[results['situacao'] == 'ok']
+    commits = list(dict.fromkeys(results['commit']))
+    if before is None or after is None:
+        if len(commits) < 2:
+            raise ValueError(f'{results_path} tem menos de dois commits medidos')
+        before, after = commits[-2:]
+    latest = results.drop_duplicates(['commit', 'pipeline', 'linhas'], keep='last').set_index(
+        ['commit', 'pipeline', 'linhas'])['trace']
+    tables = []
+    for (commit, name, n_rows), trace in latest.items():
+        if commit != before or (after, name, n_rows) not in latest.index:
+            continue
+        table = compare_traces(load_trace(trace), load_trace(latest[(after, name, n_rows)]), tolerance,
+                               min_seconds, min_mb)
+        table.insert(0, 'linhas', n_rows)
+        table.insert(0, 'pipeline', name)
+        tables.append(table)
+    if not tables:
+        raise ValueError(f'nenhum (pipeline, tamanho) medido em {before} e em {after}')
+    return before, after, pd.concat(tables, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das análises em dados sintéticos.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='mede os pipelines e acrescenta ao results.csv')
+    run.add_argument('--pipelines', nargs='+', choices=sorted(PIPELINES), default=list(PIPELINES))
+    run.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES))
+    run.add_argument('--out', default=str(DEFAULT_OUT))
+    run.add_argument('--seed', type=int, default=0)
+
+    compare = sub.add_parser('compare', help='regressões entre dois commits do results.csv')
+    compare.add_argument('before', nargs='?')
+    compare.add_argument('after', nargs='?')
+    compare.add_argument('--out', default=str(DEFAULT_OUT))
+    compare.add_argument('--tolerance', type=float, default=0.2)
+    compare.add_argument('--min-seconds', type=float, default=0.05)
+    compare.add_argument('--min-mb', type=float, default=10.0)
+
+    single = sub.add_parser('_single')
+    single.add_argument('name', choices=sorted(PIPELINES))
+    single.add_argument('path')
+    single.add_argument('rows', type=int)
+    single.add_argument('trace_dir')
+    single.add_argument('commit')
+    args = parser.parse_args()
+
+    if args.command == '_single':
+        print(json.dumps(run_pipeline(args.name, args.path, args.rows, args.trace_dir, args.commit)))
+    elif args.command == 'run':
+        results, failures = run_suite(args.pipelines, args.sizes, args.out, args.seed)
+        table = results.pivot_table(index=['pipeline', 'etapa'], columns='linhas', values='wall_s', sort=False)
+        print(table.to_string(float_format='{:.2f}'.format, na_rep='-'))
+        print(f"\nresultados em {Path(args.out) / 'results.csv'}")
+        sys.exit(1 if failures else 0)
+    else:
+        before, after, table = compare_commits(Path(args.out) / 'results.csv', args.before, args.after,
+                                               args.tolerance, args.min_seconds, args.min_mb)
+        print(f'antes: {before}\ndepois: {after}\n')
+        print(table.to_string(index=False, float_format='{:.3f}'.format))
+        regressions = table['regressao'].str.contains('tempo|memória')
+        print(f'\n{int(regressions.sum())} etapa(s) com regressão')
+        sys.exit(1 if regressions.any() else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Gráfico de dispersão agregado (preço x quilometragem x idade) sem amostragem.
+
+O gráfico do vehicle-notebook.py sorteia 5.000 linhas (`df.sample`) e passa
+os pontos para `sns.scatterplot` e `sns.regplot`. Com milhões de linhas ou se
+joga fora quase tudo, ou o desenho fica inviável (e o regplot ainda faz
+bootstrap do intervalo de confiança). Aqui o gráfico é exato para todas as
+linhas e o custo é linear e pequeno:
+
+- `BinnedScatter` divide o plano (quilometragem, preço) numa grade fixa e
+  acumula, por célula, a contagem e a soma da idade (`np.bincount` sobre o
+  índice da célula, o mesmo cálculo do `np.histogram2d` com pesos, sem
+  ordenar nada); a cor da célula é a idade média;
+- `RegressionMoments` guarda as estatísticas suficientes da regressão
+  (n, médias, Sxx, Syy, Sxy), mescladas por lote pela fórmula de Chan como
+  o M2 de `materialized.py`; a reta e a faixa de 95% saem em forma fechada
+  e coincidem com o ajuste por mínimos quadrados sobre todas as linhas;
+- os dados podem vir em pedaços (`update` por lote, ou direto do CSV com
+  `binned_scatter_csv`), então a memória não cresce com a base.
+
+Uso:
+
+    from binned_scatter import binned_scatter, draw_binned_scatter
+
+    binned = binned_scatter(df['mileage'], df['price'], 2025 - df['year'])
+    fig, ax = plt.subplots(figsize=(12, 6))
+    draw_binned_scatter(ax, binned)
+
+Benchmark (amostra + scatterplot/regplot vs. agregado, base replicada):
+
+    python src/binned_scatter.py data/vehicle_price_prediction.csv --rows 1000000 5000000
+"""
+
+import argparse
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BINS = (120, 60)
+CHUNK_SIZE = 1_000_000
+
+
+class RegressionMoments:
+    """
+    Estatísticas suficientes da regressão linear simples de y em x,
+    mescláveis entre lotes.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+
+    def merge(self, n, mean_x, mean_y, sxx, syy, sxy):
+        if n == 0:
+            return self
+        total = self.n + n
+        dx = mean_x - self.mean_x
+        dy = mean_y - self.mean_y
+        weight = self.n * n / total
+        self.sxx += sxx + dx * dx * weight
+        self.syy += syy + dy * dy * weight
+        self.sxy += sxy + dx * dy * weight
+        self.mean_x += dx * n / total
+        self.mean_y += dy * n / total
+        self.n = total
+        return self
+
+    def update(self, x, y):
+        """
+        Acrescenta um lote de pares (x, y) já sem NaN.
+        """
+        if len(x) == 0:
+            return self
+        mean_x, mean_y = x.mean(), y.mean()
+        dx, dy = x - mean_x, y - mean_y
+        return self.merge(len(x), mean_x, mean_y, dx @ dx, dy @ dy, dx @ dy)
+
+    @property
+    def slope(self):
+        return self.sxy / self.sxx
+
+    @property
+    def intercept(self):
+        return self.mean_y - self.slope * self.mean_x
+
+    def band(self, grid, level=0.95):
+        """
+        Reta ajustada e intervalo de confiança da média em `grid` (a faixa
+        que o `sns.regplot` estima por bootstrap).
+        """
+        from scipy import stats
+
+        grid = np.asarray(grid, dtype=np.float64)
+        fit = self.intercept + self.slope * grid
+        sse = max(self.syy - self.sxy ** 2 / self.sxx, 0.0)
+        s = np.sqrt(sse / (self.n - 2))
+        half = stats.t.ppf((1 + level) / 2, self.n - 2) * s * np.sqrt(1 / self.n + (grid - self.mean_x) ** 2 / self.sxx)
+        return {'x': grid, 'y': fit, 'lo': fit - half, 'hi': fit + half}
+
+
+class BinnedScatter:
+    """
+    Grade (x, y) com contagem e soma da variável de cor por célula, mais os
+    momentos da regressão de y em x sobre todas as linhas.
+    """
+
+    def __init__(self, x_range, y_range, bins=DEFAULT_BINS):
+        self.x_edges = np.linspace(x_range[0], x_range[1], bins[0] + 1)
+        self.y_edges = np.linspace(y_range[0], y_range[1], bins[1] + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.color_sum = np.zeros(bins, dtype=np.float64)
+        self.moments = RegressionMoments()
+
+    @property
+    def bins(self):
+        return self.counts.shape
+
+    def _cells(self, values, edges):
+        # Busca nas bordas, como o np.histogram2d: a conta (v - lo) * n / span arredonda
+        # valores logo abaixo de uma borda para o intervalo seguinte (ou para fora da grade)
+        n_bins = len(edges) - 1
+        idx = np.searchsorted(edges, values, side='right') - 1
+        # A borda direita entra no último intervalo
+        idx[values == edges[-1]] = n_bins - 1
+        inside = (values >= edges[0]) & (values <= edges[-1])
+        return np.clip(idx, 0, n_bins - 1), inside
+
+    def update(self, x, y, color):
+        """
+        Acrescenta um lote. Linhas com x ou y ausente ficam de fora; linhas
+        sem cor entram só na regressão.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        color = np.asarray(color, dtype=np.float64)
+        pair = ~np.isnan(x) & ~np.isnan(y)
+        x, y, color = x[pair], y[pair], color[pair]
+        self.moments.update(x, y)
+
+        ix, in_x = self._cells(x, self.x_edges)
+        iy, in_y = self._cells(y, self.y_edges)
+        keep = in_x & in_y & ~np.isnan(color)
+        flat = ix[keep] * self.bins[1] + iy[keep]
+        size = self.counts.size
+        self.counts += np.bincount(flat, minlength=size).reshape(self.bins)
+        self.color_sum += np.bincount(flat, weights=color[keep], minlength=size).reshape(self.bins)
+        return self
+
+    def mean_color(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.counts > 0, self.color_sum / self.counts, np.nan)
+
+
+def _range(values):
+    values = np.asarray(values, dtype=np.float64)
+    return float(np.nanmin(values)), float(np.nanmax(values))
+
+
+def binned_scatter(x, y, color, bins=DEFAULT_BINS, x_range=None, y_range=None, chunk_size=CHUNK_SIZE):
+    """
+    `BinnedScatter` de arrays em memória, processados em lotes de `chunk_size`.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    color = np.asarray(color, dtype=np.float64)
+    binned = BinnedScatter(x_range or _range(x), y_range or _range(y), bins)
+    for start in range(0, len(x), chunk_size):
+        stop = start + chunk_size
+        binned.update(x[start:stop], y[start:stop], color[start:stop])
+    return binned
+
+
+def binned_scatter_csv(path, bins=DEFAULT_BINS, x_range=None, y_range=None, current_year=2025,
+                       chunk_size=CHUNK_SIZE):
+    """
+    Mesmo gráfico lendo o CSV de veículos em pedaços. Sem as faixas dos
+    eixos, uma primeira passada calcula mínimo e máximo.
+    """
+    columns = ['mileage', 'price', 'year']
+
+    def chunks():
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+            yield (pd.to_numeric(chunk['mileage'], errors='coerce').to_numpy(dtype=np.float64),
+                   pd.to_numeric(chunk['price'], errors='coerce').to_numpy(dtype=np.float64),
+                   current_year - pd.to_numeric(chunk['year'], errors='coerce').to_numpy(dtype=np.float64))
+
+    if x_range is None or y_range is None:
+        lo = np.array([np.inf, np.inf])
+        hi = -lo
+        for x, y, _ in chunks():
+            lo = np.fmin(lo, [np.nanmin(x, initial=np.inf), np.nanmin(y, initial=np.inf)])
+            hi = np.fmax(hi, [np.nanmax(x, initial=-np.inf), np.nanmax(y, initial=-np.inf)])
+        x_range = x_range or (lo[0], hi[0])
+        y_range = y_range or (lo[1], hi[1])
+    binned = BinnedScatter(x_range, y_range, bins)
+    for x, y, age in chunks():
+        binned.update(x, y, age)
+    return binned
+
+
+def draw_binned_scatter(ax, binned, cmap='RdBu_r', color_label='Idade média (anos)', line=True):
+    """
+    Células coloridas pela média da cor (vazias em branco), reta de
+    regressão e faixa de 95% sobre todas as linhas.
+    """
+    mean = np.ma.masked_invalid(binned.mean_color())
+    mesh = ax.pcolormesh(binned.x_edges, binned.y_edges, mean.T, cmap=cmap, shading='flat')
+    ax.figure.colorbar(mesh, ax=ax, label=color_label)
+    if line and binned.moments.n > 2:
+        band = binned.moments.band(np.linspace(binned.x_edges[0], binned.x_edges[-1], 100))
+        ax.plot(band['x'], band['y'], color='black', linewidth=1)
+        ax.fill_between(band['x'], band['lo'], band['hi'], color='black', alpha=0.15, linewidth=0)
+    return mesh
+
+
+def replicate_vehicles(df, n_rows, seed=0):
+    """
+    (mileage, price, year) reamostrados até `n_rows` linhas, com ruído pequeno.
+    """
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(df), n_rows)
+    mileage = df['mileage'].to_numpy(dtype=np.float64)[idx] + rng.normal(0, 500, n_rows)
+    price = df['price'].to_numpy(dtype=np.float64)[idx] * rng.normal(1, 0.02, n_rows)
+    year = df['year'].to_numpy(dtype=np.float64)[idx]
+    return mileage.clip(min=0), price, year
+
+
+def _save_png(fig):
+    from matplotlib import pyplot as plt
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    plt.close(fig)
+    return buffer.tell()
+
+
+def _sample_chart(mileage, price, age, n=5000, random_state=42):
+    # O gráfico do notebook: amostra + scatterplot + regplot
+    import seaborn as sns
+    from matplotlib import pyplot as plt
+
+    sample = pd.DataFrame({'mileage': mileage, 'price': price, 'age': age}).sample(
+        min(n, len(mileage)), random_state=random_state)
+    fig = plt.figure(figsize=(12, 6))
+    sns.scatterplot(data=sample, x='mileage', y='price', hue='age', palette='RdBu_r', alpha=0.6)
+    sns.regplot(data=sample, x='mileage', y='price', scatter=False, color='black', line_kws={'linewidth': 1})
+    _save_png(fig)
+    return np.polyfit(sample['mileage'], sample['price'], 1)[0]
+
+
+def _binned_chart(mileage, price, age):
+    from matplotlib import pyplot as plt
+
+    binned = binned_scatter(mileage, price, age)
+    fig, ax = plt.subplots(figsize=(12, 6))
+    draw_binned_scatter(ax, binned)
+    _save_png(fig)
+    return binned
+
+
+def check_edges(x_range=(-281912.26, 464081.42), y_range=(0.0, 1.0), bins=(30, 30)):
+    """
+    Confere a grade contra o `np.histogram2d` com valores nas bordas e um ulp
+    abaixo delas (antes caíam na célula seguinte ou fora da grade).
+    """
+    binned = BinnedScatter(x_range, y_range, bins)
+    x = np.concatenate([binned.x_edges, np.nextafter(binned.x_edges, -np.inf), np.nextafter(binned.x_edges, np.inf)])
+    y = np.resize(np.concatenate([binned.y_edges, np.nextafter(binned.y_edges, -np.inf)]), len(x))
+    binned.update(x, y, np.ones(len(x)))
+    expected, _, _ = np.histogram2d(x, y, bins=[binned.x_edges, binned.y_edges])
+    if not np.array_equal(binned.counts, expected):
+        raise AssertionError('Grade diferente do np.histogram2d nas bordas')
+
+
+def benchmark(df, sizes, current_year=2025):
+    """
+    Tempo do gráfico por amostra (notebook) vs. agregado, e erro da
+    inclinação de cada um contra o ajuste exato sobre todas as linhas.
+    """
+    import matplotlib
+
+    matplotlib.use('Agg')
+    rows = []
+    for n_rows in sizes:
+        mileage, price, year = replicate_vehicles(df, n_rows)
+        age = current_year - year
+        exact_slope = np.polyfit(mileage, price, 1)[0]
+
+        start = time.perf_counter()
+        sample_slope = _sample_chart(mileage, price, age)
+        sample_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        binned = _binned_chart(mileage, price, age)
+        binned_s = time.perf_counter() - start
+
+        rows.append({
+            'linhas': n_rows,
+            'amostra_s': sample_s,
+            'agregado_s': binned_s,
+            'celulas_ocupadas': int((binned.counts > 0).sum()),
+            'linhas_no_grafico_amostra': min(5000, n_rows),
+            'linhas_no_grafico_agregado': int(binned.counts.sum()),
+            'erro_incl_amostra': abs(sample_slope - exact_slope) / abs(exact_slope),
+            'erro_incl_agregado': abs(binned.moments.slope - exact_slope) / abs(exact_slope),
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dispersão agregada vs. amostra (preço x quilometragem x idade).')
+    parser.add_argument('path', help='vehicle_price_prediction.csv')
+    parser.add_argument('--rows', type=int, nargs='+', default=[200_000, 1_000_000, 5_000_000])
+    args = parser.parse_args()
+
+    check_edges()
+    df = pd.read_csv(args.path, usecols=['mileage', 'price', 'year'])
+    with pd.option_context('display.float_format', '{:.3g}'.format):
+        print(benchmark(df, args.rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Partes comuns dos substitutos do `GridSearchCV` que avaliam candidatos sobre
+matrizes em cache (`feature_cache.CachedGridSearchCV`,
+`fold_cache.FoldCachedGridSearchCV` e, por herança, `halving_search`).
+
+- `fit_and_score` / `shared_scores`: notas de um candidato, ou de vários
+  candidatos que compartilham um ajuste (`ann_index.shared_neighbor_scores`,
+  `regularization_path.path_scores`), sempre como {métrica: nota} (um scorer
+  simples vira {'score': nota});
+- `CachedSearchCV.store_results` monta `cv_results_` (split/mean/std/rank por
+  métrica, como o `GridSearchCV`), escolhe o melhor candidato pela métrica do
+  `refit` e reajusta o Pipeline no treino completo;
+- `params_key`: chave hashable de um dicionário de parâmetros, para agrupar
+  candidatos.
+"""
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import check_scoring
+
+
+def params_key(params):
+    return tuple(sorted((k, repr(v)) for k, v in params.items()))
+
+
+def as_metrics(scores):
+    return scores if isinstance(scores, dict) else {'score': scores}
+
+
+def fit_and_score(estimator, X_train, y_train, X_valid, y_valid, scorer):
+    estimator.fit(X_train, y_train)
+    return as_metrics(scorer(estimator, X_valid, y_valid))
+
+
+def shared_scores(func, model, param_list, X_train, y_train, X_valid, y_valid, scorer):
+    scores = func(model, param_list, X_train, y_train, X_valid, y_valid, scorer)
+    return [as_metrics(s) for s in scores]
+
+
+def stack_scores(scores, n_candidates, n_splits):
+    """
+    Lista de {métrica: nota} em ordem candidato x fold -> {métrica: array
+    (candidatos, folds)}.
+    """
+    return {metric: np.array([s[metric] for s in scores], dtype=np.float64).reshape(n_candidates, n_splits)
+            for metric in scores[0]}
+
+
+def rank_scores(mean):
+    # Empates recebem o mesmo posto e NaN fica por último, como no GridSearchCV
+    ranked = np.where(np.isnan(mean), -np.inf, mean)
+    return np.array([1 + int((ranked > value).sum()) for value in ranked], dtype=np.int32)
+
+
+class CachedSearchCV:
+    """
+    Resultados, refit e predição comuns às buscas em cache. As subclasses
+    definem `estimator`, `scoring` e `refit` e chamam `store_results`.
+    """
+
+    @property
+    def refit_metric(self):
+        return self.refit if isinstance(self.refit, str) else 'score'
+
+    def store_results(self, candidates, scores, X, y):
+        """
+        `scores`: {métrica: array (candidatos, folds)}.
+        """
+        self.cv_results_ = {'params': candidates}
+        for metric, split in scores.items():
+            mean = split.mean(axis=1)
+            for fold in range(split.shape[1]):
+                self.cv_results_[f'split{fold}_test_{metric}'] = split[:, fold]
+            self.cv_results_[f'mean_test_{metric}'] = mean
+            self.cv_results_[f'std_test_{metric}'] = split.std(axis=1)
+            self.cv_results_[f'rank_test_{metric}'] = rank_scores(mean)
+
+        key = self.refit_metric
+        self.best_index_ = int(np.argmin(self.cv_results_[f'rank_test_{key}']))
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = float(self.cv_results_[f'mean_test_{key}'][self.best_index_])
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, y):
+        scorer = check_scoring(self.best_estimator_, scoring=self.scoring)
+        return as_metrics(scorer(self.best_estimator_, X, y))[self.refit_metric]
@@ -0,0 +1,166 @@
+"""
+Otimização automática de tipos (dtypes) de um DataFrame.
+
+Depois do `read_csv`, textos ficam como `object` e números como int64/float64,
+o que deixa todos os `groupby` seguintes mais caros. `optimize_dtypes`:
+
+- converte textos de baixa cardinalidade em `category`;
+- reduz inteiros para a menor largura que comporta o intervalo da coluna;
+- reduz floats para float32 somente quando a conversão não perde nenhum valor;
+
+e devolve um relatório de memória antes/depois por coluna.
+
+`check_aggregates` roda as agregações do notebook de veículos nas duas versões
+do DataFrame e confirma que os resultados são idênticos.
+
+Uso:
+
+    from compact_dtypes import optimize_dtypes, check_aggregates
+
+    df_otimizado, relatorio = optimize_dtypes(df)
+    display(relatorio)
+    check_aggregates(df, df_otimizado)
+"""
+
+import numpy as np
+import pandas as pd
+
+# Texto vira categoria quando tem no máximo esta fração de valores únicos
+MAX_CATEGORY_RATIO = 0.5
+
+
+def _downcast_int(series):
+    if series.empty:
+        return series
+    lo, hi = series.min(), series.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return series.astype(dtype)
+    return series
+
+
+def _downcast_float(series):
+    # Só aceita float32 se todos os valores (incluindo NaN) voltam idênticos
+    values = series.to_numpy()
+    small = values.astype(np.float32)
+    if np.array_equal(small.astype(values.dtype), values, equal_nan=True):
+        return series.astype(np.float32)
+    return series
+
+
+def optimize_dtypes(df, max_category_ratio=MAX_CATEGORY_RATIO, exclude=()):
+    """
+    Devolve (DataFrame otimizado, relatório de memória por coluna).
+
+    Colunas em `exclude` são mantidas como estão. Inteiros são sempre reduzidos
+    para tipos com sinal: contas como `2025 - df['year']` continuam seguras.
+    """
+    out = {}
+    rows = []
+    n = len(df)
+    for col in df.columns:
+        series = df[col]
+        before = series.dtype
+        if col not in exclude:
+            kind = series.dtype.kind
+            if kind in 'iu':
+                series = _downcast_int(series)
+            elif kind == 'f':
+                series = _downcast_float(series)
+            elif kind == 'O' and n and series.nunique(dropna=True) <= max_category_ratio * n:
+                series = series.astype('category')
+        out[col] = series
+        rows.append({
+            'coluna': col,
+            'tipo_antes': str(before),
+            'tipo_depois': str(series.dtype),
+            'bytes_antes': int(df[col].memory_usage(index=False, deep=True)),
+            'bytes_depois': int(series.memory_usage(index=False, deep=True)),
+        })
+
+    optimized = pd.DataFrame(out, index=df.index)
+    report = pd.DataFrame(rows).set_index('coluna')
+    total = report[['bytes_antes', 'bytes_depois']].sum()
+    report.loc['TOTAL'] = ['', '', total['bytes_antes'], total['bytes_depois']]
+    report['reducao_%'] = (1 - report['bytes_depois'] / report['bytes_antes'].replace(0, np.nan)) * 100
+    return optimized, report
+
+
+# ---------------------------------------------------------------------------
+# Agregações do notebook de veículos (src/vehicle-notebook.py)
+# ---------------------------------------------------------------------------
+
+def _fuel_groups(df):
+    df = df[df['year'] >= 2000].dropna(subset=['year', 'price', 'fuel_type'])
+    bins = np.arange(2000, int(df['year'].max()) + 5, 4)
+    labels = [f"{b}-{b+3}" for b in bins[:-1]]
+    group = pd.cut(df['year'], bins=bins, labels=labels, right=False)
+    # observed=False como na tabela combustível x período do notebook (combinações vazias = NaN)
+    return df.groupby([df['fuel_type'], group], observed=False)['price'].mean()
+
+
+VEHICLE_AGGREGATES = {
+    'describe': lambda df: df.describe(),
+    'nunique': lambda df: df.nunique(),
+    'duplicados': lambda df: df.duplicated().sum(),
+    'carros_por_ano': lambda df: df['year'].value_counts().sort_index(),
+    'preco_medio_por_ano': lambda df: df.groupby('year')['price'].mean().sort_index(),
+    'preco_marca_donos': lambda df: df.groupby(['make', 'owner_count'], observed=True)['price'].mean(),
+    'preco_medio_marca': lambda df: (
+        df.groupby('make', observed=True)['price'].mean().sort_values(ascending=False)
+    ),
+    'preco_acidentes': lambda df: (
+        df.groupby('accident_history', observed=True)['price'].agg(['mean', 'median', 'count'])
+    ),
+    'preco_medio_carroceria': lambda df: (
+        df.groupby('body_type', observed=True)['price'].mean().sort_values(ascending=False)
+    ),
+    'preco_combustivel_periodo': _fuel_groups,
+    'acima_90k': lambda df: df.loc[df['price'] >= 90000].index,
+}
+
+
+def _as_comparable(result):
+    # Remove diferenças só de tipo (categoria vs. texto, int16 vs. int64) antes de comparar
+    if isinstance(result, pd.Index):
+        return pd.Index(np.asarray(result))
+    if isinstance(result, (pd.Series, pd.DataFrame)):
+        result = result.copy()
+        if isinstance(result.index, pd.MultiIndex):
+            levels = [result.index.get_level_values(i) for i in range(result.index.nlevels)]
+            result.index = pd.MultiIndex.from_arrays(
+                [np.asarray(level).astype(object) for level in levels],
+                names=result.index.names,
+            )
+        else:
+            result.index = pd.Index(np.asarray(result.index).astype(object), name=result.index.name)
+        return result.astype('float64')
+    return result
+
+
+def check_aggregates(before, after, aggregates=None, raise_on_diff=True):
+    """
+    Compara cada agregação em `before` e `after`. Devolve um DataFrame com o
+    status de cada uma; com `raise_on_diff=True` levanta AssertionError na
+    primeira diferença.
+    """
+    aggregates = VEHICLE_AGGREGATES if aggregates is None else aggregates
+    status = []
+    for name, func in aggregates.items():
+        left, right = _as_comparable(func(before)), _as_comparable(func(after))
+        try:
+            if isinstance(left, pd.DataFrame):
+                pd.testing.assert_frame_equal(left, right, check_exact=True)
+            elif isinstance(left, pd.Series):
+                pd.testing.assert_series_equal(left, right, check_exact=True)
+            elif isinstance(left, pd.Index):
+                pd.testing.assert_index_equal(left, right, exact=False)
+            else:
+                assert left == right, f'{left} != {right}'
+            status.append({'agregacao': name, 'identica': True, 'detalhe': ''})
+        except AssertionError as exc:
+            if raise_on_diff:
+                raise AssertionError(f"Agregação '{name}' mudou após otimizar os tipos:\n{exc}") from exc
+            status.append({'agregacao': name, 'identica': False, 'detalhe': str(exc).splitlines()[0]})
+    return pd.DataFrame(status)
@@ -0,0 +1,295 @@
+"""
+Cache em disco do texto pré-processado do AG News.
+
+Cada documento é identificado pelo hash do texto (BLAKE2b de 16 bytes) e o
+cache inteiro pela impressão digital da configuração do pré-processamento
+(`TextPreprocessor.fingerprint()`: stopwords, incluindo as do domínio,
+lematização vs. stemming e tokenizador). Mudou a configuração, muda o
+diretório; mudou um texto, muda só a chave daquele documento. Numa execução
+quente apenas as linhas novas ou alteradas passam pelo pré-processamento.
+
+Layout de `<cache_dir>/corpus-<fingerprint>/`:
+- `seg-NNNNN/`: segmentos, um por execução que processou documentos novos,
+  cada um com `keys.npy` (hashes ordenados, dtype S16, para busca binária) e
+  `texts.offsets.npy` + `texts.data.npy` (textos processados na mesma ordem,
+  como deslocamentos + um buffer UTF-8 concatenado, o formato de
+  `dataset_cache.write_strings`), abertos com `mmap_mode='r'`;
+- `meta.json`: configuração, segmentos e número de documentos.
+
+Acrescentar documentos grava só um segmento novo (custo proporcional às
+linhas novas, não ao cache); a busca percorre os segmentos. Passando de
+`MAX_SEGMENTS`, todos são compactados num só, então o custo de regravar o
+cache inteiro aparece de vez em quando e não a cada execução.
+
+Uso no notebook:
+
+    from text_preprocess import TextPreprocessor
+    from corpus_cache import preprocess_corpus
+
+    preprocessor = TextPreprocessor(stop_words=stop_words, use_lemmatization=True)
+    df['processed_text'] = preprocess_corpus(df['text'], preprocessor, '../data/.cache', n_jobs=-1)
+
+Benchmark de execução fria, quente e parcial:
+
+    python src/corpus_cache.py data/agnews.csv
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from dataset_cache import CACHE_DIRNAME, write_strings
+
+CORPUS_CACHE_VERSION = 2
+KEY_DTYPE = 'S16'
+MAX_SEGMENTS = 8
+
+
+def text_hashes(texts):
+    """
+    Hash de 16 bytes de cada texto, como array `S16`.
+    """
+    return np.array(
+        [hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest() for text in texts],
+        dtype=KEY_DTYPE,
+    )
+
+
+def corpus_cache_dir(preprocessor, cache_dir):
+    fingerprint = hashlib.sha256(
+        f'{CORPUS_CACHE_VERSION}:{preprocessor.fingerprint()}'.encode('utf-8')
+    ).hexdigest()
+    return Path(cache_dir) / f'corpus-{fingerprint[:16]}'
+
+
+class _Segment:
+    """
+    Um segmento do cache: hashes ordenados + textos, mapeados em memória.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.keys = np.load(self.directory / 'keys.npy', mmap_mode='r')
+        self.offsets = np.load(self.directory / 'texts.offsets.npy', mmap_mode='r')
+        self.data = np.load(self.directory / 'texts.data.npy', mmap_mode='r')
+
+    @staticmethod
+    def write(directory, keys, texts):
+        order = np.argsort(keys, kind='stable')
+        tmp = Path(tempfile.mkdtemp(prefix=directory.name + '.tmp', dir=directory.parent))
+        np.save(tmp / 'keys.npy', keys[order])
+        write_strings(str(tmp / 'texts'), [texts[i] for i in order])
+        os.replace(tmp, directory)
+
+    def lookup(self, hashes):
+        if not len(self.keys):
+            return np.zeros(len(hashes), dtype=bool), np.zeros(len(hashes), dtype=np.int64)
+        pos = np.searchsorted(self.keys, hashes)
+        pos = np.minimum(pos, len(self.keys) - 1)
+        return self.keys[pos] == hashes, pos
+
+    def get(self, positions):
+        starts = self.offsets[positions].tolist()
+        ends = self.offsets[np.asarray(positions) + 1].tolist()
+        data = self.data
+        return [bytes(data[a:b]).decode('utf-8') for a, b in zip(starts, ends)]
+
+
+class CorpusCache:
+    """
+    Tabela hash do texto -> texto processado, persistida num diretório como
+    uma lista de segmentos.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        meta_path = self.directory / 'meta.json'
+        if meta_path.exists():
+            self.meta = json.loads(meta_path.read_text())
+        else:
+            self.meta = {'version': CORPUS_CACHE_VERSION, 'n_docs': 0, 'segments': [], 'next_segment': 0,
+                         'config': None}
+        self.segments = [_Segment(self.directory / name) for name in self.meta['segments']]
+
+    def __len__(self):
+        return sum(len(segment.keys) for segment in self.segments)
+
+    def lookup(self, hashes):
+        """
+        (encontrado, segmento, posição no segmento) de cada hash do cache.
+        """
+        hashes = np.asarray(hashes, dtype=KEY_DTYPE)
+        found = np.zeros(len(hashes), dtype=bool)
+        segment = np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.zeros(len(hashes), dtype=np.int64)
+        for i, seg in enumerate(self.segments):
+            missing = np.flatnonzero(~found)
+            if not len(missing):
+                break
+            hit, where = seg.lookup(hashes[missing])
+            found[missing[hit]] = True
+            segment[missing[hit]] = i
+            pos[missing[hit]] = where[hit]
+        return found, segment, pos
+
+    def get(self, segments, positions):
+        """
+        Textos processados nas (segmento, posição) dadas, decodificados dos
+        buffers mapeados.
+        """
+        segments = np.asarray(segments)
+        positions = np.asarray(positions)
+        out = np.empty(len(positions), dtype=object)
+        for i in np.unique(segments):
+            rows = np.flatnonzero(segments == i)
+            out[rows] = self.segments[i].get(positions[rows])
+        return out.tolist()
+
+    def _write_meta(self, segments, config=None):
+        self.meta.update(segments=segments, n_docs=len(self),
+                         config=config if config is not None else self.meta.get('config'))
+        tmp = self.directory / f'meta.json.tmp{os.getpid()}'
+        tmp.write_text(json.dumps(self.meta, indent=1, ensure_ascii=False))
+        os.replace(tmp, self.directory / 'meta.json')
+
+    def _new_segment(self, keys, texts):
+        name = f'seg-{self.meta["next_segment"]:05d}'
+        self.meta['next_segment'] += 1
+        _Segment.write(self.directory / name, keys, texts)
+        self.segments.append(_Segment(self.directory / name))
+        return name
+
+    def add(self, hashes, texts, config=None):
+        """
+        Acrescenta documentos num segmento novo (só as linhas novas são
+        gravadas) e compacta o cache quando passa de `MAX_SEGMENTS`.
+        """
+        hashes, first = np.unique(np.asarray(hashes, dtype=KEY_DTYPE), return_index=True)
+        texts = [texts[i] for i in first]
+        found = self.lookup(hashes)[0]
+        hashes = hashes[~found]
+        texts = [t for t, f in zip(texts, found) if not f]
+        if not len(hashes):
+            return self
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._new_segment(hashes, texts)
+        self._write_meta(self.meta['segments'] + [self.segments[-1].directory.name], config)
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+        return self
+
+    def compact(self):
+        """
+        Junta todos os segmentos num só (regrava o cache inteiro).
+        """
+        if len(self.segments) <= 1:
+            return self
+        old = self.segments
+        keys = np.concatenate([np.asarray(seg.keys) for seg in old])
+        texts = [text for seg in old for text in seg.get(np.arange(len(seg.keys)))]
+        self.segments = []
+        self._new_segment(keys, texts)
+        self._write_meta([self.segments[0].directory.name])
+        # Libera os mapas dos segmentos antigos antes de apagar os diretórios
+        directories = [seg.directory for seg in old]
+        del old
+        for directory in directories:
+            shutil.rmtree(directory)
+        return self
+
+
+def preprocess_corpus(texts, preprocessor, cache_dir=None, n_jobs=1, verbose=True):
+    """
+    Aplica `preprocessor` a `texts` passando pelo cache: documentos já vistos
+    (mesmo texto, mesma configuração) vêm do disco e só os restantes são
+    processados, em paralelo com `n_jobs`.
+    """
+    texts = list(texts)
+    cache_dir = Path(cache_dir) if cache_dir else Path.cwd() / CACHE_DIRNAME
+    cache = CorpusCache(corpus_cache_dir(preprocessor, cache_dir))
+
+    hashes = text_hashes(texts)
+    found, segments, pos = cache.lookup(hashes)
+    out = np.empty(len(texts), dtype=object)
+    if found.any():
+        out[found] = cache.get(segments[found], pos[found])
+
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        # Textos repetidos no corpus são processados uma única vez
+        miss_hashes, first, inverse = np.unique(hashes[missing], return_index=True, return_inverse=True)
+        unique_texts = [texts[missing[i]] for i in first]
+        processed = preprocessor.transform(unique_texts, n_jobs=n_jobs)
+        out[missing] = [processed[i] for i in inverse.ravel()]
+        cache.add(miss_hashes, processed, config=preprocessor.config())
+
+    if verbose:
+        print(f'Cache de pré-processamento: {int(found.sum())} documentos reaproveitados, '
+              f'{len(missing)} processados ({cache.directory.name})')
+    return out.tolist()
+
+
+def benchmark(texts, preprocessor, cache_dir, changed_fraction=0.05, n_jobs=1, seed=0):
+    """
+    Tempo de uma execução fria (cache vazio), quente (nada mudou) e parcial
+    (`changed_fraction` dos documentos alterados).
+    """
+    directory = corpus_cache_dir(preprocessor, cache_dir)
+    if directory.exists():
+        shutil.rmtree(directory)
+
+    rows = []
+    start = time.perf_counter()
+    cold = preprocess_corpus(texts, preprocessor, cache_dir, n_jobs, verbose=False)
+    rows.append(('fria', time.perf_counter() - start))
+
+    start = time.perf_counter()
+    warm = preprocess_corpus(texts, preprocessor, cache_dir, n_jobs, verbose=False)
+    rows.append(('quente', time.perf_counter() - start))
+    if warm != cold:
+        raise AssertionError('Execução quente diferente da fria')
+
+    rng = np.random.default_rng(seed)
+    changed = list(texts)
+    for i in rng.choice(len(texts), int(len(texts) * changed_fraction), replace=False):
+        changed[i] = changed[i] + ' updated'
+    start = time.perf_counter()
+    partial = preprocess_corpus(changed, preprocessor, cache_dir, n_jobs, verbose=False)
+    rows.append((f'parcial ({changed_fraction:.0%} alterados)', time.perf_counter() - start))
+    if partial != [preprocessor(t) for t in changed]:
+        raise AssertionError('Execução parcial diferente do processamento direto')
+    return rows
+
+
+def main():
+    import pandas as pd
+
+    from text_preprocess import TextPreprocessor
+
+    parser = argparse.ArgumentParser(description='Benchmark do cache de texto pré-processado.')
+    parser.add_argument('path', help='CSV do AG News (colunas Title e Description)')
+    parser.add_argument('--cache-dir', default=None, help='padrão: <pasta do csv>/.cache')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--stem', action='store_true', help='usa stemming em vez de lematização')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    texts = (df['Title'] + ' ' + df['Description']).tolist()
+    cache_dir = args.cache_dir or Path(args.path).resolve().parent / CACHE_DIRNAME
+    preprocessor = TextPreprocessor(use_lemmatization=not args.stem)
+
+    print(f'{len(texts)} documentos, configuração {preprocessor.fingerprint()[:16]} ({preprocessor.mode})')
+    for name, seconds in benchmark(texts, preprocessor, cache_dir, n_jobs=args.jobs):
+        print(f'{name:28s} {seconds:7.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+"""
+Cache colunar em disco para os CSVs usados nos notebooks.
+
+Na primeira leitura o CSV é convertido (já com a receita de limpeza aplicada)
+para um diretório de arquivos `.npy`, um por coluna. A chave do cache combina o
+hash SHA-256 do arquivo de origem com o hash da receita, então qualquer mudança
+nos dados ou na limpeza gera um cache novo. Nas leituras seguintes as colunas são
+abertas com `np.load(mmap_mode='c')`, sem reprocessar texto.
+
+Layout de cada coluna:
+- numérica/booleana/data: um único `.npy` com o dtype original;
+- texto de baixa cardinalidade: códigos (`.codes.npy`) + valores únicos;
+- texto livre: deslocamentos (`.offsets.npy`) + um buffer UTF-8 concatenado (`.data.npy`).
+
+Uso a partir dos notebooks:
+
+    import sys
+    sys.path.append('../src')
+    from dataset_cache import load_dataset, VEHICLE_RECIPE
+
+    df = load_dataset('../data/vehicle_price_prediction.csv', VEHICLE_RECIPE)
+
+Benchmark de carga fria vs. quente:
+
+    python src/dataset_cache.py data/heart.csv --recipe heart
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+CACHE_DIRNAME = '.cache'
+
+# Texto com mais valores únicos que esta fração das linhas não compensa o dicionário
+DICT_MAX_RATIO = 0.5
+
+# Receitas de limpeza usadas nos notebooks (a ordem das etapas é fixa, ver apply_recipe)
+VEHICLE_RECIPE = {
+    'strip_columns': True,
+    'drop': ['seller_type', 'brand_popularity'],
+    'fillna': {'accident_history': 'N.A'},
+}
+
+HEART_RECIPE = {}
+
+AGNEWS_RECIPE = {
+    'concat': {'text': ['Title', 'Description']},
+}
+
+IMDB_RECIPE = {
+    'drop': ['id', 'link', 'production_company'],
+    'fillna': {
+        'rating_mpa': 'Not Rated',
+        'filming_location': 'Desconhecido',
+        'writer': 'Desconhecido',
+        'language': 'Desconhecido',
+        'genre': 'Desconhecido',
+        'country_origin': 'Desconhecido',
+        'director': 'Desconhecido',
+        'duration': 'Desconhecido',
+    },
+    'to_numeric': ['vote', 'rating_imdb', 'budget', 'gross_world_wide'],
+    'fillna_median': ['vote', 'rating_imdb'],
+}
+
+RECIPES = {
+    'raw': {},
+    'vehicle': VEHICLE_RECIPE,
+    'heart': HEART_RECIPE,
+    'agnews': AGNEWS_RECIPE,
+    'imdb': IMDB_RECIPE,
+}
+
+
+def apply_recipe(df, recipe):
+    """
+    Aplica uma receita de limpeza ao DataFrame lido do CSV.
+
+    Etapas suportadas (nesta ordem): strip_columns, drop, concat, fillna,
+    to_numeric e fillna_median. Colunas ausentes em `drop` são ignoradas,
+    como no notebook do IMDb.
+    """
+    if not recipe:
+        return df
+
+    if recipe.get('strip_columns'):
+        df.columns = df.columns.str.strip()
+
+    drop = [col for col in recipe.get('drop', []) if col in df.columns]
+    if drop:
+        df = df.drop(drop, axis=1)
+
+    for target, cols in recipe.get('concat', {}).items():
+        combined = df[cols[0]]
+        for col in cols[1:]:
+            combined = combined + ' ' + df[col]
+        df[target] = combined
+
+    for col, value in recipe.get('fillna', {}).items():
+        if col in df.columns:
+            df[col] = df[col].fillna(value)
+
+    for col in recipe.get('to_numeric', []):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    for col in recipe.get('fillna_median', []):
+        if col in df.columns:
+            df[col] = df[col].fillna(df[col].median())
+
+    return df
+
+
+def recipe_fingerprint(recipe, read_kwargs=None):
+    """
+    Hash estável da receita + parâmetros do read_csv (entra na chave do cache).
+    """
+    payload = json.dumps(
+        {'version': CACHE_VERSION, 'recipe': recipe or {}, 'read_csv': read_kwargs or {}},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path, cache_dir=None, chunk_size=1 << 20):
+    """
+    SHA-256 do arquivo de origem.
+
+    O resultado fica memorizado em `hashes.json` dentro do diretório de cache,
+    indexado por (tamanho, mtime), para que uma carga quente não precise reler
+    o CSV inteiro só para calcular o hash.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    index_file = Path(cache_dir) / 'hashes.json' if cache_dir else None
+
+    index = {}
+    if index_file is not None and index_file.exists():
+        try:
+            index = json.loads(index_file.read_text())
+        except ValueError:
+            index = {}
+        entry = index.get(str(path))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(block)
+    sha = digest.hexdigest()
+
+    if index_file is not None:
+        index[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha}
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = index_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(index, indent=1))
+        os.replace(tmp, index_file)
+    return sha
+
+
+def default_cache_dir(path):
+    return Path(path).resolve().parent / CACHE_DIRNAME
+
+
+def cache_path(path, recipe=None, cache_dir=None, read_kwargs=None):
+    """
+    Diretório do cache correspondente a (arquivo, receita).
+    """
+    cache_dir = Path(cache_dir) if cache_dir else default_cache_dir(path)
+    sha = file_sha256(path, cache_dir)
+    key = f"{Path(path).stem}-{sha[:16]}-{recipe_fingerprint(recipe, read_kwargs)[:12]}"
+    return cache_dir / key
+
+
+# ---------------------------------------------------------------------------
+# Escrita/leitura de colunas de texto (deslocamentos + buffer UTF-8)
+# ---------------------------------------------------------------------------
+
+def write_strings(prefix, values):
+    """
+    Grava uma sequência de strings (None/NaN permitidos) como offsets + buffer UTF-8.
+    """
+    encoded = []
+    mask = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            encoded.append(value.encode('utf-8'))
+        elif value is None or (isinstance(value, float) and np.isnan(value)):
+            mask[i] = True
+            encoded.append(b'')
+        else:
+            encoded.append(str(value).encode('utf-8'))
+
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    np.save(f'{prefix}.offsets.npy', offsets)
+    np.save(f'{prefix}.data.npy', data)
+    if mask.any():
+        np.save(f'{prefix}.mask.npy', mask)
+    return bool(mask.any())
+
+
+def read_strings(prefix, has_mask=False):
+    """
+    Lê as strings gravadas por `write_strings` como um array de objetos.
+    """
+    offsets = np.load(f'{prefix}.offsets.npy', mmap_mode='r')
+    data = np.load(f'{prefix}.data.npy', mmap_mode='r')
+    buf = data.tobytes()
+    bounds = offsets.tolist()
+    out = np.empty(len(bounds) - 1, dtype=object)
+    out[:] = [buf[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+    if has_mask:
+        out[np.load(f'{prefix}.mask.npy')] = np.nan
+    return out
+
+
+def code_dtype(n_values):
+    """
+    Menor inteiro com sinal capaz de guardar os códigos 0..n-1 e o sentinela -1.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+# ---------------------------------------------------------------------------
+# Conversão DataFrame <-> diretório de cache
+# ---------------------------------------------------------------------------
+
+def _write_column(directory, i, series):
+    prefix = str(directory / f'c{i}')
+    dtype = series.dtype
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        np.save(f'{prefix}.codes.npy', codes)
+        write_strings(f'{prefix}.uniques', [str(c) for c in dtype.categories])
+        return {'kind': 'category', 'ordered': bool(dtype.ordered)}
+
+    if dtype.kind in 'biufcmM':
+        np.save(f'{prefix}.npy', series.to_numpy())
+        return {'kind': 'array', 'dtype': str(dtype)}
+
+    values = series.to_numpy(dtype=object)
+    # Categorias ordenadas, como em astype('category')
+    try:
+        codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=True)
+    except TypeError:
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    if len(values) and len(uniques) <= DICT_MAX_RATIO * len(values):
+        np.save(f'{prefix}.codes.npy', codes.astype(code_dtype(len(uniques))))
+        write_strings(f'{prefix}.uniques', list(uniques))
+        return {'kind': 'dict'}
+
+    has_mask = write_strings(prefix, values)
+    return {'kind': 'strings', 'mask': has_mask}
+
+
+def _read_column(directory, i, spec, categories):
+    prefix = str(directory / f'c{i}')
+    kind = spec['kind']
+
+    # .view(np.ndarray) mantém o mapeamento, mas devolve um ndarray comum ao pandas
+    if kind == 'array':
+        return np.load(f'{prefix}.npy', mmap_mode='c').view(np.ndarray)
+
+    if kind in ('dict', 'category'):
+        codes = np.load(f'{prefix}.codes.npy', mmap_mode='c').view(np.ndarray)
+        uniques = read_strings(f'{prefix}.uniques')
+        if kind == 'category' or categories:
+            return pd.Categorical.from_codes(codes, uniques, ordered=spec.get('ordered', False))
+        out = uniques.take(codes, mode='clip')
+        out[codes < 0] = np.nan
+        return out
+
+    return read_strings(prefix, spec.get('mask', False))
+
+
+def write_cache(df, directory, source=None):
+    """
+    Grava o DataFrame no layout colunar. A escrita é feita num diretório
+    temporário e renomeada no final, para nunca deixar um cache pela metade.
+    """
+    directory = Path(directory)
+    tmp = directory.with_name(directory.name + f'.tmp{os.getpid()}')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        spec = _write_column(tmp, i, df[name])
+        spec['name'] = name
+        columns.append(spec)
+
+    index = None
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        index = _write_column(tmp, 'index', df.index.to_series())
+
+    meta = {
+        'version': CACHE_VERSION,
+        'source': str(source) if source else None,
+        'n_rows': len(df),
+        'columns': columns,
+        'index': index,
+    }
+    (tmp / 'meta.json').write_text(json.dumps(meta, indent=1, ensure_ascii=False))
+
+    if directory.exists():
+        shutil.rmtree(directory)
+    os.replace(tmp, directory)
+    return directory
+
+
+def read_cache(directory, categories=False):
+    """
+    Abre um cache colunar como DataFrame. Colunas numéricas ficam mapeadas em
+    memória (copy-on-write); com `categories=True` o texto de baixa
+    cardinalidade volta como `category` em vez de `object`.
+    """
+    directory = Path(directory)
+    meta = json.loads((directory / 'meta.json').read_text())
+    data = {spec['name']: _read_column(directory, i, spec, categories)
+            for i, spec in enumerate(meta['columns'])}
+    index = None
+    if meta.get('index'):
+        index = pd.Index(_read_column(directory, 'index', meta['index'], False))
+    df = pd.DataFrame(data, index=index, copy=False)
+    if index is None and not len(df.columns):
+        df = pd.DataFrame(index=pd.RangeIndex(meta['n_rows']))
+    return df
+
+
+def load_dataset(path, recipe=None, cache_dir=None, categories=False, refresh=False, **read_kwargs):
+    """
+    Lê um CSV através do cache colunar.
+
+    Parâmetros:
+    - recipe: receita de limpeza (ver `apply_recipe`); None lê o CSV cru.
+    - cache_dir: onde guardar o cache (padrão: `<pasta do csv>/.cache`).
+    - categories: devolve colunas de texto de baixa cardinalidade como `category`.
+    - refresh: ignora um cache existente e reconstrói.
+    - read_kwargs: repassados ao `pd.read_csv` (também entram na chave).
+    """
+    directory = cache_path(path, recipe, cache_dir, read_kwargs)
+    if refresh or not (directory / 'meta.json').exists():
+        df = pd.read_csv(path, **read_kwargs)
+        df = apply_recipe(df, recipe)
+        write_cache(df, directory, source=Path(path).resolve())
+    return read_cache(directory, categories=categories)
+
+
+def clear_cache(path, recipe=None, cache_dir=None, **read_kwargs):
+    """
+    Remove o cache de (arquivo, receita), se existir.
+    """
+    directory = cache_path(path, recipe, cache_dir, read_kwargs)
+    if directory.exists():
+        shutil.rmtree(directory)
+
+
+def benchmark(path, recipe=None, repeats=3, cache_dir=None):
+    """
+    Compara o tempo de carga: CSV + limpeza (pandas puro), cache frio
+    (conversão) e cache quente (memmap).
+    """
+    start = time.perf_counter()
+    apply_recipe(pd.read_csv(path), recipe)
+    csv_s = time.perf_counter() - start
+
+    clear_cache(path, recipe, cache_dir)
+    start = time.perf_counter()
+    load_dataset(path, recipe, cache_dir)
+    cold_s = time.perf_counter() - start
+
+    warm = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load_dataset(path, recipe, cache_dir)
+        warm.append(time.perf_counter() - start)
+    warm_s = min(warm)
+
+    return {
+        'arquivo': str(path),
+        'linhas': len(load_dataset(path, recipe, cache_dir)),
+        'csv_s': csv_s,
+        'frio_s': cold_s,
+        'quente_s': warm_s,
+        'ganho': csv_s / warm_s if warm_s else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do cache colunar de CSVs.')
+    parser.add_argument('paths', nargs='+', help='arquivos CSV')
+    parser.add_argument('--recipe', default='raw', choices=sorted(RECIPES))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        res = benchmark(path, RECIPES[args.recipe], args.repeats, args.cache_dir)
+        print(f"{res['arquivo']} ({res['linhas']} linhas)")
+        print(f"  read_csv + limpeza: {res['csv_s']:.3f}s")
+        print(f"  cache frio:         {res['frio_s']:.3f}s")
+        print(f"  cache quente:       {res['quente_s']:.3f}s  ({res['ganho']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""
+Duplicatas exatas (hash de 64 bits por linha) e quase-duplicatas de texto
+(MinHash + LSH por bandas).
+
+O vehicle-notebook.py procura duplicatas com `df.loc[df.duplicated()]` e o
+notebook do AG News não procura nenhuma, embora notícias de agência (AP,
+Reuters, que aparecem em `additional_stopwords`) se repitam com pequenas
+mudanças de título ou de pontuação. Se uma cópia cai no treino e outra no
+teste, a métrica de teste mede memorização.
+
+Duplicatas exatas: cada linha vira um hash de 64 bits
+(`pd.util.hash_pandas_object`); as linhas com hash repetido são confirmadas
+comparando os valores com a primeira ocorrência, então uma colisão nunca
+marca uma linha como duplicata.
+
+Quase-duplicatas: o texto processado vira o conjunto dos seus shingles (pares
+de tokens consecutivos, hasheados pelo `HashingVectorizer`); a assinatura
+MinHash de `num_perm` permutações aproxima a similaridade de Jaccard entre dois
+conjuntos pela fração de posições iguais. A assinatura é cortada em `bands`
+bandas: documentos com uma banda idêntica viram candidatos, e só os candidatos
+com Jaccard estimado >= `threshold` são ligados. Os grupos são as componentes
+conexas desses pares.
+
+As duas classes recebem o corpus em blocos (`update`) e guardam só 8 bytes
+(exatas) ou `4 * num_perm` bytes (quase) por linha; o custo é linear no número
+de linhas, mais uma ordenação por banda.
+
+Uso no notebook do AG News (antes do train_test_split):
+
+    from dedup import NearDuplicates, cluster_table, leakage_report
+
+    near = NearDuplicates(threshold=0.8)
+    near.update(df['processed_text'])
+    df['dup_cluster'] = near.labels()
+    display(cluster_table(df['dup_cluster']))
+    ...
+    leakage_report(df['dup_cluster'], X_train.index, X_test.index)
+
+Benchmark (AG News replicado com cópias perturbadas e veículos replicados):
+
+    python src/dedup.py data/agnews.csv data/vehicle_price_prediction.csv --repeat 1 5 20
+"""
+
+import argparse
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+# Primo de Mersenne 2**31 - 1: (a * x + b) mod P é uma permutação de [0, P)
+# e o produto com x < 2**30 cabe em uint64
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_FEATURES = 1 << 30
+# Assinatura de documento sem nenhum shingle (fica fora do LSH)
+EMPTY = np.uint32(MERSENNE_PRIME)
+
+
+def row_hashes(df):
+    """
+    Hash de 64 bits de cada linha (valores de todas as colunas, sem o índice).
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _first_labels(n_rows, first_of, codes):
+    # Rótulo do grupo = posição da primeira linha dele
+    return first_of[codes] if n_rows else np.empty(0, dtype=np.int64)
+
+
+def cluster_table(labels):
+    """
+    Grupos com mais de uma linha: uma linha por membro, com o rótulo do grupo
+    (posição da primeira linha) e o tamanho, do maior grupo para o menor.
+    """
+    labels = pd.Series(labels)
+    sizes = labels.map(labels.value_counts())
+    table = pd.DataFrame({'cluster': labels.to_numpy(), 'linha': labels.index, 'tamanho': sizes.to_numpy()})
+    table = table[table['tamanho'] > 1]
+    return table.sort_values(['tamanho', 'cluster', 'linha'], ascending=[False, True, True],
+                             kind='stable').reset_index(drop=True)
+
+
+class ExactDuplicates:
+    """
+    Duplicatas exatas acumuladas bloco a bloco (mesma regra de
+    `DataFrame.duplicated(keep='first')`).
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._hashes = None
+
+    def update(self, chunk):
+        self._chunks.append(row_hashes(chunk))
+        self._hashes = None
+        return self
+
+    @property
+    def hashes(self):
+        if self._hashes is None:
+            self._hashes = np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=np.uint64)
+        return self._hashes
+
+    def labels(self):
+        """
+        Posição da primeira linha com o mesmo hash, para cada linha.
+        """
+        codes, _ = pd.factorize(self.hashes)
+        # factorize numera pela primeira aparição: o código j começa na j-ésima linha inédita
+        first_of = np.flatnonzero(~pd.Series(codes).duplicated().to_numpy())
+        return _first_labels(len(codes), first_of, codes)
+
+    def duplicated(self):
+        labels = self.labels()
+        return labels != np.arange(len(labels))
+
+
+def _same_rows(df, rows, first_rows):
+    """
+    Confirma, coluna a coluna, que df[rows] == df[first_rows] (NaN == NaN).
+    """
+    same = np.ones(len(rows), dtype=bool)
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Códigos das categorias (NaN = -1), sem comparar os textos
+            codes = series.cat.codes.to_numpy()
+            same &= codes[rows] == codes[first_rows]
+            continue
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+            values = series.to_numpy()
+            a, b = values[rows], values[first_rows]
+            same &= (a == b) | (np.isnan(a) & np.isnan(b)) if values.dtype.kind == 'f' else a == b
+            continue
+        # Só as linhas envolvidas; factorize iguala NaN com NaN (código -1)
+        codes, _ = pd.factorize(np.concatenate([series.iloc[rows].to_numpy(), series.iloc[first_rows].to_numpy()]))
+        same &= codes[:len(rows)] == codes[len(rows):]
+    return same
+
+
+def duplicated_rows(df, chunksize=500_000):
+    """
+    Máscara booleana igual a `df.duplicated()`, via hash de 64 bits por linha.
+    """
+    finder = ExactDuplicates()
+    for start in range(0, len(df), chunksize):
+        finder.update(df.iloc[start:start + chunksize])
+    labels = finder.labels()
+    rows = np.flatnonzero(labels != np.arange(len(labels)))
+    mask = np.zeros(len(df), dtype=bool)
+    mask[rows[_same_rows(df, rows, labels[rows])]] = True
+    return mask
+
+
+def shingles(text, size=2):
+    """
+    Sequências de `size` tokens consecutivos; texto mais curto vira um shingle só.
+    """
+    tokens = text.split()
+    if len(tokens) <= size:
+        return [' '.join(tokens)] if tokens else []
+    return [' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def _band_keys(band):
+    # Mistura FNV das `rows` posições da banda em 64 bits; colisões só geram
+    # candidatos a mais, que a verificação descarta
+    keys = np.full(len(band), 0xCBF29CE484222325, dtype=np.uint64)
+    for column in band.T:
+        keys ^= column.astype(np.uint64)
+        keys *= np.uint64(0x100000001B3)
+    return keys
+
+
+class NearDuplicates:
+    """
+    Quase-duplicatas de texto por MinHash + LSH.
+
+    Com `bands` bandas de `rows = num_perm // bands` posições, a chance de dois
+    documentos com Jaccard s virarem candidatos é 1 - (1 - s**rows)**bands; o
+    padrão (128 permutações, 16 bandas de 8) tem o ponto de inflexão perto de
+    0.7, abaixo do `threshold` de 0.8 usado na verificação.
+    """
+
+    def __init__(self, num_perm=128, bands=16, shingle_size=2, threshold=0.8, seed=1, perm_block=16):
+        if num_perm % bands:
+            raise ValueError('num_perm precisa ser múltiplo de bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.perm_block = perm_block
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._chunks = []
+        self._signatures = None
+
+    def _vectorizer(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        return HashingVectorizer(analyzer=partial(shingles, size=self.shingle_size), n_features=SHINGLE_FEATURES,
+                                 alternate_sign=False, norm=None, binary=True, dtype=np.float32)
+
+    def signatures_of(self, texts):
+        """
+        Assinaturas MinHash (n, num_perm) uint32 de um bloco de textos processados.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        X = self._vectorizer().transform(texts)
+        signatures = np.full((X.shape[0], self.num_perm), EMPTY, dtype=np.uint32)
+        nonempty = np.diff(X.indptr) > 0
+        if not nonempty.any():
+            return signatures
+        starts = X.indptr[:-1][nonempty]
+        x = X.indices.astype(np.uint64)[:, None]
+        # Em blocos de permutações: memória nnz x perm_block, não nnz x num_perm
+        for lo in range(0, self.num_perm, self.perm_block):
+            hi = min(lo + self.perm_block, self.num_perm)
+            hashed = (x * self.a[lo:hi] + self.b[lo:hi]) % np.uint64(MERSENNE_PRIME)
+            signatures[nonempty, lo:hi] = np.minimum.reduceat(hashed, starts, axis=0)
+        return signatures
+
+    def update(self, texts):
+        self._chunks.append(self.signatures_of(texts))
+        self._signatures = None
+        return self
+
+    def update_csv(self, path, preprocessor=None, chunksize=10_000):
+        """
+        Lê o AG News em blocos (título + descrição, pré-processados se houver
+        `preprocessor`), sem manter o texto em memória.
+        """
+        from streaming_text import iter_chunks
+
+        for _, texts, _ in iter_chunks(path, chunksize, preprocessor):
+            self.update(texts)
+        return self
+
+    @property
+    def signatures(self):
+        if self._signatures is None:
+            self._signatures = (np.concatenate(self._chunks) if self._chunks
+                                else np.empty((0, self.num_perm), dtype=np.uint32))
+        return self._signatures
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def similarity(self, left, right, block=100_000):
+        """
+        Jaccard estimado (fração de posições iguais das assinaturas) de cada par.
+        """
+        out = np.empty(len(left), dtype=np.float32)
+        for lo in range(0, len(left), block):
+            a = self.signatures[left[lo:lo + block]]
+            b = self.signatures[right[lo:lo + block]]
+            out[lo:lo + block] = (a == b).mean(axis=1)
+        return out
+
+    def candidates(self):
+        """
+        Pares (i < j) que coincidem em pelo menos uma banda. Em cada balde,
+        cada documento é comparado com o primeiro (o representante), então um
+        balde grande custa linear e não quadrático.
+        """
+        signatures = self.signatures
+        valid = np.flatnonzero(signatures[:, 0] != EMPTY)
+        if not len(valid):
+            # Nenhum documento com shingles (corpus vazio ou só textos vazios): nenhum par
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pairs = []
+        for band in range(self.bands):
+            keys = _band_keys(signatures[valid, band * self.rows:(band + 1) * self.rows])
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+            representative = order[starts][np.cumsum(starts) - 1]
+            member = representative != order
+            pairs.append(valid[representative[member]] * np.int64(len(signatures)) + valid[order[member]])
+        codes = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int64)
+        return codes // len(signatures), codes % len(signatures)
+
+    def pairs(self):
+        """
+        Pares verificados (Jaccard estimado >= threshold), com a similaridade.
+        """
+        left, right = self.candidates()
+        similarity = self.similarity(left, right)
+        keep = similarity >= self.threshold
+        return pd.DataFrame({'linha_a': left[keep], 'linha_b': right[keep], 'similaridade': similarity[keep]})
+
+    def labels(self):
+        """
+        Grupo de cada documento (posição do primeiro documento do grupo).
+        """
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        n = len(self)
+        pairs = self.pairs()
+        graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs['linha_a'], pairs['linha_b'])), shape=(n, n))
+        _, components = connected_components(graph, directed=False)
+        first_of = np.full(components.max() + 1 if n else 0, n, dtype=np.int64)
+        np.minimum.at(first_of, components, np.arange(n))
+        return _first_labels(n, first_of, components)
+
+
+def leakage_report(labels, train_index, test_index):
+    """
+    Linhas de teste com uma (quase-)duplicata no treino.
+
+    `labels` é a série de grupos alinhada ao DataFrame (ex.: `df['dup_cluster']`);
+    os índices são os de `X_train`/`X_test`.
+    """
+    labels = pd.Series(labels)
+    train = labels.loc[train_index]
+    test = labels.loc[test_index]
+    in_train = train.value_counts()
+    leaked = test[test.isin(in_train.index)]
+    report = pd.DataFrame({'linha_teste': leaked.index, 'cluster': leaked.to_numpy(),
+                           'copias_no_treino': leaked.map(in_train).to_numpy()})
+    print(f"Linhas de teste com quase-duplicata no treino: {len(report)} de {len(test)} "
+          f"({len(report) / max(len(test), 1) * 100:.2f}%)")
+    return report
+
+
+def perturb_copies(texts, repeat, edit_fraction=0.05, seed=0):
+    """
+    Corpus original + (repeat - 1) cópias com ~edit_fraction dos tokens
+    trocados por tokens aleatórios; devolve textos e a linha de origem de cada um.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(sorted({token for text in texts for token in text.split()}) or [''])
+    out = list(texts)
+    origin = list(range(len(texts)))
+    for _ in range(repeat - 1):
+        for row, text in enumerate(texts):
+            tokens = text.split()
+            for position in np.flatnonzero(rng.random(len(tokens)) < edit_fraction):
+                tokens[position] = vocabulary[rng.integers(len(vocabulary))]
+            out.append(' '.join(tokens))
+            origin.append(row)
+    return out, np.array(origin)
+
+
+def exact_jaccard(a, b, size=2):
+    a, b = set(shingles(a, size)), set(shingles(b, size))
+    return len(a & b) / max(len(a | b), 1)
+
+
+def benchmark_near(texts, repeats, threshold=0.8, chunksize=10_000, n_check=2_000, seed=0):
+    """
+    Tempo, pico de memória (tracemalloc), revocação das cópias injetadas e
+    precisão dos pares (fração com Jaccard exato >= threshold), por amostragem.
+    """
+    rows = []
+    rng = np.random.default_rng(seed)
+    for repeat in repeats:
+        corpus, origin = perturb_copies(texts, repeat, seed=seed)
+        tracemalloc.start()
+        start = time.perf_counter()
+        near = NearDuplicates(threshold=threshold)
+        for lo in range(0, len(corpus), chunksize):
+            near.update(corpus[lo:lo + chunksize])
+        pairs = near.pairs()
+        labels = near.labels()
+        seconds = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        # Revocação: entre as cópias cujo Jaccard exato com a original passa do
+        # limiar, quantas caíram no grupo da original
+        copies = np.arange(len(texts), len(corpus))
+        copies = rng.choice(copies, min(n_check, len(copies)), replace=False) if len(copies) else copies
+        similar = np.array([exact_jaccard(corpus[i], corpus[origin[i]]) >= threshold for i in copies], dtype=bool)
+        found = labels[copies[similar]] == labels[origin[copies[similar]]]
+        sample = rng.choice(len(pairs), min(n_check, len(pairs)), replace=False) if len(pairs) else []
+        exact = [exact_jaccard(corpus[pairs['linha_a'].iat[i]], corpus[pairs['linha_b'].iat[i]]) for i in sample]
+        rows.append({
+            'documentos': len(corpus),
+            'segundos': seconds,
+            'us_por_doc': seconds / len(corpus) * 1e6,
+            'pico_mb': peak_mb,
+            'pares': len(pairs),
+            'revocacao': found.mean() if len(found) else np.nan,
+            'precisao': np.mean(np.array(exact) >= threshold) if len(exact) else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+def benchmark_exact(df, sizes, seed=0):
+    """
+    `df.duplicated()` vs. hash de 64 bits por linha, conferindo a máscara, no
+    DataFrame já compactado como no notebook (`optimize_dtypes`).
+    """
+    from compact_dtypes import optimize_dtypes
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n_rows in sizes:
+        big, _ = optimize_dtypes(df.iloc[rng.integers(0, len(df), n_rows)].reset_index(drop=True))
+        start = time.perf_counter()
+        reference = big.duplicated().to_numpy()
+        pandas_s = time.perf_counter() - start
+        start = time.perf_counter()
+        mask = duplicated_rows(big)
+        hash_s = time.perf_counter() - start
+        assert np.array_equal(mask, reference)
+        rows.append({'linhas': n_rows, 'duplicated_s': pandas_s, 'hash_s': hash_s, 'duplicatas': int(mask.sum())})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Duplicatas exatas e quase-duplicatas (MinHash + LSH).')
+    parser.add_argument('agnews', help='agnews.csv')
+    parser.add_argument('vehicles', nargs='?', help='vehicle_price_prediction.csv (opcional)')
+    parser.add_argument('--repeat', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--raw', action='store_true', help='usa o texto limpo sem o TextPreprocessor')
+    args = parser.parse_args()
+
+    from text_preprocess import TextPreprocessor, clean_text
+
+    df = pd.read_csv(args.agnews)
+    text = (df['Title'].fillna('') + ' ' + df['Description'].fillna('')).tolist()
+    texts = [clean_text(t) for t in text] if args.raw else TextPreprocessor().transform(text)
+
+    near = NearDuplicates(threshold=args.threshold).update(texts)
+    table = cluster_table(near.labels())
+    print(f"AG News: {table['cluster'].nunique()} grupos de quase-duplicatas, {len(table)} documentos")
+    with pd.option_context('display.float_format', '{:.4g}'.format):
+        print(benchmark_near(texts, args.repeat, args.threshold).to_string(index=False))
+        if args.vehicles:
+            vehicles = pd.read_csv(args.vehicles)
+            print(benchmark_exact(vehicles, [len(vehicles), 10 * len(vehicles)]).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Vetorização compartilhada entre os grids de TF-IDF/BoW do notebook do AG News.
+
+No notebook o vetorizador fica dentro de um `Pipeline` no `GridSearchCV`, então
+o texto de cada fold é tokenizado e o vocabulário refeito para cada combinação
+de hiperparâmetros do classificador, para cada modelo e de novo no loop de
+BoW. Aqui o trabalho é dividido em duas camadas:
+
+1. `FeatureCache` tokeniza o treino de cada fold uma única vez por
+   configuração de tokenização (`ngram_range`, `lowercase`, `token_pattern`...)
+   e guarda a matriz esparsa de contagens (vocabulário completo) do treino e da
+   validação;
+2. `derive_features` obtém a matriz de cada configuração de vetorizador a
+   partir dessas contagens, sem reler o texto: `binary`, `min_df`/`max_df`/
+   `max_features` viram seleção de colunas e TF-IDF (com ou sem
+   `sublinear_tf`) é um `TfidfTransformer` sobre as contagens. O resultado é
+   idêntico ao `CountVectorizer`/`TfidfVectorizer` ajustado no fold.
+
+`CachedGridSearchCV` tem a mesma interface do `GridSearchCV` usado em
+`train_and_evaluate_model` (Pipeline com passos 'vect' e 'clf', parâmetros
+`vect__*`/`clf__*`) e avalia cada candidato sobre as matrizes em cache. As
+notas de validação são as mesmas do `GridSearchCV`. Com um KNN no passo
+'clf', os candidatos de mesma matriz que só mudam `n_neighbors`/`weights`
+compartilham um ajuste e uma consulta de vizinhos por fold
+(`ann_index.shared_neighbor_scores`; `share_neighbors=False` desliga). Do
+mesmo jeito, com SVC a matriz de kernel de cada fold serve a todos os C
+(`regularization_path.path_scores`; `reuse_kernel=False` desliga) e, com
+`warm_start_path=True`, a LogisticRegression percorre os C com warm start.
+
+Uso no notebook:
+
+    from feature_cache import FeatureCache, CachedGridSearchCV
+
+    features = FeatureCache(X_train, y_train, cv_strategy)
+    grid_search = CachedGridSearchCV(pipeline, pipeline_param_grid, features,
+                                     scoring='f1_weighted', n_jobs=-1, verbose=1)
+    grid_search.fit(X_train, y_train)
+
+Benchmark contra o GridSearchCV (todas as configurações de TF-IDF e BoW):
+
+    python src/feature_cache.py data/agnews.csv
+"""
+
+import argparse
+import time
+from numbers import Integral
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid
+
+from ann_index import shared_neighbor_scores, shares_neighbors
+from cached_search import CachedSearchCV, fit_and_score, params_key, shared_scores, stack_scores
+from regularization_path import follows_path, path_scores
+
+# Parâmetros resolvidos a partir da matriz de contagens (não exigem retokenizar)
+DERIVED_PARAMS = {'min_df', 'max_df', 'max_features', 'binary', 'dtype'}
+TFIDF_PARAMS = {'norm', 'use_idf', 'smooth_idf', 'sublinear_tf'}
+
+
+def split_vectorizer_params(params):
+    """
+    Separa os parâmetros de um vetorizador em (tokenização, derivados).
+    """
+    base = {k: v for k, v in params.items() if k not in DERIVED_PARAMS | TFIDF_PARAMS}
+    derived = {k: v for k, v in params.items() if k in DERIVED_PARAMS | TFIDF_PARAMS}
+    return base, derived
+
+
+def _document_frequency(X):
+    return np.bincount(X.indices, minlength=X.shape[1])
+
+
+def derive_features(counts_train, counts_valid, params, tfidf=False):
+    """
+    Matrizes (treino, validação) de um vetorizador a partir das contagens com
+    vocabulário completo, seguindo a ordem do `CountVectorizer.fit_transform`:
+    binary -> filtros de frequência -> (TF-IDF).
+    """
+    X_train = counts_train.copy()
+    X_valid = counts_valid.copy()
+    if params.get('binary', False):
+        X_train.data.fill(1)
+        X_valid.data.fill(1)
+
+    if params.get('vocabulary') is None:
+        n_doc = X_train.shape[0]
+        max_df = params.get('max_df', 1.0)
+        min_df = params.get('min_df', 1)
+        high = max_df if isinstance(max_df, Integral) else max_df * n_doc
+        low = min_df if isinstance(min_df, Integral) else min_df * n_doc
+        if high < low:
+            raise ValueError('max_df corresponds to < documents than min_df')
+
+        dfs = _document_frequency(X_train)
+        mask = (dfs <= high) & (dfs >= low)
+        limit = params.get('max_features')
+        if limit is not None and mask.sum() > limit:
+            tfs = np.asarray(X_train.sum(axis=0)).ravel()
+            mask_inds = (-tfs[mask]).argsort()[:limit]
+            new_mask = np.zeros(len(dfs), dtype=bool)
+            new_mask[np.where(mask)[0][mask_inds]] = True
+            mask = new_mask
+        kept = np.flatnonzero(mask)
+        if not len(kept):
+            raise ValueError('After pruning, no terms remain. Try a lower min_df or a higher max_df.')
+        if len(kept) < X_train.shape[1]:
+            X_train = X_train[:, kept]
+            X_valid = X_valid[:, kept]
+
+    if tfidf:
+        transformer = TfidfTransformer(**{k: params[k] for k in TFIDF_PARAMS if k in params})
+        X_train = transformer.fit_transform(X_train)
+        X_valid = transformer.transform(X_valid)
+    dtype = params.get('dtype', np.float64 if tfidf else np.int64)
+    return X_train.astype(dtype, copy=False), X_valid.astype(dtype, copy=False)
+
+
+class FeatureCache:
+    """
+    Contagens esparsas por (fold, configuração de tokenização) de um conjunto
+    de treino, com as divisões de `cv` calculadas uma única vez.
+    """
+
+    def __init__(self, X, y, cv):
+        self.texts = np.asarray(X, dtype=object)
+        self.y = np.asarray(y)
+        self.splits = list(cv.split(self.texts, self.y))
+        self._counts = {}
+        self._features = {}
+        self.n_tokenizations = 0
+
+    @property
+    def n_splits(self):
+        return len(self.splits)
+
+    def counts(self, fold, base_params):
+        """
+        (contagens do treino, contagens da validação) do fold.
+        """
+        key = (fold, params_key(base_params))
+        if key not in self._counts:
+            train_idx, valid_idx = self.splits[fold]
+            vectorizer = CountVectorizer(**base_params)
+            counts_train = vectorizer.fit_transform(self.texts[train_idx])
+            counts_valid = vectorizer.transform(self.texts[valid_idx])
+            self._counts[key] = (counts_train, counts_valid)
+            self.n_tokenizations += 1
+        return self._counts[key]
+
+    def features(self, fold, vectorizer):
+        """
+        (X_treino, X_validação) do fold para um vetorizador não ajustado.
+        """
+        tfidf = isinstance(vectorizer, TfidfVectorizer)
+        base, derived = split_vectorizer_params(vectorizer.get_params())
+        key = (fold, tfidf, params_key(base), params_key(derived))
+        if key not in self._features:
+            counts_train, counts_valid = self.counts(fold, base)
+            derived['vocabulary'] = base.get('vocabulary')
+            self._features[key] = derive_features(counts_train, counts_valid, derived, tfidf)
+        return self._features[key]
+
+    def clear(self):
+        self._counts.clear()
+        self._features.clear()
+
+
+class CachedGridSearchCV(CachedSearchCV):
+    """
+    Substituto do `GridSearchCV` para Pipeline('vect', 'clf') que usa as
+    matrizes de um `FeatureCache`. Expõe `best_params_`, `best_score_`,
+    `best_estimator_` (Pipeline reajustado no treino completo), `cv_results_`
+    e `predict`.
+    """
+
+    def __init__(self, estimator, param_grid, features, scoring=None, n_jobs=None, verbose=0, refit=True,
+                 share_neighbors=True, reuse_kernel=True, warm_start_path=False):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.features = features
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+        self.refit = refit
+        self.share_neighbors = share_neighbors
+        self.reuse_kernel = reuse_kernel
+        self.warm_start_path = warm_start_path
+
+    def _evaluate(self, candidates, rows=None):
+        """
+        Notas {métrica: array (candidatos x folds)}. `rows[fold]`, se dado,
+        restringe o treino do fold a essas posições (usado pela busca por
+        halving).
+        """
+        vect = self.estimator.named_steps['vect']
+        clf = self.estimator.named_steps['clf']
+        scorer = check_scoring(clf, scoring=self.scoring)
+        y_all = self.features.y
+
+        def fold_data(candidate_vect, fold, train_idx, valid_idx):
+            X_train, X_valid = self.features.features(fold, candidate_vect)
+            y_train = y_all[train_idx]
+            if rows is not None:
+                X_train, y_train = X_train[rows[fold]], y_train[rows[fold]]
+            return X_train, y_train, X_valid, y_all[valid_idx]
+
+        if self.share_neighbors and shares_neighbors(clf):
+            shared = shared_neighbor_scores
+        elif follows_path(clf, self.reuse_kernel, self.warm_start_path):
+            shared = path_scores
+        else:
+            shared = None
+
+        if shared is not None:
+            # Candidatos agrupados pela matriz (parâmetros do vetorizador); uma
+            # tarefa por grupo x fold com todos os parâmetros do modelo do grupo
+            groups = {}
+            for i, params in enumerate(candidates):
+                vect_params = {k[len('vect__'):]: v for k, v in params.items() if k.startswith('vect__')}
+                clf_params = {k[len('clf__'):]: v for k, v in params.items() if k.startswith('clf__')}
+                _, members, clf_list = groups.setdefault(params_key(vect_params), (vect_params, [], []))
+                members.append(i)
+                clf_list.append(clf_params)
+            tasks, slots = [], []
+            for vect_params, members, clf_params in groups.values():
+                candidate_vect = clone(vect).set_params(**vect_params)
+                for fold, (train_idx, valid_idx) in enumerate(self.features.splits):
+                    tasks.append((clf, clf_params) + fold_data(candidate_vect, fold, train_idx, valid_idx))
+                    slots.append((members, fold))
+            results = Parallel(n_jobs=self.n_jobs)(
+                delayed(shared_scores)(shared, *task, scorer) for task in tasks
+            )
+            scores = {metric: np.empty((len(candidates), self.features.n_splits), dtype=np.float64)
+                      for metric in results[0][0]}
+            for (members, fold), fold_scores in zip(slots, results):
+                for metric, split in scores.items():
+                    split[members, fold] = [s[metric] for s in fold_scores]
+            return scores
+
+        tasks = []
+        for params in candidates:
+            vect_params = {k[len('vect__'):]: v for k, v in params.items() if k.startswith('vect__')}
+            clf_params = {k[len('clf__'):]: v for k, v in params.items() if k.startswith('clf__')}
+            candidate_vect = clone(vect).set_params(**vect_params)
+            for fold, (train_idx, valid_idx) in enumerate(self.features.splits):
+                tasks.append((clone(clf).set_params(**clf_params),)
+                             + fold_data(candidate_vect, fold, train_idx, valid_idx))
+
+        scores = Parallel(n_jobs=self.n_jobs)(
+            delayed(fit_and_score)(*task, scorer) for task in tasks
+        )
+        return stack_scores(scores, len(candidates), self.features.n_splits)
+
+    def fit(self, X, y):
+        if len(X) != len(self.features.texts):
+            raise ValueError('X não corresponde ao conjunto usado no FeatureCache')
+        candidates = list(ParameterGrid(self.param_grid))
+        n_splits = self.features.n_splits
+        if self.verbose:
+            print(f'Fitting {n_splits} folds for each of {len(candidates)} candidates, '
+                  f'totalling {n_splits * len(candidates)} fits')
+        return self.store_results(candidates, self._evaluate(candidates), X, y)
+
+
+BENCHMARK_MODELS = {
+    'Logistic Regression': ('LogisticRegression', {'C': [0.1, 1, 10]}),
+    'Multinomial Naive Bayes': ('MultinomialNB', {'alpha': [0.1, 0.5, 1.0, 2.0]}),
+}
+
+BENCHMARK_CONFIGS = {
+    'tfidf': [{}, {'ngram_range': (1, 2)}, {'max_df': 0.8}, {'min_df': 5}, {'sublinear_tf': True}],
+    'bow': [{}, {'ngram_range': (1, 2)}, {'max_df': 0.8}, {'min_df': 5}, {'binary': True}],
+}
+
+
+def benchmark(X_train, y_train, cv, models=None, configs=None, n_jobs=1):
+    """
+    Varre configurações de vetorizador x modelos com o GridSearchCV do notebook
+    e com o `CachedGridSearchCV`, conferindo que as notas coincidem.
+    """
+    from sklearn import linear_model, naive_bayes
+    from sklearn.model_selection import GridSearchCV
+    from sklearn.pipeline import Pipeline
+
+    models = models or BENCHMARK_MODELS
+    configs = configs or BENCHMARK_CONFIGS
+    estimators = {'LogisticRegression': linear_model.LogisticRegression(random_state=42, max_iter=1000),
+                  'MultinomialNB': naive_bayes.MultinomialNB()}
+
+    runs = []
+    for vect_type, vect_configs in configs.items():
+        for vect_params in vect_configs:
+            for name, (estimator_name, grid) in models.items():
+                vectorizer = CountVectorizer() if vect_type == 'bow' else TfidfVectorizer()
+                pipeline = Pipeline([('vect', vectorizer.set_params(**vect_params)),
+                                     ('clf', estimators[estimator_name])])
+                param_grid = {f'clf__{k}': v for k, v in grid.items()}
+                param_grid.update({f'vect__{k}': [v] for k, v in vect_params.items()})
+                runs.append((pipeline, param_grid))
+
+    start = time.perf_counter()
+    reference = [GridSearchCV(p, g, cv=cv, scoring='f1_weighted', n_jobs=n_jobs).fit(X_train, y_train)
+                 for p, g in runs]
+    grid_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = FeatureCache(X_train, y_train, cv)
+    cached = [CachedGridSearchCV(p, g, features, scoring='f1_weighted', n_jobs=n_jobs).fit(X_train, y_train)
+              for p, g in runs]
+    cached_s = time.perf_counter() - start
+
+    for ref, got in zip(reference, cached):
+        np.testing.assert_allclose(got.cv_results_['mean_test_score'], ref.cv_results_['mean_test_score'],
+                                   rtol=1e-12)
+        assert got.best_params_ == ref.best_params_
+    return {
+        'buscas': len(runs),
+        'ajustes': sum(len(ParameterGrid(g)) for _, g in runs) * features.n_splits,
+        'tokenizacoes_cache': features.n_tokenizations,
+        'gridsearch_s': grid_s,
+        'cache_s': cached_s,
+    }
+
+
+def main():
+    import pandas as pd
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+
+    parser = argparse.ArgumentParser(description='Benchmark da vetorização compartilhada do AG News.')
+    parser.add_argument('path', help='CSV do AG News (colunas Title e Description)')
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    X = (df['Title'] + ' ' + df['Description']).str.lower()
+    y = df['Class Index'] - 1
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+
+    result = benchmark(X_train, y_train, cv, n_jobs=args.jobs)
+    print(f"{result['buscas']} buscas, {result['ajustes']} ajustes de classificador")
+    print(f"Vetorizadores ajustados: GridSearchCV {result['ajustes']}, cache {result['tokenizacoes_cache']}")
+    print(f"GridSearchCV: {result['gridsearch_s']:.1f}s | cache: {result['cache_s']:.1f}s "
+          f"({result['gridsearch_s'] / result['cache_s']:.1f}x)")
+    print('Notas de validação e melhores parâmetros idênticos.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+Cache do pré-processamento por fold para os grids do notebook heart.
+
+Em `run_grid`/`run_grid_reg` o `ColumnTransformer` (SimpleImputer +
+StandardScaler + OneHotEncoder) fica dentro do Pipeline, então é reajustado e
+reaplicado para cada fold x combinação de hiperparâmetros x modelo. Como o
+pré-processamento não depende dos hiperparâmetros do modelo, ele pode ser
+feito uma única vez por divisão da validação cruzada:
+
+- `FoldPreprocessCache` ajusta um clone do transformador no treino de cada
+  fold e guarda as matrizes transformadas de treino e validação em disco
+  (`joblib.dump`), reabertas com `mmap_mode='r'`: os processos do joblib
+  recebem só a referência ao arquivo mapeado, não uma cópia dos dados;
+- `FoldCachedGridSearchCV` tem a interface do `GridSearchCV` usado no notebook
+  (Pipeline 'preprocess' + 'model', parâmetros `model__*`, scoring com várias
+  métricas e `refit` pelo nome da métrica) e só ajusta o modelo em cada
+  candidato. As notas são as mesmas do `GridSearchCV`;
+- com um KNN no passo 'model', os candidatos que só mudam `n_neighbors`/
+  `weights` compartilham um ajuste e uma consulta de vizinhos por fold
+  (`ann_index.shared_neighbor_scores`, desligável com `share_neighbors=False`);
+- com SVC, a matriz de kernel de cada fold é calculada uma vez para todos os
+  C/class_weight (`regularization_path`, `reuse_kernel=False` desliga); com
+  `warm_start_path=True` a LogisticRegression percorre os C do fold com warm
+  start (notas iguais às do grid só dentro da tolerância do solver).
+
+Uso no notebook:
+
+    from fold_cache import FoldPreprocessCache, FoldCachedGridSearchCV
+
+    folds = FoldPreprocessCache(preprocess, X_train, y_train, cv)
+    grid = FoldCachedGridSearchCV(pipe, param_grid, folds, scoring=scoring, refit='f1', n_jobs=-1)
+    grid.fit(X_train, y_train)
+
+Benchmark com o heart.csv replicado:
+
+    python src/fold_cache.py data/heart.csv --repeat 10
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import weakref
+from pathlib import Path
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, check_cv
+
+from ann_index import shared_neighbor_scores, shares_neighbors
+from cached_search import CachedSearchCV, fit_and_score, shared_scores, stack_scores
+from regularization_path import follows_path, path_scores
+
+
+def _memmap(obj, directory, name):
+    path = Path(directory) / f'{name}.joblib'
+    joblib.dump(obj, path)
+    return joblib.load(path, mmap_mode='r')
+
+
+class FoldPreprocessCache:
+    """
+    Matrizes pré-processadas (treino, validação) de cada fold de `cv`.
+    """
+
+    def __init__(self, preprocess, X, y, cv, classifier=True, memmap_dir=None):
+        self.X = X
+        self.y = np.asarray(y)
+        self.cv = check_cv(cv, self.y, classifier=classifier)
+        self.splits = list(self.cv.split(X, self.y))
+
+        self._tmpdir = None
+        if memmap_dir is None:
+            memmap_dir = self._tmpdir = tempfile.mkdtemp(prefix='fold_cache_')
+            weakref.finalize(self, shutil.rmtree, self._tmpdir, ignore_errors=True)
+
+        self.folds = []
+        start = time.perf_counter()
+        for i, (train_idx, valid_idx) in enumerate(self.splits):
+            transformer = clone(preprocess)
+            X_train = transformer.fit_transform(X.iloc[train_idx], self.y[train_idx])
+            X_valid = transformer.transform(X.iloc[valid_idx])
+            self.folds.append((
+                _memmap(X_train, memmap_dir, f'fold{i}_train'),
+                _memmap(X_valid, memmap_dir, f'fold{i}_valid'),
+            ))
+        self.preprocess_seconds = time.perf_counter() - start
+
+    @property
+    def n_splits(self):
+        return len(self.splits)
+
+    def close(self):
+        self.folds = []
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class FoldCachedGridSearchCV(CachedSearchCV):
+    """
+    Substituto do `GridSearchCV` para Pipeline('preprocess', 'model') que usa
+    as matrizes de um `FoldPreprocessCache`. Expõe `best_params_`,
+    `best_score_`, `best_index_`, `best_estimator_` (Pipeline reajustado no
+    treino completo) e `cv_results_` com `mean_test_<métrica>`.
+    """
+
+    def __init__(self, estimator, param_grid, folds, scoring=None, refit=True, n_jobs=None,
+                 share_neighbors=True, reuse_kernel=True, warm_start_path=False):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.folds = folds
+        self.scoring = scoring
+        self.refit = refit
+        self.n_jobs = n_jobs
+        self.share_neighbors = share_neighbors
+        self.reuse_kernel = reuse_kernel
+        self.warm_start_path = warm_start_path
+
+    def fit(self, X, y):
+        if len(X) != len(self.folds.y):
+            raise ValueError('X não corresponde ao conjunto usado no FoldPreprocessCache')
+        model = self.estimator.named_steps['model']
+        scorer = check_scoring(model, scoring=self.scoring)
+        candidates = list(ParameterGrid(self.param_grid))
+        y_all = self.folds.y
+
+        model_params = [{k[len('model__'):]: v for k, v in params.items() if k.startswith('model__')}
+                        for params in candidates]
+        n_splits = self.folds.n_splits
+
+        if self.share_neighbors and shares_neighbors(model):
+            shared = shared_neighbor_scores
+        elif follows_path(model, self.reuse_kernel, self.warm_start_path):
+            shared = path_scores
+        else:
+            shared = None
+
+        if shared is not None:
+            # Uma tarefa por fold com todos os candidatos; volta para candidato x fold
+            per_fold = Parallel(n_jobs=self.n_jobs)(
+                delayed(shared_scores)(shared, model, model_params, X_train, y_all[train_idx],
+                                       X_valid, y_all[valid_idx], scorer)
+                for (train_idx, valid_idx), (X_train, X_valid) in zip(self.folds.splits, self.folds.folds)
+            )
+            scores = [per_fold[fold][c] for c in range(len(candidates)) for fold in range(n_splits)]
+        else:
+            tasks = []
+            for params in model_params:
+                for (train_idx, valid_idx), (X_train, X_valid) in zip(self.folds.splits, self.folds.folds):
+                    tasks.append(delayed(fit_and_score)(
+                        clone(model).set_params(**params), X_train, y_all[train_idx],
+                        X_valid, y_all[valid_idx], scorer,
+                    ))
+            scores = Parallel(n_jobs=self.n_jobs)(tasks)
+
+        return self.store_results(candidates, stack_scores(scores, len(candidates), n_splits), X, y)
+
+
+def heart_preprocess(cat_cols, num_cols):
+    """
+    ColumnTransformer do notebook (mediana + padronização / moda + one-hot).
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    num_pipe = Pipeline(steps=[('imputer', SimpleImputer(strategy='median')), ('scaler', StandardScaler())])
+    cat_pipe = Pipeline(steps=[('imputer', SimpleImputer(strategy='most_frequent')),
+                               ('onehot', OneHotEncoder(handle_unknown='ignore'))])
+    return ColumnTransformer(transformers=[('num', num_pipe, num_cols), ('cat', cat_pipe, cat_cols)],
+                             remainder='drop')
+
+
+HEART_CAT_COLS = ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal']
+HEART_NUM_COLS = ['age', 'trestbps', 'chol', 'thalach', 'oldpeak']
+
+HEART_SCORING = {'accuracy': 'accuracy', 'precision': 'precision', 'recall': 'recall', 'f1': 'f1'}
+
+
+def benchmark_grids(random_state=42):
+    """
+    Modelos rápidos do notebook, em que o pré-processamento pesa no grid.
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.neighbors import KNeighborsClassifier
+
+    return [
+        ('LogisticRegression', LogisticRegression(max_iter=5000, random_state=random_state),
+         {'model__C': [0.1, 1.0, 10.0], 'model__penalty': ['l2'],
+          'model__class_weight': [None, 'balanced'], 'model__solver': ['lbfgs']}),
+        ('KNN', KNeighborsClassifier(),
+         {'model__n_neighbors': [3, 5, 11, 21], 'model__weights': ['uniform', 'distance'], 'model__p': [1, 2]}),
+        ('GaussianNB', GaussianNB(), {'model__var_smoothing': [1e-09, 1e-08, 1e-07]}),
+    ]
+
+
+def replicate_heart(df, repeat, seed=0):
+    """
+    heart.csv repetido `repeat` vezes, com um ruído pequeno nas colunas
+    contínuas para as cópias não serem idênticas.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    big = pd.concat([df] * repeat, ignore_index=True)
+    for col in ['trestbps', 'chol', 'thalach']:
+        big[col] = big[col] + rng.integers(-2, 3, len(big))
+    big['oldpeak'] = (big['oldpeak'] + rng.normal(0, 0.05, len(big))).clip(lower=0).round(2)
+    return big
+
+
+def benchmark(df, grids=None, n_jobs=None, random_state=42):
+    """
+    Tempo do GridSearchCV do notebook vs. FoldCachedGridSearchCV para cada
+    modelo, conferindo que as notas de validação coincidem.
+    """
+    from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+    from sklearn.pipeline import Pipeline
+
+    X = df.drop(columns=['target'])
+    y = df['target']
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=random_state, stratify=y)
+    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=random_state)
+    preprocess = heart_preprocess(HEART_CAT_COLS, HEART_NUM_COLS)
+
+    start = time.perf_counter()
+    folds = FoldPreprocessCache(preprocess, X_train, y_train, cv)
+    cache_build = time.perf_counter() - start
+
+    rows = []
+    for name, estimator, grid in grids or benchmark_grids(random_state):
+        pipe = Pipeline(steps=[('preprocess', preprocess), ('model', estimator)])
+        start = time.perf_counter()
+        ref = GridSearchCV(pipe, grid, cv=cv, scoring=HEART_SCORING, refit='f1', n_jobs=n_jobs).fit(X_train, y_train)
+        grid_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got = FoldCachedGridSearchCV(pipe, grid, folds, scoring=HEART_SCORING, refit='f1',
+                                     n_jobs=n_jobs).fit(X_train, y_train)
+        cached_s = time.perf_counter() - start
+
+        for metric in HEART_SCORING:
+            np.testing.assert_allclose(got.cv_results_[f'mean_test_{metric}'],
+                                       ref.cv_results_[f'mean_test_{metric}'], rtol=1e-12)
+        assert got.best_params_ == ref.best_params_
+        rows.append({'modelo': name, 'candidatos': len(ParameterGrid(grid)),
+                     'gridsearch_s': grid_s, 'cache_s': cached_s, 'ganho': grid_s / cached_s})
+    folds.close()
+    return rows, cache_build
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Benchmark do cache de pré-processamento por fold (heart).')
+    parser.add_argument('path', help='heart.csv')
+    parser.add_argument('--repeat', type=int, default=10, help='replica o dataset N vezes')
+    parser.add_argument('--jobs', type=int, default=None)
+    args = parser.parse_args()
+
+    df = replicate_heart(pd.read_csv(args.path), args.repeat)
+    rows, cache_build = benchmark(df, n_jobs=args.jobs)
+    print(f'{len(df)} linhas; cache dos 5 folds construído em {cache_build:.2f}s')
+    print(pd.DataFrame(rows).to_string(index=False))
+    total_grid = sum(r['gridsearch_s'] for r in rows)
+    total_cache = sum(r['cache_s'] for r in rows) + cache_build
+    print(f'Total: GridSearchCV {total_grid:.1f}s | cache {total_cache:.1f}s ({total_grid / total_cache:.1f}x), '
+          f'notas idênticas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Motor de agregação agrupada em uma única passada.
+
+O notebook de veículos faz vários `groupby` sobre o DataFrame inteiro (por ano,
+por marca, por marca x donos, por histórico de acidentes, por carroceria, por
+combustível x período), e cada um percorre todas as linhas de novo. Aqui todas
+as tabelas pedidas são calculadas juntas:
+
+1. cada coluna-chave é fatorada uma única vez em códigos inteiros (colunas
+   `category` já chegam fatoradas);
+2. para cada agrupamento, os códigos das chaves são combinados num código
+   denso por linha;
+3. contagem, soma e soma dos quadrados saem de `np.bincount`; mínimo e máximo
+   saem de uma ordenação estável por código + `ufunc.reduceat`, e a mediana de
+   um `np.partition` dentro de cada grupo (sem ordenar os valores).
+
+As somas são feitas em float64 sem compensação (o pandas usa Kahan), então as
+médias podem diferir do `groupby` na ordem de 1e-12 relativo.
+
+Uso:
+
+    from groupagg import grouped_aggregate, vehicle_tables
+
+    tabelas = vehicle_tables(df)
+    tabelas['preco_acidentes']      # DataFrame com mean/median/count
+    tabelas['preco_total']          # média geral (escalar)
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+STATS = ('count', 'sum', 'mean', 'std', 'var', 'min', 'max', 'median')
+
+# Acima deste número de combinações o código combinado é recomprimido com np.unique
+DENSE_LIMIT = 1 << 22
+
+
+class KeyCodes:
+    """
+    Códigos inteiros (-1 = ausente) e valores únicos de uma coluna-chave.
+    """
+
+    def __init__(self, series):
+        self.name = series.name
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            self.codes = series.cat.codes.to_numpy().astype(np.int64)
+            self.uniques = series.cat.categories
+            self.categorical = series.dtype
+        else:
+            codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+            self.codes = codes.astype(np.int64)
+            self.uniques = pd.Index(uniques)
+            self.categorical = None
+        self.size = len(self.uniques)
+
+    def labels(self, positions):
+        values = self.uniques.take(positions)
+        if self.categorical is not None:
+            return pd.CategoricalIndex(values, dtype=self.categorical)
+        return values
+
+
+def _combine(keys, mask):
+    """
+    Código denso por linha para a combinação das chaves; linhas com alguma
+    chave ausente (ou fora de `mask`) ficam de fora.
+    """
+    valid = mask.copy()
+    for key in keys:
+        valid &= key.codes >= 0
+    sizes = [key.size for key in keys]
+    n_groups = int(np.prod(sizes, dtype=np.int64)) if sizes else 1
+    if not keys:
+        return np.zeros(int(valid.sum()), dtype=np.int64), valid, n_groups, None
+
+    codes = np.ravel_multi_index([key.codes[valid] for key in keys], sizes) if len(keys) > 1 \
+        else keys[0].codes[valid]
+
+    remap = None
+    if n_groups > DENSE_LIMIT:
+        remap, codes = np.unique(codes, return_inverse=True)
+        n_groups = len(remap)
+    return codes, valid, n_groups, remap
+
+
+def _sorted_reduce(codes, values, n_groups, stats):
+    """
+    Estatísticas baseadas em ordem (min, max, mediana): as linhas são agrupadas
+    por código com uma ordenação estável (radix para códigos pequenos), min/max
+    saem de reduceat e a mediana de um np.partition por grupo.
+    """
+    small = codes.astype(np.int16) if n_groups <= np.iinfo(np.int16).max else codes
+    order = np.argsort(small, kind='stable')
+    sorted_values = values[order]
+
+    count = np.bincount(codes, minlength=n_groups)
+    present = np.flatnonzero(count)
+    ends = np.cumsum(count)[present]
+    starts = ends - count[present]
+
+    out = {}
+    if 'min' in stats:
+        col = np.full(n_groups, np.nan)
+        col[present] = np.minimum.reduceat(sorted_values, starts)
+        out['min'] = col
+    if 'max' in stats:
+        col = np.full(n_groups, np.nan)
+        col[present] = np.maximum.reduceat(sorted_values, starts)
+        out['max'] = col
+    if 'median' in stats:
+        col = np.full(n_groups, np.nan)
+        for group, a, b in zip(present, starts, ends):
+            chunk = sorted_values[a:b]
+            mid = (b - a) // 2
+            if (b - a) % 2:
+                col[group] = np.partition(chunk, mid)[mid]
+            else:
+                part = np.partition(chunk, [mid - 1, mid])
+                col[group] = (part[mid - 1] + part[mid]) / 2
+        out['median'] = col
+    return out
+
+
+def _reduce(codes, values, n_groups, stats):
+    count = np.bincount(codes, minlength=n_groups)
+    out = {'count': count}
+    if {'sum', 'mean', 'std', 'var'} & set(stats):
+        total = np.bincount(codes, weights=values, minlength=n_groups)
+        out['sum'] = total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            out['mean'] = mean
+            if {'std', 'var'} & set(stats):
+                # Variância pelos desvios em torno da média do grupo (estável numericamente)
+                dev = values - mean[codes]
+                var = np.bincount(codes, weights=dev * dev, minlength=n_groups) / (count - 1)
+                var[count < 2] = np.nan
+                out['var'] = var
+                out['std'] = np.sqrt(var)
+    if {'min', 'max', 'median'} & set(stats):
+        out.update(_sorted_reduce(codes, values, n_groups, stats))
+    return out
+
+
+def _index(keys, group_ids, remap):
+    if remap is not None:
+        group_ids = remap[group_ids]
+    if not keys:
+        return None
+    if len(keys) == 1:
+        index = keys[0].labels(group_ids)
+        return index.rename(keys[0].name)
+    positions = np.unravel_index(group_ids, [key.size for key in keys])
+    return pd.MultiIndex.from_arrays(
+        [key.labels(pos) for key, pos in zip(keys, positions)],
+        names=[key.name for key in keys],
+    )
+
+
+def plain_index(index):
+    """
+    Troca níveis categóricos pelos valores, para alinhar tabelas parciais de
+    blocos com categorias diferentes (`ssp_stream`, `materialized`).
+    """
+    levels = [np.asarray(index.get_level_values(i)) for i in range(index.nlevels)]
+    if index.nlevels == 1:
+        return pd.Index(levels[0], name=index.name)
+    return pd.MultiIndex.from_arrays(levels, names=index.names)
+
+
+def grouped_aggregate(df, value, specs):
+    """
+    Calcula várias agregações de `df[value]` de uma vez. `df` pode ser um
+    DataFrame ou um dict coluna -> Series.
+
+    `specs` mapeia nome -> dict com:
+    - by: lista de colunas-chave (lista vazia = total geral, devolve escalar
+      quando há uma única estatística);
+    - stats: estatísticas entre count, sum, mean, std, var, min, max, median;
+    - where: máscara booleana opcional de linhas;
+    - observed: com False, inclui todas as combinações de chaves (como
+      `groupby(..., observed=False)`), com NaN nas vazias.
+
+    Devolve nome -> Series (uma estatística) ou DataFrame (várias), com grupos
+    ordenados pela chave, como o `groupby` padrão.
+    """
+    values = pd.to_numeric(df[value], errors='coerce').to_numpy(dtype=np.float64)
+    finite = ~np.isnan(values)
+
+    keys = {}
+    for spec in specs.values():
+        for col in spec.get('by', []):
+            if col not in keys:
+                keys[col] = KeyCodes(df[col])
+
+    tables = {}
+    for name, spec in specs.items():
+        stats = list(spec.get('stats', ['mean']))
+        unknown = set(stats) - set(STATS)
+        if unknown:
+            raise ValueError(f"Estatística(s) não suportada(s) em '{name}': {sorted(unknown)}")
+
+        spec_keys = [keys[col] for col in spec.get('by', [])]
+        mask = finite if spec.get('where') is None else finite & np.asarray(spec['where'], dtype=bool)
+        codes, valid, n_groups, remap = _combine(spec_keys, mask)
+        reduced = _reduce(codes, values[valid], n_groups, stats)
+
+        if not spec_keys:
+            result = pd.Series({stat: reduced[stat][0] for stat in stats})
+            tables[name] = result.iloc[0] if len(stats) == 1 else result
+            continue
+
+        if spec.get('observed', True) or remap is not None:
+            group_ids = np.flatnonzero(reduced['count'])
+        else:
+            group_ids = np.arange(n_groups)
+        frame = pd.DataFrame({stat: reduced[stat][group_ids] for stat in stats},
+                             index=_index(spec_keys, group_ids, remap))
+        if 'count' in frame:
+            frame['count'] = frame['count'].astype(np.int64)
+        tables[name] = frame[stats[0]] if len(stats) == 1 else frame
+    return tables
+
+
+# ---------------------------------------------------------------------------
+# Tabelas do notebook de veículos (src/vehicle-notebook.py)
+# ---------------------------------------------------------------------------
+
+def fuel_period(year, start=2000, width=4):
+    """
+    Faixas de 4 anos usadas no gráfico de combustível. Mesmo resultado do
+    `pd.cut(..., right=False)` do notebook, calculado direto nos códigos.
+    """
+    year = pd.to_numeric(year, errors='coerce')
+    recent = year[year >= start]
+    last = int(recent.max()) if len(recent) else start
+    bins = np.arange(start, last + 5, width)
+    labels = [f"{b}-{b+width-1}" for b in bins[:-1]]
+
+    values = year.to_numpy(dtype=np.float64)
+    inside = (values >= bins[0]) & (values < bins[-1])
+    codes = np.full(len(values), -1, dtype=np.int8 if len(labels) < 127 else np.int32)
+    codes[inside] = ((values[inside] - start) // width).astype(codes.dtype)
+    dtype = pd.CategoricalDtype(labels, ordered=True)
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=year.index, name='group')
+
+
+def vehicle_specs(df):
+    """
+    Agregações de preço do notebook de veículos, no formato de `grouped_aggregate`.
+    """
+    return {
+        'preco_total': {'by': [], 'stats': ['mean']},
+        'preco_medio_por_ano': {'by': ['year'], 'stats': ['mean']},
+        'preco_marca_donos': {'by': ['make', 'owner_count'], 'stats': ['mean']},
+        'preco_medio_marca': {'by': ['make'], 'stats': ['mean']},
+        'preco_acidentes': {'by': ['accident_history'], 'stats': ['mean', 'median', 'count']},
+        'preco_medio_carroceria': {'by': ['body_type'], 'stats': ['mean']},
+        'preco_combustivel_periodo': {
+            'by': ['fuel_type', 'group'],
+            'stats': ['mean'],
+            'where': (pd.to_numeric(df['year'], errors='coerce') >= 2000).to_numpy(),
+            'observed': False,
+        },
+    }
+
+
+def vehicle_tables(df):
+    """
+    Todas as tabelas de preço do notebook de veículos numa única chamada.
+    """
+    specs = vehicle_specs(df)
+    # Só as colunas usadas, sem copiar o DataFrame para acrescentar `group`
+    columns = {col: df[col] for spec in specs.values() for col in spec['by'] if col != 'group'}
+    columns['price'] = df['price']
+    columns['group'] = df['group'] if 'group' in df.columns else fuel_period(df['year'])
+    return grouped_aggregate(columns, 'price', specs)
+
+
+def _pandas_tables(df):
+    # Implementação de referência: os groupby do notebook, um de cada vez
+    price = pd.to_numeric(df['price'], errors='coerce')
+    df = df.assign(price=price, group=fuel_period(df['year']))
+    recent = df[df['year'] >= 2000]
+    return {
+        'preco_total': df['price'].mean(),
+        'preco_medio_por_ano': df.groupby('year')['price'].mean(),
+        'preco_marca_donos': df.groupby(['make', 'owner_count'], observed=True)['price'].mean(),
+        'preco_medio_marca': df.groupby('make', observed=True)['price'].mean(),
+        'preco_acidentes': df.groupby('accident_history', observed=True)['price'].agg(['mean', 'median', 'count']),
+        'preco_medio_carroceria': df.groupby('body_type', observed=True)['price'].mean(),
+        'preco_combustivel_periodo': recent.dropna(subset=['price', 'fuel_type'])
+        .groupby(['fuel_type', 'group'], observed=False)['price'].mean(),
+    }
+
+
+def compare_with_pandas(df, rtol=1e-9):
+    """
+    Confere `vehicle_tables` contra os groupby do pandas e mede os dois.
+    """
+    start = time.perf_counter()
+    ours = vehicle_tables(df)
+    engine_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = _pandas_tables(df)
+    pandas_s = time.perf_counter() - start
+
+    for name, expected in reference.items():
+        got = ours[name]
+        if np.isscalar(expected):
+            np.testing.assert_allclose(got, expected, rtol=rtol)
+        else:
+            np.testing.assert_allclose(np.asarray(got, dtype=float), np.asarray(expected, dtype=float),
+                                       rtol=rtol, err_msg=name)
+            assert list(map(str, got.index)) == list(map(str, expected.index)), name
+    return {'linhas': len(df), 'motor_s': engine_s, 'pandas_s': pandas_s}
+
+
+def main():
+    from dataset_cache import VEHICLE_RECIPE, load_dataset
+
+    parser = argparse.ArgumentParser(description='Compara o motor de agregação com os groupby do pandas.')
+    parser.add_argument('path', help='CSV de veículos')
+    parser.add_argument('--categories', action='store_true', help='carrega textos como category')
+    args = parser.parse_args()
+
+    df = load_dataset(args.path, VEHICLE_RECIPE, categories=args.categories)
+    res = compare_with_pandas(df)
+    print(f"{res['linhas']} linhas | motor: {res['motor_s']:.3f}s | pandas: {res['pandas_s']:.3f}s "
+          f"({res['pandas_s'] / res['motor_s']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
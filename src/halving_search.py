@@ -0,0 +1,248 @@
+"""
+Busca por successive halving para a comparação de modelos do AG News.
+
+O grid exaustivo do notebook avalia todas as combinações em todos os folds
+com o treino completo (Random Forest: 27 combinações x 5 folds; SVC: 12 x 5
+sobre TF-IDF de alta dimensão), mesmo as que já perdem feio com uma fração
+dos dados. `CachedHalvingGridSearchCV` segue o esquema do
+`HalvingGridSearchCV` do scikit-learn, usando o número de amostras de treino
+como recurso:
+
+- na iteração i todos os candidatos restantes são avaliados em todos os folds,
+  treinando com `r_i = r_0 * factor**i` linhas do fold (subconjuntos
+  aninhados e estratificados) e validando no fold de validação completo;
+- só os `ceil(n / factor)` melhores seguem para a próxima iteração;
+- com `min_resources='exhaust'`, `r_0` é escolhido para que a última iteração
+  use o treino inteiro do fold.
+
+As matrizes vêm do `FeatureCache` (src/feature_cache.py), então encolher o
+treino não exige retokenizar o texto.
+
+Uso no notebook (`search='halving'` em `train_and_evaluate_model`):
+
+    from halving_search import CachedHalvingGridSearchCV
+
+    grid_search = CachedHalvingGridSearchCV(pipeline, pipeline_param_grid, features,
+                                            scoring='f1_weighted', n_jobs=-1)
+    grid_search.fit(X_train, y_train)
+
+Comparação de tempo e melhor F1 contra o grid completo:
+
+    python src/halving_search.py data/agnews.csv --models "Random Forest" "K-Nearest Neighbors"
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid
+
+from feature_cache import CachedGridSearchCV
+
+# Mesmos modelos e grids do notebook
+NOTEBOOK_PARAM_GRIDS = {
+    'Logistic Regression': {'C': [0.1, 1, 10], 'solver': ['liblinear', 'saga']},
+    'Support Vector Machine': {'C': [0.1, 1, 10], 'kernel': ['linear', 'rbf'], 'gamma': ['scale', 'auto']},
+    'Multinomial Naive Bayes': {'alpha': [0.1, 0.5, 1.0, 2.0]},
+    'Random Forest': {'n_estimators': [50, 100, 200], 'max_depth': [None, 10, 20],
+                      'min_samples_split': [2, 5, 10]},
+    'K-Nearest Neighbors': {'n_neighbors': [3, 5, 7, 9], 'weights': ['uniform', 'distance'],
+                            'metric': ['euclidean', 'manhattan']},
+}
+
+
+def notebook_models():
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.svm import SVC
+
+    return {
+        'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000),
+        'Support Vector Machine': SVC(random_state=42),
+        'Multinomial Naive Bayes': MultinomialNB(),
+        'Random Forest': RandomForestClassifier(random_state=42),
+        'K-Nearest Neighbors': KNeighborsClassifier(),
+    }
+
+
+def stratified_order(y, random_state=0):
+    """
+    Permutação das linhas em que qualquer prefixo mantém (aproximadamente) a
+    proporção das classes.
+    """
+    rng = np.random.default_rng(random_state)
+    perm = rng.permutation(len(y))
+    _, codes, counts = np.unique(y[perm], return_inverse=True, return_counts=True)
+    rank_in_class = np.empty(len(y), dtype=np.float64)
+    for c in range(len(counts)):
+        members = np.flatnonzero(codes == c)
+        rank_in_class[members] = (np.arange(len(members)) + 0.5) / len(members)
+    return perm[np.argsort(rank_in_class, kind='stable')]
+
+
+class CachedHalvingGridSearchCV(CachedGridSearchCV):
+    """
+    Successive halving sobre o tamanho do treino, com a mesma interface do
+    `CachedGridSearchCV`. `cv_results_` tem uma linha por (iteração, candidato).
+    """
+
+    def __init__(self, estimator, param_grid, features, factor=3, min_resources='exhaust',
+                 random_state=0, scoring=None, n_jobs=None, verbose=0, refit=True, share_neighbors=True,
+                 reuse_kernel=True, warm_start_path=False):
+        super().__init__(estimator, param_grid, features, scoring=scoring, n_jobs=n_jobs,
+                         verbose=verbose, refit=refit, share_neighbors=share_neighbors,
+                         reuse_kernel=reuse_kernel, warm_start_path=warm_start_path)
+        self.factor = factor
+        self.min_resources = min_resources
+        self.random_state = random_state
+
+    def _schedule(self, n_candidates, max_resources, n_classes):
+        # Menor treino útil: o mesmo piso do 'smallest' do scikit-learn
+        smallest = 2 * self.features.n_splits * n_classes
+        needed = 1 + int(math.floor(math.log(n_candidates, self.factor))) if n_candidates > 1 else 1
+        if self.min_resources == 'exhaust':
+            r0 = max(smallest, max_resources // self.factor ** (needed - 1))
+        elif self.min_resources == 'smallest':
+            r0 = smallest
+        else:
+            r0 = int(self.min_resources)
+        possible = 1 + int(math.floor(math.log(max(max_resources / r0, 1), self.factor)))
+        n_iterations = min(needed, possible)
+        return [min(r0 * self.factor ** i, max_resources) for i in range(n_iterations)]
+
+    def fit(self, X, y):
+        if len(X) != len(self.features.texts):
+            raise ValueError('X não corresponde ao conjunto usado no FeatureCache')
+        candidates = list(ParameterGrid(self.param_grid))
+        y_all = self.features.y
+        orders = [stratified_order(y_all[train_idx], self.random_state + fold)
+                  for fold, (train_idx, _) in enumerate(self.features.splits)]
+        max_resources = min(len(order) for order in orders)
+        self.n_resources_ = self._schedule(len(candidates), max_resources, len(np.unique(y_all)))
+        self.n_candidates_ = []
+
+        results = {'iter': [], 'n_resources': [], 'params': [], 'mean_test_score': [], 'std_test_score': []}
+        remaining = list(range(len(candidates)))
+        self.n_fits_ = 0
+        for it, n_resources in enumerate(self.n_resources_):
+            self.n_candidates_.append(len(remaining))
+            if self.verbose:
+                print(f'iter {it}: {len(remaining)} candidatos, {n_resources} amostras de treino por fold')
+            rows = [order[:n_resources] for order in orders]
+            scores = self._evaluate([candidates[i] for i in remaining], rows)[self.refit_metric]
+            self.n_fits_ += scores.size
+            mean = scores.mean(axis=1)
+            for pos, i in enumerate(remaining):
+                results['iter'].append(it)
+                results['n_resources'].append(n_resources)
+                results['params'].append(candidates[i])
+                results['mean_test_score'].append(mean[pos])
+                results['std_test_score'].append(scores[pos].std())
+
+            ranked = np.argsort(-np.where(np.isnan(mean), -np.inf, mean), kind='stable')
+            if it < len(self.n_resources_) - 1:
+                keep = int(math.ceil(len(remaining) / self.factor))
+                remaining = [remaining[p] for p in sorted(ranked[:keep])]
+            else:
+                best = remaining[ranked[0]]
+
+        self.cv_results_ = {key: np.asarray(val) if key != 'params' else val for key, val in results.items()}
+        self.n_iterations_ = len(self.n_resources_)
+        self.best_params_ = candidates[best]
+        last = len(results['iter']) - len(remaining) + int(np.flatnonzero(np.asarray(remaining) == best)[0])
+        self.best_index_ = last
+        self.best_score_ = float(results['mean_test_score'][last])
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+
+def _warm_features(features, pipeline, param_grid):
+    # Calcula as matrizes antes de cronometrar, para nenhuma das buscas pagar a tokenização
+    vect = pipeline.named_steps['vect']
+    for params in ParameterGrid(param_grid):
+        vect_params = {k[len('vect__'):]: v for k, v in params.items() if k.startswith('vect__')}
+        candidate_vect = clone(vect).set_params(**vect_params)
+        for fold in range(features.n_splits):
+            features.features(fold, candidate_vect)
+
+
+def compare_with_grid(pipeline, param_grid, features, X_train, y_train, X_test, y_test,
+                      scoring='f1_weighted', n_jobs=None, factor=3):
+    """
+    Roda o grid completo e o halving com o mesmo pipeline e devolve tempo,
+    número de ajustes, melhor F1 de validação e F1 no teste de cada um.
+    """
+    _warm_features(features, pipeline, param_grid)
+    searches = {
+        'grid': CachedGridSearchCV(pipeline, param_grid, features, scoring=scoring, n_jobs=n_jobs),
+        'halving': CachedHalvingGridSearchCV(pipeline, param_grid, features, factor=factor,
+                                             scoring=scoring, n_jobs=n_jobs),
+    }
+    report = {}
+    for name, search in searches.items():
+        start = time.perf_counter()
+        search.fit(X_train, y_train)
+        elapsed = time.perf_counter() - start
+        n_fits = getattr(search, 'n_fits_', len(search.cv_results_['params']) * features.n_splits)
+        report[name] = {
+            'segundos': elapsed,
+            'ajustes': n_fits,
+            'melhores_parametros': search.best_params_,
+            'f1_cv': search.best_score_,
+            'f1_teste': f1_score(y_test, search.predict(X_test), average='weighted'),
+        }
+    report['economia_s'] = report['grid']['segundos'] - report['halving']['segundos']
+    report['diferenca_f1_teste'] = report['halving']['f1_teste'] - report['grid']['f1_teste']
+    return report
+
+
+def main():
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+    from sklearn.pipeline import Pipeline
+
+    from feature_cache import FeatureCache
+    from text_preprocess import TextPreprocessor
+
+    parser = argparse.ArgumentParser(description='Successive halving vs. grid completo no AG News (TF-IDF).')
+    parser.add_argument('path', help='CSV do AG News (colunas Title e Description)')
+    parser.add_argument('--models', nargs='+', default=list(NOTEBOOK_PARAM_GRIDS), choices=list(NOTEBOOK_PARAM_GRIDS))
+    parser.add_argument('--factor', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=-1)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    texts = TextPreprocessor().transform(df['Title'] + ' ' + df['Description'])
+    X = pd.Series(texts, index=df.index)
+    y = df['Class Index'] - 1
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    features = FeatureCache(X_train, y_train, StratifiedKFold(n_splits=5, shuffle=True, random_state=42))
+
+    models = notebook_models()
+    total = {'grid': 0.0, 'halving': 0.0}
+    for name in args.models:
+        pipeline = Pipeline([('vect', TfidfVectorizer()), ('clf', models[name])])
+        param_grid = {f'clf__{k}': v for k, v in NOTEBOOK_PARAM_GRIDS[name].items()}
+        report = compare_with_grid(pipeline, param_grid, features, X_train, y_train, X_test, y_test,
+                                   n_jobs=args.jobs, factor=args.factor)
+        print(f'\n{name}')
+        for mode in ('grid', 'halving'):
+            r = report[mode]
+            total[mode] += r['segundos']
+            print(f"  {mode:8s} {r['segundos']:7.1f}s {r['ajustes']:4d} ajustes  F1 cv {r['f1_cv']:.4f}  "
+                  f"F1 teste {r['f1_teste']:.4f}  {r['melhores_parametros']}")
+        print(f"  economia {report['economia_s']:.1f}s, diferença de F1 no teste {report['diferenca_f1_teste']:+.4f}")
+
+    print(f"\nTotal: grid {total['grid']:.1f}s, halving {total['halving']:.1f}s "
+          f"({total['grid'] - total['halving']:.1f}s economizados)")
+
+
+if __name__ == '__main__':
+    main()
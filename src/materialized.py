@@ -0,0 +1,319 @@
+"""
+Agregados materializados e incrementais para o dataset de veículos.
+
+Novos anúncios chegam todos os dias e hoje todas as tabelas do notebook são
+recalculadas do zero. `AggregateStore` guarda, para cada chave de cada
+agrupamento, estatísticas suficientes e mescláveis:
+
+- count, sum e M2 (soma dos quadrados dos desvios em torno da média, a forma
+  numericamente estável da soma dos quadrados; mesclada pela fórmula de Chan);
+- um sketch KLL (src/sketches.py) por grupo quando a mediana é pedida.
+
+`update(lote)` processa só as linhas do lote e mescla o resultado nas tabelas
+guardadas, com custo proporcional ao lote e ao número de grupos (nunca ao
+tamanho da base). Médias, contagens e desvios batem com o recálculo completo;
+medianas são exatas enquanto o grupo tem até `k` valores e, depois disso,
+ficam dentro do erro de rank do sketch.
+
+Uso:
+
+    from materialized import AggregateStore
+
+    caminho = Path('../data/.cache/veiculos.store')
+    store = AggregateStore.load(caminho) if caminho.exists() else AggregateStore()
+    store.update(novos_anuncios)
+    store.save(caminho)
+    tabelas = store.tables()
+"""
+
+import argparse
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from groupagg import fuel_period, grouped_aggregate, plain_index, vehicle_tables
+from sketches import DEFAULT_K, KLLSketch
+
+# Mesmas tabelas de groupagg.vehicle_tables, no formato do store
+VEHICLE_STORE_SPECS = {
+    'preco_total': {'by': [], 'stats': ['mean']},
+    'preco_medio_por_ano': {'by': ['year'], 'stats': ['mean']},
+    'preco_marca_donos': {'by': ['make', 'owner_count'], 'stats': ['mean']},
+    'preco_medio_marca': {'by': ['make'], 'stats': ['mean']},
+    'preco_acidentes': {'by': ['accident_history'], 'stats': ['mean', 'median', 'count']},
+    'preco_medio_carroceria': {'by': ['body_type'], 'stats': ['mean']},
+    'preco_combustivel_periodo': {
+        'by': ['fuel_type', 'group'],
+        'stats': ['mean'],
+        'where': lambda batch: pd.to_numeric(batch['year'], errors='coerce') >= 2000,
+        'observed': False,
+    },
+}
+
+STATE_COLUMNS = ['count', 'sum', 'm2']
+
+
+def merge_moments(left, right):
+    """
+    Mescla dois DataFrames (count, sum, m2) indexados pela chave do grupo.
+    """
+    left, right = left.align(right, join='outer', fill_value=0)
+    n_a, n_b = left['count'], right['count']
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = right['sum'] / n_b - left['sum'] / n_a
+        cross = (delta ** 2 * n_a * n_b / n).where((n_a > 0) & (n_b > 0), 0.0)
+    return pd.DataFrame({
+        'count': n.astype(np.int64),
+        'sum': left['sum'] + right['sum'],
+        'm2': left['m2'] + right['m2'] + cross,
+    })
+
+
+class AggregateStore:
+    """
+    Tabelas de agregados de `value` que crescem por lotes.
+    """
+
+    def __init__(self, specs=None, value='price', k=DEFAULT_K):
+        self.specs = VEHICLE_STORE_SPECS if specs is None else specs
+        self.value = value
+        self.k = k
+        self.moments = {}
+        self.sketches = {name: {} for name, spec in self.specs.items() if 'median' in spec.get('stats', [])}
+        # Valores declarados de cada chave nas specs com observed=False (categorias ou valores vistos)
+        self.categories = {name: [pd.Index([]) for _ in spec['by']]
+                           for name, spec in self.specs.items() if not spec.get('observed', True)}
+        self.n_rows = 0
+        self.n_batches = 0
+
+    def _prepare(self, batch):
+        needed = {col for spec in self.specs.values() for col in spec['by']}
+        if 'group' in needed and 'group' not in batch.columns:
+            batch = batch.assign(group=fuel_period(batch['year']))
+        return batch
+
+    def update(self, batch):
+        """
+        Mescla um lote de linhas novas. Custo proporcional ao tamanho do lote.
+        """
+        batch = self._prepare(batch)
+        agg_specs = {}
+        for name, spec in self.specs.items():
+            where = spec.get('where')
+            agg_specs[name] = {
+                'by': spec['by'],
+                'stats': ['count', 'sum', 'var'],
+                'where': None if where is None else np.asarray(where(batch), dtype=bool),
+            }
+        partials = grouped_aggregate(batch, self.value, agg_specs)
+
+        for name, partial in partials.items():
+            if self.specs[name]['by']:
+                partial = partial.copy()
+                partial.index = plain_index(partial.index)
+            else:
+                partial = partial.to_frame('total').T
+            partial['m2'] = (partial['var'] * (partial['count'] - 1)).fillna(0.0)
+            partial = partial[STATE_COLUMNS]
+            previous = self.moments.get(name)
+            self.moments[name] = partial if previous is None else merge_moments(previous, partial)
+
+        for name, groups in self.sketches.items():
+            self._update_sketches(name, batch, groups)
+        for name, declared in self.categories.items():
+            self._update_categories(name, batch, declared)
+
+        self.n_rows += len(batch)
+        self.n_batches += 1
+        return self
+
+    def _update_sketches(self, name, batch, groups):
+        spec = self.specs[name]
+        values = pd.to_numeric(batch[self.value], errors='coerce')
+        if spec.get('where') is not None:
+            keep = np.asarray(spec['where'](batch), dtype=bool)
+            batch, values = batch[keep], values[keep]
+        keys = [batch[col] for col in spec['by']]
+        grouped = values.groupby(keys, observed=True, sort=False) if keys else [((), values)]
+        for key, vals in grouped:
+            key = tuple(k.item() if isinstance(k, np.generic) else k for k in key)
+            if key not in groups:
+                groups[key] = KLLSketch(self.k, seed=len(groups))
+            groups[key].update(vals.to_numpy(dtype=np.float64))
+
+    def _update_categories(self, name, batch, declared):
+        # Como o groupby(observed=False): todas as categorias da coluna, ou todos os
+        # valores do lote quando ela não é categórica (inclusive fora do `where`)
+        for i, col in enumerate(self.specs[name]['by']):
+            values = batch[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.categories
+            else:
+                values = pd.Index(values.dropna().unique())
+            declared[i] = declared[i].union(values.astype(object))
+
+    def table(self, name):
+        """
+        Tabela de um agrupamento no mesmo formato de `vehicle_tables`.
+        """
+        spec = self.specs[name]
+        state = self.moments[name]
+        stats = spec.get('stats', ['mean'])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns = {
+                'count': state['count'],
+                'sum': state['sum'],
+                'mean': state['sum'] / state['count'],
+                'var': (state['m2'] / (state['count'] - 1)).where(state['count'] > 1),
+            }
+        columns['std'] = np.sqrt(columns['var'])
+        if 'median' in stats:
+            groups = self.sketches[name]
+            columns['median'] = pd.Series(
+                [groups[k if isinstance(k, tuple) else (k,)].median() for k in state.index],
+                index=state.index,
+            )
+        frame = pd.DataFrame({stat: columns[stat] for stat in stats}).sort_index()
+
+        if not spec['by']:
+            row = frame.iloc[0]
+            return row.iloc[0] if len(stats) == 1 else row
+        if not spec.get('observed', True):
+            declared = self.categories[name]
+            if len(declared) == 1:
+                full = declared[0].rename(spec['by'][0])
+            else:
+                full = pd.MultiIndex.from_product(declared, names=spec['by'])
+            frame = frame.reindex(full)
+        return frame[stats[0]] if len(stats) == 1 else frame
+
+    def tables(self):
+        return {name: self.table(name) for name in self.specs}
+
+    def save(self, path):
+        # `where` são lambdas: guardamos só o estado e reaplicamos as specs ao carregar
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {key: val for key, val in self.__dict__.items() if key != 'specs'}
+        with open(path, 'wb') as fh:
+            pickle.dump(state, fh)
+
+    @classmethod
+    def load(cls, path, specs=None):
+        store = cls(specs)
+        with open(path, 'rb') as fh:
+            store.__dict__.update(pickle.load(fh))
+        return store
+
+
+def check_against_full(store, df, rtol=1e-9):
+    """
+    Compara as tabelas do store com `vehicle_tables(df)` (recálculo completo).
+    Médias/contagens com tolerância `rtol`; medianas pelo erro de rank do sketch.
+    """
+    full = vehicle_tables(df)
+    for name, expected in full.items():
+        got = store.table(name)
+        if np.isscalar(expected):
+            np.testing.assert_allclose(got, expected, rtol=rtol, err_msg=name)
+            continue
+        got_index = [tuple(map(str, k)) if isinstance(k, tuple) else str(k) for k in got.index]
+        exp_index = [tuple(map(str, k)) if isinstance(k, tuple) else str(k) for k in expected.index]
+        assert got_index == exp_index, f'{name}: grupos diferentes'
+        expected = expected.to_frame() if isinstance(expected, pd.Series) else expected
+        got = got.to_frame() if isinstance(got, pd.Series) else got
+        for stat in expected.columns:
+            if stat == 'median':
+                continue
+            np.testing.assert_allclose(got[stat].to_numpy(float), expected[stat].to_numpy(float),
+                                       rtol=rtol, err_msg=f'{name}.{stat}')
+
+    for name, groups in store.sketches.items():
+        by = store.specs[name]['by']
+        price = pd.to_numeric(df[store.value], errors='coerce')
+        for key, vals in price.groupby([df[col] for col in by], observed=True):
+            sketch = groups[key if isinstance(key, tuple) else (key,)]
+            vals = vals.dropna().to_numpy()
+            est = sketch.median()
+            if sketch.exact:
+                np.testing.assert_allclose(est, np.median(vals), rtol=rtol)
+            else:
+                rank = (vals <= est).mean()
+                assert abs(rank - 0.5) <= sketch.rank_error() + 1 / len(vals), f'{name}{key}: rank {rank:.4f}'
+    return True
+
+
+def check_declared_categories():
+    """
+    Regressão: em 'preco_combustivel_periodo' (observed=False) as combinações
+    vazias vêm das categorias declaradas, não só dos valores observados. Diesel
+    só aparece antes de 2000 e várias faixas de período não têm nenhum carro.
+    """
+    df = pd.DataFrame({
+        'make': ['Audi', 'Kia', 'Audi', 'Ford'],
+        'owner_count': [1, 2, 1, 3],
+        'accident_history': ['None', 'Minor', 'N.A', 'None'],
+        'body_type': ['Sedan', 'SUV', 'Sedan', 'Coupe'],
+        'fuel_type': ['Gasoline', 'Gasoline', 'Diesel', 'Electric'],
+        'year': [2001, 2010, 1995, 2022],
+        'price': [20_000.0, 15_000.0, 9_000.0, 40_000.0],
+    })
+    store = AggregateStore().update(df.iloc[[0, 2]]).update(df.iloc[[1, 3]])
+    check_against_full(store, df)
+    assert store.table('preco_combustivel_periodo').shape == (3 * 6,)
+    return True
+
+
+def benchmark(df, base_sizes=(100_000, 200_000, 400_000, 800_000), batch_size=5_000, seed=0):
+    """
+    Custo de incorporar um lote de `batch_size` linhas no store vs. recalcular
+    todas as tabelas com `vehicle_tables` sobre base + lote.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for size in base_sizes:
+        base = df.iloc[rng.integers(0, len(df), size)].reset_index(drop=True)
+        batch = df.iloc[rng.integers(0, len(df), batch_size)].reset_index(drop=True)
+
+        store = AggregateStore().update(base)
+        start = time.perf_counter()
+        store.update(batch)
+        update_s = time.perf_counter() - start
+
+        combined = pd.concat([base, batch], ignore_index=True)
+        start = time.perf_counter()
+        vehicle_tables(combined)
+        full_s = time.perf_counter() - start
+
+        rows.append({'base': size, 'lote': batch_size, 'incremental_s': update_s,
+                     'recalculo_s': full_s, 'ganho': full_s / update_s})
+    return pd.DataFrame(rows)
+
+
+def main():
+    from dataset_cache import VEHICLE_RECIPE, load_dataset
+
+    parser = argparse.ArgumentParser(description='Benchmark do store de agregados incrementais.')
+    parser.add_argument('path', help='CSV de veículos')
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 200_000, 400_000, 800_000])
+    args = parser.parse_args()
+
+    df = load_dataset(args.path, VEHICLE_RECIPE)
+
+    store = AggregateStore()
+    for batch in np.array_split(np.arange(len(df)), 10):
+        store.update(df.iloc[batch])
+    check_against_full(store, df)
+    check_declared_categories()
+    print(f'Store confere com o recálculo completo ({len(df)} linhas em 10 lotes).\n')
+
+    print(benchmark(df, args.sizes, args.batch_size).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
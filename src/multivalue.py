@@ -0,0 +1,302 @@
+"""
+Colunas multivaloradas (listas separadas por vírgula) em formato CSR.
+
+No notebook do IMDb, `genre`, `language`, `country_origin` e `writer` guardam
+listas como texto ("Drama, Romance"). As análises de ROI e de indicações
+explodem os gêneros com `str.split(', ', expand=True).stack()` + `join`: cada
+vez é montado um DataFrame largo com preenchimento e uma cópia de todas as
+outras colunas por (filme, gênero).
+
+`MultiValueColumn` codifica a coluna uma única vez como
+- `offsets` (n_linhas + 1): os valores da linha i ficam em `codes[offsets[i]:offsets[i + 1]]`;
+- `codes`: índice de cada valor em `categories`.
+
+O split é feito só nos textos distintos (muitos filmes repetem a mesma
+combinação de gêneros) e espalhado para as linhas com operações vetoriais.
+Somas, médias e contagens por categoria saem de `np.bincount` sobre os
+códigos, com pesos vindos da coluna numérica indexada pelo número da linha,
+sem materializar o DataFrame explodido. A semântica é a do notebook:
+valores repetidos numa linha contam duas vezes e NaN na coluna numérica é
+ignorado, como no `groupby`.
+
+Uso no notebook:
+
+    from multivalue import encode_columns
+
+    multi = encode_columns(df, ['genre', 'language', 'country_origin', 'writer'])
+    roi_by_genre = multi['genre'].group_mean(roi, rows=mask)
+
+Benchmark com uma tabela sintética de filmes (o CSV do IMDb não acompanha o repositório):
+
+    python src/multivalue.py --rows 1000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+MULTI_VALUE_COLUMNS = ['genre', 'language', 'country_origin', 'writer']
+SEPARATOR = ', '
+
+
+class MultiValueColumn:
+    """
+    Coluna de listas em formato CSR (offsets, codes) + categorias.
+    """
+
+    def __init__(self, offsets, codes, categories, name=None):
+        self.offsets = offsets
+        self.codes = codes
+        self.categories = categories
+        self.name = name
+
+    @classmethod
+    def from_series(cls, series, sep=SEPARATOR):
+        """
+        Codifica uma Series de textos; NaN vira uma linha sem valores.
+        """
+        row_codes, uniques = pd.factorize(series, use_na_sentinel=True)
+
+        # Split apenas dos textos distintos: juntar com o próprio separador e
+        # quebrar uma vez dá os valores de todos em sequência
+        uniques = [str(text) for text in uniques]
+        unique_lengths = np.zeros(len(uniques) + 1, dtype=np.int64)
+        unique_lengths[:-1] = np.fromiter((text.count(sep) + 1 for text in uniques), np.int64, len(uniques))
+        parts = sep.join(uniques).split(sep) if len(uniques) else []
+        unique_codes, vocabulary = pd.factorize(np.asarray(parts, dtype=object))
+        unique_codes = unique_codes.astype(np.int32)
+        unique_offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(unique_lengths[:-1], out=unique_offsets[1:])
+
+        # Linhas NaN (código -1) apontam para a posição extra de tamanho 0
+        row_codes = np.where(row_codes < 0, len(uniques), row_codes)
+        lengths = unique_lengths[row_codes]
+        offsets = np.zeros(len(series) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        starts = np.append(unique_offsets, 0)[row_codes]
+        within = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1], lengths)
+        codes = unique_codes[np.repeat(starts, lengths) + within]
+
+        return cls(offsets, codes, np.asarray(vocabulary, dtype=object), name=series.name)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def n_values(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.codes.nbytes
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def row_ids(self):
+        """
+        Número da linha de cada valor (o "explode" sem copiar nada além disso).
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.lengths())
+
+    def _values(self, values, rows):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) != len(self):
+            raise ValueError(f'Esperado um valor por linha ({len(self)}), recebido {len(values)}')
+        row_ids = self.row_ids()
+        weights = values[row_ids]
+        valid = ~np.isnan(weights)
+        if rows is not None:
+            valid &= np.asarray(rows, dtype=bool)[row_ids]
+        return self.codes[valid], weights[valid]
+
+    def _result(self, array, present):
+        result = pd.Series(array[present], index=pd.Index(self.categories[present], name=self.name))
+        return result.sort_index()
+
+    def value_counts(self, rows=None):
+        """
+        Número de linhas (com repetição) em que cada categoria aparece.
+        """
+        codes = self.codes if rows is None else self.codes[np.asarray(rows, dtype=bool)[self.row_ids()]]
+        counts = np.bincount(codes, minlength=len(self.categories))
+        return self._result(counts, counts > 0).sort_values(ascending=False, kind='stable')
+
+    def group_agg(self, values, rows=None):
+        """
+        DataFrame com sum, count e mean de `values` (um valor por linha) por
+        categoria. `rows` é uma máscara booleana de linhas a considerar.
+        """
+        codes, weights = self._values(values, rows)
+        size = len(self.categories)
+        sums = np.bincount(codes, weights=weights, minlength=size)
+        counts = np.bincount(codes, minlength=size)
+        present = counts > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        return pd.DataFrame({
+            'sum': self._result(sums, present),
+            'count': self._result(counts, present),
+            'mean': self._result(means, present),
+        })
+
+    def group_sum(self, values, rows=None):
+        return self.group_agg(values, rows)['sum']
+
+    def group_mean(self, values, rows=None):
+        return self.group_agg(values, rows)['mean']
+
+    def explode(self):
+        """
+        Series explodida (índice = número da linha), para quem ainda precisar dela.
+        """
+        return pd.Series(self.categories[self.codes], index=self.row_ids(), name=self.name)
+
+
+def encode_columns(df, columns=MULTI_VALUE_COLUMNS, sep=SEPARATOR):
+    """
+    {coluna: MultiValueColumn} para as colunas de `df` presentes em `columns`.
+    """
+    return {col: MultiValueColumn.from_series(df[col], sep) for col in columns if col in df.columns}
+
+
+def genre_roi(genres, budget, gross, rows=None):
+    """
+    ROI por gênero: `roi_medio` é a média do ROI de cada filme (o número do
+    notebook); `roi_agregado` é (bilheteria total - orçamento total) / orçamento total.
+    Considera só filmes com orçamento > 0 e bilheteria conhecida.
+    """
+    budget = np.asarray(budget, dtype=np.float64)
+    gross = np.asarray(gross, dtype=np.float64)
+    mask = ~np.isnan(budget) & ~np.isnan(gross) & (np.nan_to_num(budget) > 0)
+    if rows is not None:
+        mask &= np.asarray(rows, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        roi = (gross - budget) / budget
+    per_film = genres.group_agg(roi, mask)
+    totals_budget = genres.group_sum(budget, mask)
+    totals_gross = genres.group_sum(gross, mask)
+    return pd.DataFrame({
+        'filmes': per_film['count'],
+        'roi_medio': per_film['mean'],
+        'roi_agregado': (totals_gross - totals_budget) / totals_budget,
+    })
+
+
+def synthetic_movies(n_rows, seed=0):
+    """
+    Tabela com as colunas do world_best_movies.csv usadas nas análises.
+    """
+    rng = np.random.default_rng(seed)
+    genres = np.array(['Drama', 'Comedy', 'Action', 'Crime', 'Adventure', 'Thriller', 'Romance', 'Horror',
+                       'Mystery', 'Biography', 'Sci-Fi', 'Fantasy', 'Family', 'Animation', 'History', 'War',
+                       'Music', 'Sport', 'Western', 'Musical', 'Documentary'])
+    languages = np.array(['English', 'French', 'Spanish', 'German', 'Italian', 'Japanese', 'Russian',
+                          'Hindi', 'Mandarin', 'Portuguese', 'Korean', 'Arabic', 'Latin', 'Swedish'])
+    countries = np.array(['United States', 'United Kingdom', 'France', 'Germany', 'Canada', 'India', 'Japan',
+                          'Italy', 'Spain', 'Australia', 'Brazil', 'South Korea', 'Mexico', 'China'])
+    writers = np.array([f'Writer {i}' for i in range(max(100, n_rows // 20))])
+
+    def lists(pool, max_len, p=None):
+        lengths = rng.integers(1, max_len + 1, n_rows)
+        picks = rng.choice(len(pool), (n_rows, max_len), p=p)
+        return [SEPARATOR.join(pool[picks[i, :k]]) for i, k in enumerate(lengths)]
+
+    weights = 1 / np.arange(1, len(genres) + 1)
+    budget = np.exp(rng.normal(16, 1.5, n_rows)).round()
+    budget[rng.random(n_rows) < 0.3] = np.nan
+    gross = budget * np.exp(rng.normal(0.5, 1.0, n_rows))
+    gross[rng.random(n_rows) < 0.1] = np.nan
+    return pd.DataFrame({
+        'title': [f'Movie {i}' for i in range(n_rows)],
+        'year': rng.integers(1960, 2025, n_rows),
+        'genre': lists(genres, 3, weights / weights.sum()),
+        'language': lists(languages, 2),
+        'country_origin': lists(countries, 2),
+        'writer': lists(writers, 3),
+        'rating_imdb': rng.normal(7.5, 0.6, n_rows).round(1),
+        'vote': rng.integers(1000, 2_000_000, n_rows),
+        'nomination': rng.poisson(1.5, n_rows).astype(float),
+        'budget': budget,
+        'gross_world_wide': gross,
+    })
+
+
+def notebook_aggregations(df):
+    """
+    ROI médio e soma de indicações por gênero como no notebook (explode + join).
+    """
+    df_filtered = df.dropna(subset=['budget', 'gross_world_wide', 'genre'])
+    df_filtered = df_filtered[df_filtered['budget'] > 0].copy()
+    df_filtered['roi'] = (df_filtered['gross_world_wide'] - df_filtered['budget']) / df_filtered['budget']
+    genres_expanded = df_filtered['genre'].str.split(', ', expand=True).stack().reset_index(level=1, drop=True)
+    genres_expanded.name = 'genre_split'
+    df_expanded = df_filtered.drop('genre', axis=1).join(genres_expanded)
+    roi_by_genre = df_expanded.groupby('genre_split')['roi'].mean()
+
+    df_filtered = df.dropna(subset=['nomination', 'genre'])
+    genres_expanded = df_filtered['genre'].str.split(', ', expand=True).stack().reset_index(level=1, drop=True)
+    genres_expanded.name = 'genre_split'
+    df_expanded = df_filtered.drop('genre', axis=1).join(genres_expanded)
+    genre_nominations = df_expanded.groupby('genre_split')['nomination'].sum()
+    return roi_by_genre, genre_nominations
+
+
+def csr_aggregations(df, genres):
+    roi_by_genre = genre_roi(genres, df['budget'], df['gross_world_wide'])['roi_medio']
+    genre_nominations = genres.group_sum(df['nomination'])
+    return roi_by_genre, genre_nominations
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def benchmark(df):
+    """
+    Tempo e pico de memória (tracemalloc) do explode do notebook vs. CSR,
+    conferindo que os resultados coincidem.
+    """
+    (roi_ref, nom_ref), nb_s, nb_mb = _measure(notebook_aggregations, df)
+    genres, enc_s, enc_mb = _measure(MultiValueColumn.from_series, df['genre'])
+    (roi, nom), agg_s, agg_mb = _measure(csr_aggregations, df, genres)
+    multi, all_s, all_mb = _measure(encode_columns, df)
+
+    pd.testing.assert_series_equal(roi.rename(None), roi_ref.rename(None), check_names=False,
+                                   check_index_type=False, rtol=1e-9)
+    pd.testing.assert_series_equal(nom.rename(None), nom_ref.rename(None), check_names=False,
+                                   check_index_type=False, check_dtype=False, rtol=1e-9)
+    return [
+        {'etapa': 'notebook: 2x split/stack/join + groupby', 'segundos': nb_s, 'pico_mb': nb_mb},
+        {'etapa': 'CSR: codificar genre', 'segundos': enc_s, 'pico_mb': enc_mb},
+        {'etapa': 'CSR: ROI + indicações por gênero', 'segundos': agg_s, 'pico_mb': agg_mb},
+        {'etapa': f'CSR: codificar as {len(multi)} colunas', 'segundos': all_s, 'pico_mb': all_mb},
+    ], multi
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Colunas multivaloradas em CSR vs. explode do pandas (IMDb).')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='filmes na tabela sintética')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = synthetic_movies(args.rows, args.seed)
+    rows, multi = benchmark(df)
+    print(f'{len(df)} filmes; resultados idênticos ao notebook')
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f'{v:.2f}'))
+    for name, column in multi.items():
+        print(f'  {name:15s} {column.n_values:9d} valores, {len(column.categories):7d} categorias, '
+              f'{column.nbytes / 2**20:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
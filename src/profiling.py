@@ -0,0 +1,441 @@
+"""
+Instrumentação por etapa para os notebooks e scripts: tempo de parede, CPU,
+pico de RSS e alocações, com trace JSON por execução, pilhas "folded" para
+flame graph e comparação entre duas execuções.
+
+Cada etapa (`with prof.stage('nome'):` ou `@prof.profile()`) registra:
+
+- `wall_s` e `cpu_s` (`time.process_time`, todas as threads do processo) e
+  `cpu_filhos_s` (CPU dos processos filhos vivos, ex.: workers do joblib com
+  `n_jobs=-1`, via psutil);
+- `rss_inicio_mb`, `rss_fim_mb`, `rss_pico_mb` (RSS amostrado a cada
+  `sample_interval` segundos por uma thread enquanto há etapa aberta) e
+  `rss_extra_mb` (pico - início: o que a própria etapa acrescentou);
+- com `allocations=True`, `alloc_delta_mb` e `alloc_pico_mb` (tracemalloc:
+  memória alocada pelo Python/NumPy). Fica desligado por padrão: o
+  tracemalloc deixa código com muitos objetos Python pequenos de 4 a 40
+  vezes mais lento (o `optimize_dtypes` do vehicle-notebook passa de 0.7 s
+  para 7 s), então só vale ligar para investigar uma etapa de memória.
+
+Etapas podem ser aninhadas; o caminho (`célula;grid SVC`) vira a pilha do
+flame graph. No Jupyter, `prof.watch_cells()` abre uma etapa por célula
+executada, rotulada pela ordem de execução e pela primeira linha da célula.
+
+Uso no notebook:
+
+    from profiling import Profiler
+
+    prof = Profiler('heart', trace_dir='../reports/profiles')
+    prof.watch_cells()
+    with prof.stage('read_csv'):
+        df = pd.read_csv('../data/heart.csv')
+    ...
+    prof.save()   # reports/profiles/heart-<data>.json e .folded
+
+Os `.folded` abrem no speedscope (https://www.speedscope.app) ou no
+flamegraph.pl. Comparar as duas últimas execuções do mesmo notebook
+(código de saída 1 se houver regressão):
+
+    python src/profiling.py compare reports/profiles heart
+    python src/profiling.py compare antes.json depois.json --tolerance 0.2
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+TRACE_VERSION = 1
+MB = 2 ** 20
+
+
+def _psutil_process():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+
+def _clean(name):
+    # ';' separa os quadros no formato folded e a quebra de linha separa as pilhas
+    return ' '.join(str(name).replace(';', ',').split())
+
+
+class _RssSampler(threading.Thread):
+    """
+    Amostra o RSS enquanto há etapas abertas e atualiza o pico de cada uma.
+    """
+
+    def __init__(self, profiler, interval):
+        super().__init__(daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.profiler._update_rss_peaks()
+
+
+class Profiler:
+    """
+    Coleta as etapas de uma execução e grava o trace.
+    """
+
+    def __init__(self, run, trace_dir='reports/profiles', allocations=False, sample_interval=0.01):
+        self.run = _clean(run)
+        self.trace_dir = Path(trace_dir)
+        self.allocations = allocations
+        self.sample_interval = sample_interval
+        self.started_at = datetime.now()
+        self._t0 = time.perf_counter()
+        self._process = _psutil_process()
+        self._stack = []
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._started_tracing = False
+        self._cell_count = 0
+        self._cell_stage = None
+        self.records = []
+
+    # Medições
+
+    def _rss_mb(self):
+        if self._process is not None:
+            return self._process.memory_info().rss / MB
+        # Sem psutil: o máximo histórico do processo é o que há
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / MB if sys.platform == 'darwin' else peak / 2 ** 10
+
+    def _children_cpu_s(self):
+        if self._process is None:
+            return 0.0
+        total = 0.0
+        for child in self._process.children(recursive=True):
+            try:
+                times = child.cpu_times()
+            except Exception:
+                continue
+            total += times.user + times.system
+        return total
+
+    def _update_rss_peaks(self, rss=None):
+        rss = self._rss_mb() if rss is None else rss
+        with self._lock:
+            for record in self._stack:
+                record['rss_pico_mb'] = max(record['rss_pico_mb'], rss)
+
+    def _update_alloc_peaks(self):
+        # O pico do tracemalloc é global: repassa para as etapas abertas e zera
+        current, peak = tracemalloc.get_traced_memory()
+        for record in self._stack:
+            record['_alloc_peak'] = max(record['_alloc_peak'], peak - record['_alloc_base'])
+        tracemalloc.reset_peak()
+        return current
+
+    # Etapas
+
+    def _enter(self, name):
+        if self.allocations and not tracemalloc.is_tracing():
+            # Liga só enquanto houver etapa aberta: fora delas o notebook roda sem o custo
+            tracemalloc.start()
+            self._started_tracing = True
+        rss = self._rss_mb()
+        record = {
+            'nome': _clean(name),
+            'caminho': ';'.join([r['nome'] for r in self._stack] + [_clean(name)]),
+            'profundidade': len(self._stack),
+            'inicio_s': time.perf_counter() - self._t0,
+            'rss_inicio_mb': rss,
+            'rss_pico_mb': rss,
+            '_wall': time.perf_counter(),
+            '_cpu': time.process_time(),
+            '_cpu_children': self._children_cpu_s(),
+            '_alloc_base': 0,
+            '_alloc_peak': 0,
+        }
+        if self.allocations:
+            record['_alloc_base'] = self._update_alloc_peaks()
+        with self._lock:
+            self._stack.append(record)
+        if self._sampler is None:
+            self._sampler = _RssSampler(self, self.sample_interval)
+            self._sampler.start()
+        return record
+
+    def _exit(self, record):
+        wall = time.perf_counter() - record.pop('_wall')
+        cpu = time.process_time() - record.pop('_cpu')
+        cpu_children = self._children_cpu_s() - record.pop('_cpu_children')
+        rss = self._rss_mb()
+        self._update_rss_peaks(rss)
+        if self.allocations:
+            current = self._update_alloc_peaks()
+            record['alloc_delta_mb'] = (current - record['_alloc_base']) / MB
+            record['alloc_pico_mb'] = record['_alloc_peak'] / MB
+        record.pop('_alloc_base')
+        record.pop('_alloc_peak')
+        with self._lock:
+            self._stack.remove(record)
+        record.update(wall_s=wall, cpu_s=cpu, cpu_filhos_s=max(cpu_children, 0.0), rss_fim_mb=rss,
+                      rss_extra_mb=record['rss_pico_mb'] - record['rss_inicio_mb'])
+        self.records.append(record)
+        if not self._stack:
+            self._stop_sampler()
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+        return record
+
+    def _stop_sampler(self):
+        if self._sampler is not None:
+            self._sampler.stopped.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def stage(self, name):
+        """
+        Context manager que mede o bloco como a etapa `name`.
+        """
+        return _Stage(self, name)
+
+    def profile(self, name=None):
+        """
+        Decorador: cada chamada da função vira uma etapa.
+        """
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # Jupyter
+
+    def watch_cells(self, ipython=None):
+        """
+        Abre uma etapa por célula executada (eventos pre/post_run_cell do
+        IPython). Fora do IPython não faz nada.
+        """
+        if ipython is None:
+            try:
+                ipython = get_ipython()  # noqa: F821 (definida pelo IPython)
+            except NameError:
+                return False
+        ipython.events.register('pre_run_cell', self._pre_run_cell)
+        ipython.events.register('post_run_cell', self._post_run_cell)
+        self._ipython = ipython
+        return True
+
+    def unwatch_cells(self):
+        ipython = getattr(self, '_ipython', None)
+        if ipython is not None:
+            ipython.events.unregister('pre_run_cell', self._pre_run_cell)
+            ipython.events.unregister('post_run_cell', self._post_run_cell)
+            self._ipython = None
+
+    def _pre_run_cell(self, info):
+        self._cell_count += 1
+        lines = [line.strip() for line in (info.raw_cell or '').splitlines() if line.strip()]
+        label = lines[0][:60] if lines else ''
+        self._cell_stage = self._enter(f'[{self._cell_count}] {label}')
+
+    def _post_run_cell(self, result):
+        if self._cell_stage is not None:
+            # Etapas deixadas abertas por erro dentro da célula fecham junto
+            while self._stack and self._stack[-1] is not self._cell_stage:
+                self._exit(self._stack[-1])
+            self._exit(self._cell_stage)
+            self._cell_stage = None
+
+    # Saída
+
+    def trace(self):
+        return {
+            'versao': TRACE_VERSION,
+            'execucao': self.run,
+            'inicio': self.started_at.isoformat(timespec='seconds'),
+            'duracao_s': time.perf_counter() - self._t0,
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'argv': sys.argv,
+            'etapas': sorted(self.records, key=lambda r: r['inicio_s']),
+        }
+
+    def report(self):
+        """
+        Etapas agregadas por caminho (soma dos tempos, máximo dos picos).
+        """
+        return aggregate(self.trace())
+
+    def save(self, directory=None):
+        """
+        Grava `<run>-<data>.json` e `<run>-<data>.folded`; devolve o caminho do JSON.
+        """
+        directory = Path(directory or self.trace_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = directory / f"{self.run}-{self.started_at.strftime('%Y%m%d-%H%M%S')}"
+        trace = self.trace()
+        json_path = stem.with_suffix('.json')
+        tmp = json_path.with_name(json_path.name + '.tmp')
+        tmp.write_text(json.dumps(trace, ensure_ascii=False, indent=1), encoding='utf-8')
+        os.replace(tmp, json_path)
+        stem.with_suffix('.folded').write_text(folded_stacks(trace), encoding='utf-8')
+        return json_path
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        self.record = self.profiler._enter(self.name)
+        return self.record
+
+    def __exit__(self, *exc):
+        if self.record in self.profiler._stack:
+            self.profiler._exit(self.record)
+        return False
+
+
+def load_trace(path):
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+
+def folded_stacks(trace, metric='wall_s'):
+    """
+    Uma linha `execução;etapa;subetapa <microssegundos>` por caminho, com o
+    tempo próprio (descontadas as subetapas), no formato do flamegraph.pl.
+    """
+    totals = {}
+    for stage in trace['etapas']:
+        path = stage['caminho']
+        totals[path] = totals.get(path, 0.0) + stage[metric]
+        parent = path.rpartition(';')[0]
+        if parent:
+            totals[parent] = totals.get(parent, 0.0) - stage[metric]
+    lines = [f"{trace['execucao']};{path} {max(int(round(value * 1e6)), 0)}" for path, value in totals.items()]
+    return '\n'.join(sorted(lines)) + '\n'
+
+
+def aggregate(trace):
+    """
+    Tabela por caminho: chamadas, somas de tempo/CPU/alocação e máximos de pico.
+    """
+    stages = pd.DataFrame(trace['etapas'])
+    if stages.empty:
+        return pd.DataFrame(columns=['caminho', 'chamadas', 'wall_s', 'cpu_s', 'rss_pico_mb', 'rss_extra_mb'])
+    agg = {'nome': 'size', 'wall_s': 'sum', 'cpu_s': 'sum', 'cpu_filhos_s': 'sum', 'rss_pico_mb': 'max',
+           'rss_extra_mb': 'max'}
+    if 'alloc_delta_mb' in stages:
+        agg.update(alloc_delta_mb='sum', alloc_pico_mb='max')
+    out = stages.groupby('caminho', sort=False).agg(agg).rename(columns={'nome': 'chamadas'})
+    return out.reset_index()
+
+
+def latest_traces(directory, run, n=2):
+    """
+    Os `n` traces mais recentes de uma execução (pelo nome do arquivo).
+    """
+    paths = sorted(Path(directory).glob(f'{_clean(run)}-*.json'))
+    if len(paths) < n:
+        raise FileNotFoundError(f'menos de {n} traces de {run!r} em {directory}')
+    return paths[-n:]
+
+
+def compare_traces(before, after, tolerance=0.2, min_seconds=0.05, min_mb=10.0):
+    """
+    Compara duas execuções etapa a etapa. Marca 'tempo' quando o tempo de
+    parede cresce mais que `tolerance` (fração) e mais que `min_seconds`, e
+    'memória' quando a memória acrescentada pela etapa (`rss_extra_mb`, ou o
+    pico de alocação) cresce mais que `tolerance` e mais que `min_mb`; o RSS
+    absoluto herda o que as etapas anteriores deixaram e não serve de
+    critério. Etapas que só existem num dos lados aparecem como 'nova' ou
+    'removida'.
+    """
+    a = aggregate(before).set_index('caminho')
+    b = aggregate(after).set_index('caminho')
+    table = a.join(b, how='outer', lsuffix='_antes', rsuffix='_depois')
+
+    def grew(column, minimum):
+        old, new = table[f'{column}_antes'], table[f'{column}_depois']
+        return (new > old * (1 + tolerance)) & (new - old > minimum)
+
+    memory = grew('rss_extra_mb', min_mb)
+    if 'alloc_pico_mb_antes' in table and 'alloc_pico_mb_depois' in table:
+        memory |= grew('alloc_pico_mb', min_mb)
+    flags = pd.Series('', index=table.index)
+    flags[grew('wall_s', min_seconds)] = 'tempo'
+    flags[memory] = (flags[memory] + ' memória').str.strip()
+    flags[table['wall_s_antes'].isna()] = 'nova'
+    flags[table['wall_s_depois'].isna()] = 'removida'
+
+    out = pd.DataFrame({
+        'wall_antes_s': table['wall_s_antes'],
+        'wall_depois_s': table['wall_s_depois'],
+        'delta_s': table['wall_s_depois'] - table['wall_s_antes'],
+        'razao': table['wall_s_depois'] / table['wall_s_antes'],
+        'rss_extra_antes_mb': table['rss_extra_mb_antes'],
+        'rss_extra_depois_mb': table['rss_extra_mb_depois'],
+        'regressao': flags,
+    })
+    order = pd.Index(a.index).append(b.index.difference(a.index))
+    return out.loc[order].reset_index(names='etapa')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Traces de profiling por etapa.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    show = sub.add_parser('show', help='tabela agregada de um trace')
+    show.add_argument('trace')
+
+    folded = sub.add_parser('folded', help='pilhas folded de um trace (flame graph)')
+    folded.add_argument('trace')
+    folded.add_argument('--metric', default='wall_s', choices=['wall_s', 'cpu_s'])
+
+    compare = sub.add_parser('compare', help='regressões entre duas execuções')
+    compare.add_argument('before', help='trace JSON, ou diretório de traces (com `after` = nome da execução)')
+    compare.add_argument('after')
+    compare.add_argument('--tolerance', type=float, default=0.2)
+    compare.add_argument('--min-seconds', type=float, default=0.05)
+    compare.add_argument('--min-mb', type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print(aggregate(load_trace(args.trace)).to_string(index=False, float_format='{:.3f}'.format))
+    elif args.command == 'folded':
+        sys.stdout.write(folded_stacks(load_trace(args.trace), args.metric))
+    else:
+        if Path(args.before).is_dir():
+            before, after = latest_traces(args.before, args.after)
+        else:
+            before, after = args.before, args.after
+        print(f'antes:  {before}\ndepois: {after}\n')
+        table = compare_traces(load_trace(before), load_trace(after), args.tolerance, args.min_seconds, args.min_mb)
+        print(table.to_string(index=False, float_format='{:.3f}'.format))
+        regressions = table['regressao'].str.contains('tempo|memória')
+        print(f'\n{int(regressions.sum())} etapa(s) com regressão')
+        sys.exit(1 if regressions.any() else 0)
+
+
+if __name__ == '__main__':
+    main()
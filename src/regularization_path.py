@@ -0,0 +1,298 @@
+"""
+Busca pelo caminho de regularização (sequência de C) para os grids de
+LogisticRegression e SVC dos notebooks heart e AG News.
+
+No grid cada valor de C é ajustado do zero em cada fold, embora os candidatos
+que só diferem em C resolvam o mesmo problema com regularização diferente.
+Aqui, dentro de um fold, os candidatos são agrupados pelos demais parâmetros e
+cada grupo percorre os seus C em ordem crescente:
+
+- LogisticRegression (solvers lbfgs, newton-cg, newton-cholesky, sag, saga):
+  um único estimador com `warm_start=True` é reajustado a cada C partindo dos
+  coeficientes do C anterior. O liblinear não aceita warm start e continua com
+  ajustes independentes;
+- SVC: o libsvm não tem warm start, mas a matriz de kernel K(treino, treino)
+  e K(validação, treino) de um fold depende só do kernel e de gamma/degree/
+  coef0; ela é calculada uma vez e reaproveitada por todos os C e
+  `class_weight` do grupo (`kernel='precomputed'`), em vez de o libsvm
+  recalcular o kernel a cada ajuste. Acima de `GRAM_MAX_ROWS` linhas de
+  treino a matriz não cabe na memória e o SVC volta aos ajustes normais.
+
+No SVC o problema resolvido é o mesmo e as notas são as do `GridSearchCV`.
+Na regressão logística o ponto de partida muda e o solver para em outro ponto
+dentro da tolerância (`tol`): no heart replicado as notas F1 mudam até ~1e-3
+com o `tol=1e-4` padrão, o que basta para trocar o melhor C entre candidatos
+quase empatados (com `tol=1e-8` as notas coincidem). Por isso
+`FoldCachedGridSearchCV` (fold_cache.py) e `CachedGridSearchCV`
+(feature_cache.py) reaproveitam o kernel do SVC por padrão
+(`reuse_kernel=False` desliga), mas o warm start da regressão logística é
+opcional (`warm_start_path=True`).
+
+Uso direto:
+
+    from regularization_path import path_scores
+
+    scores = path_scores(LogisticRegression(max_iter=5000), [{'C': 0.1}, {'C': 1.0}, {'C': 10.0}],
+                         X_train, y_train, X_valid, y_valid, scorer)
+
+Benchmark (iterações do solver e tempo, ajuste do zero vs. caminho):
+
+    python src/regularization_path.py heart data/heart.csv --repeat 20
+    python src/regularization_path.py agnews data/agnews.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import check_scoring
+from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.svm import SVC
+
+from cached_search import params_key
+
+# Linhas de treino acima das quais a matriz de kernel (n x n float64) não é pré-calculada
+GRAM_MAX_ROWS = 10_000
+
+WARM_START_SOLVERS = {'lbfgs', 'newton-cg', 'newton-cholesky', 'sag', 'saga'}
+KERNEL_PARAMS = {'linear': (), 'poly': ('gamma', 'degree', 'coef0'), 'rbf': ('gamma',),
+                 'sigmoid': ('gamma', 'coef0')}
+
+
+def follows_path(model, reuse_kernel=True, warm_start=True):
+    return ((reuse_kernel and isinstance(model, SVC))
+            or (warm_start and isinstance(model, LogisticRegression)))
+
+
+def _n_iter(model):
+    return int(np.sum(getattr(model, 'n_iter_', 0)))
+
+
+def _path_groups(model, param_list, excluded):
+    """
+    {chave: (parâmetros comuns, [(C, posição)...] em ordem crescente de C)}.
+    """
+    groups = {}
+    for i, params in enumerate(param_list):
+        common = {k: v for k, v in params.items() if k not in excluded}
+        _, members = groups.setdefault(params_key(common), (common, []))
+        members.append((params.get('C', model.C), i))
+    for _, members in groups.values():
+        members.sort(key=lambda member: member[0])
+    return groups.values()
+
+
+def _logistic_fits(model, param_list, X_train, y_train, X_valid):
+    for common, members in _path_groups(model, param_list, {'C'}):
+        base = clone(model).set_params(**common)
+        if base.solver not in WARM_START_SOLVERS:
+            for C, i in members:
+                fitted = clone(base).set_params(C=C).fit(X_train, y_train)
+                yield i, fitted, X_valid, _n_iter(fitted)
+            continue
+        base.set_params(warm_start=True)
+        for C, i in members:
+            base.set_params(C=C).fit(X_train, y_train)
+            yield i, base, X_valid, _n_iter(base)
+
+
+def svc_gamma(svc, X):
+    """
+    gamma efetivo do SVC para X ('scale' e 'auto' como no `SVC.fit`).
+    """
+    if svc.gamma == 'scale':
+        X_var = X.multiply(X).mean() - X.mean() ** 2 if sp.issparse(X) else np.asarray(X).var()
+        return 1.0 / (X.shape[1] * X_var) if X_var != 0 else 1.0
+    if svc.gamma == 'auto':
+        return 1.0 / X.shape[1]
+    return svc.gamma
+
+
+def _kernel_key(svc, X):
+    params = {name: getattr(svc, name) for name in KERNEL_PARAMS[svc.kernel]}
+    if 'gamma' in params:
+        params['gamma'] = svc_gamma(svc, X)
+    return svc.kernel, params
+
+
+def _svc_fits(model, param_list, X_train, y_train, X_valid, max_gram_rows):
+    precompute = X_train.shape[0] <= max_gram_rows
+    plain, shared = [], []
+    for common, members in _path_groups(model, param_list, {'C', 'class_weight'}):
+        base = clone(model).set_params(**common)
+        if precompute and base.kernel in KERNEL_PARAMS:
+            kernel, params = _kernel_key(base, X_train)
+            shared.append(((kernel, params_key(params)), kernel, params, base, members))
+        else:
+            plain.append((base, members))
+
+    for base, members in plain:
+        for C, i in members:
+            fitted = clone(base).set_params(C=C, **_class_weight(param_list[i])).fit(X_train, y_train)
+            yield i, fitted, X_valid, _n_iter(fitted)
+
+    # Grupos de mesmo kernel em sequência: só uma matriz em memória por vez
+    shared.sort(key=lambda group: group[0])
+    current = None
+    for key, kernel, params, base, members in shared:
+        if key != current:
+            K_train = K_valid = None
+            K_train = pairwise_kernels(X_train, metric=kernel, filter_params=True, **params)
+            K_valid = pairwise_kernels(X_valid, X_train, metric=kernel, filter_params=True, **params)
+            current = key
+        for C, i in members:
+            fitted = clone(base).set_params(kernel='precomputed', C=C, **_class_weight(param_list[i]))
+            fitted.fit(K_train, y_train)
+            yield i, fitted, K_valid, _n_iter(fitted)
+
+
+def _class_weight(params):
+    return {'class_weight': params['class_weight']} if 'class_weight' in params else {}
+
+
+def path_fits(model, param_list, X_train, y_train, X_valid, max_gram_rows=GRAM_MAX_ROWS):
+    """
+    Gera (posição em `param_list`, estimador ajustado, X de validação para
+    ele, iterações do solver) percorrendo o caminho de C de cada grupo. O
+    estimador de regressão logística é reutilizado: pontue antes de pedir o
+    próximo.
+    """
+    if isinstance(model, LogisticRegression):
+        return _logistic_fits(model, param_list, X_train, y_train, X_valid)
+    if isinstance(model, SVC):
+        return _svc_fits(model, param_list, X_train, y_train, X_valid, max_gram_rows)
+    raise TypeError(f'{type(model).__name__} não tem caminho de regularização')
+
+
+def path_scores(model, param_list, X_train, y_train, X_valid, y_valid, scorer, max_gram_rows=GRAM_MAX_ROWS):
+    """
+    Notas de cada conjunto de parâmetros de `param_list` num fold, na ordem de `param_list`.
+    """
+    scores = [None] * len(param_list)
+    for i, fitted, X_eval, _ in path_fits(model, param_list, X_train, y_train, X_valid, max_gram_rows):
+        scores[i] = scorer(fitted, X_eval, y_valid)
+    return scores
+
+
+def compare_fold(model, param_list, X_train, y_train, X_valid, y_valid, scorer):
+    """
+    Um fold ajustado do zero (como o grid) e pelo caminho: tempo, iterações e notas.
+    """
+    start = time.perf_counter()
+    cold_scores, cold_iter = [], 0
+    for params in param_list:
+        fitted = clone(model).set_params(**params).fit(X_train, y_train)
+        cold_scores.append(scorer(fitted, X_valid, y_valid))
+        cold_iter += _n_iter(fitted)
+    cold_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    path_scores_, path_iter = [None] * len(param_list), 0
+    for i, fitted, X_eval, n_iter in path_fits(model, param_list, X_train, y_train, X_valid):
+        path_scores_[i] = scorer(fitted, X_eval, y_valid)
+        path_iter += n_iter
+    path_s = time.perf_counter() - start
+    return {'do_zero_s': cold_s, 'caminho_s': path_s, 'iter_do_zero': cold_iter, 'iter_caminho': path_iter,
+            'notas_do_zero': cold_scores, 'notas_caminho': path_scores_}
+
+
+def benchmark(folds, models, scorer):
+    """
+    `folds`: lista de (X_train, y_train, X_valid, y_valid); `models`: lista
+    de (nome, estimador, grade de parâmetros). Soma os folds de cada modelo.
+    """
+    from sklearn.model_selection import ParameterGrid
+
+    rows = []
+    for name, model, grid in models:
+        param_list = list(ParameterGrid(grid))
+        runs = [compare_fold(model, param_list, *fold, scorer) for fold in folds]
+        cold = np.array([run['notas_do_zero'] for run in runs])
+        path = np.array([run['notas_caminho'] for run in runs])
+        rows.append({
+            'modelo': name,
+            'candidatos': len(param_list),
+            'iter_do_zero': sum(run['iter_do_zero'] for run in runs),
+            'iter_caminho': sum(run['iter_caminho'] for run in runs),
+            'do_zero_s': sum(run['do_zero_s'] for run in runs),
+            'caminho_s': sum(run['caminho_s'] for run in runs),
+            'dif_max_nota': float(np.abs(cold - path).max()),
+            'mesmo_melhor': bool(np.argmax(cold.mean(axis=0)) == np.argmax(path.mean(axis=0))),
+        })
+    return rows
+
+
+def heart_benchmark(path, repeat, random_state=42):
+    import pandas as pd
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+
+    from fold_cache import HEART_CAT_COLS, HEART_NUM_COLS, FoldPreprocessCache, heart_preprocess, replicate_heart
+
+    df = replicate_heart(pd.read_csv(path), repeat)
+    X, y = df.drop(columns=['target']), df['target']
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=random_state, stratify=y)
+    cache = FoldPreprocessCache(heart_preprocess(HEART_CAT_COLS, HEART_NUM_COLS), X_train, y_train,
+                                StratifiedKFold(n_splits=5, shuffle=True, random_state=random_state))
+    folds = [(X_tr, cache.y[tr], X_va, cache.y[va]) for (tr, va), (X_tr, X_va) in zip(cache.splits, cache.folds)]
+    models = [
+        ('LogisticRegression', LogisticRegression(max_iter=5000, random_state=random_state),
+         {'C': [0.1, 1.0, 10.0], 'penalty': ['l2'], 'class_weight': [None, 'balanced'], 'solver': ['lbfgs']}),
+        ('LogisticRegression (12 C)', LogisticRegression(max_iter=5000, random_state=random_state),
+         {'C': list(np.logspace(-3, 2, 12)), 'class_weight': [None, 'balanced']}),
+        ('SVC_RBF', SVC(kernel='rbf', random_state=random_state),
+         {'C': [0.5, 1.0, 5.0], 'gamma': ['scale', 0.1, 0.01], 'class_weight': [None, 'balanced']}),
+    ]
+    rows = benchmark(folds, models, check_scoring(models[0][1], scoring='f1'))
+    cache.close()
+    return len(X_train), rows
+
+
+def agnews_benchmark(path, random_state=42):
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+
+    from feature_cache import FeatureCache
+
+    df = pd.read_csv(path)
+    X = (df['Title'] + ' ' + df['Description']).str.lower()
+    y = df['Class Index'] - 1
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=random_state, stratify=y)
+    features = FeatureCache(X_train, y_train, StratifiedKFold(n_splits=5, shuffle=True, random_state=random_state))
+    folds = []
+    for fold, (tr, va) in enumerate(features.splits):
+        X_tr, X_va = features.features(fold, TfidfVectorizer())
+        folds.append((X_tr, features.y[tr], X_va, features.y[va]))
+    models = [
+        ('Logistic Regression', LogisticRegression(random_state=random_state, max_iter=1000),
+         {'C': [0.1, 1, 10], 'solver': ['liblinear', 'saga']}),
+        ('Support Vector Machine', SVC(random_state=random_state),
+         {'C': [0.1, 1, 10], 'kernel': ['linear', 'rbf'], 'gamma': ['scale', 'auto']}),
+    ]
+    return len(X_train), benchmark(folds, models, check_scoring(models[0][1], scoring='f1_weighted'))
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Caminho de regularização vs. ajustes do zero nos grids de C.')
+    parser.add_argument('dataset', choices=['heart', 'agnews'])
+    parser.add_argument('path')
+    parser.add_argument('--repeat', type=int, default=20, help='heart: replica o dataset N vezes')
+    args = parser.parse_args()
+
+    if args.dataset == 'heart':
+        n_rows, rows = heart_benchmark(args.path, args.repeat)
+    else:
+        n_rows, rows = agnews_benchmark(args.path)
+    table = pd.DataFrame(rows)
+    table['ganho'] = table['do_zero_s'] / table['caminho_s']
+    print(f'{n_rows} linhas de treino, 5 folds')
+    print(table.to_string(index=False, float_format='{:.3g}'.format))
+
+
+if __name__ == '__main__':
+    main()
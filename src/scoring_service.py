@@ -0,0 +1,506 @@
+"""
+Serviço de predição para os melhores pipelines dos notebooks (heart e AG News).
+
+Os notebooks terminam com o pipeline campeão só em memória (`best_pipe` no
+heart, `best_result['best_estimator']` no AG News). Este módulo:
+
+- `export_model` salva o pipeline ajustado em `models/<nome>.joblib`, junto
+  com o que é preciso para montar a entrada (colunas do DataFrame no heart;
+  configuração do `TextPreprocessor` no AG News) e metadados;
+- `ModelScorer` carrega o arquivo uma vez e prediz uma lista de registros;
+- `MicroBatcher` junta as requisições que chegam ao mesmo tempo num único
+  `predict`: o lote fecha com `max_batch_rows` linhas ou quando a primeira
+  requisição da fila já esperou `max_latency_ms`. Chamar o Pipeline inteiro
+  uma vez por registro é dominado pelo custo fixo de cada chamada
+  (validação, ColumnTransformer, DataFrame de uma linha);
+- `ScoringServer` expõe tudo num servidor HTTP/1.1 mínimo em asyncio
+  (keep-alive, JSON): `POST /predict`, `GET /health` e `GET /stats`;
+- `load_test` / `benchmark` medem p50/p99 de latência e linhas/s com vários
+  clientes concorrentes.
+
+Uso no notebook:
+
+    from scoring_service import export_model
+
+    export_model(best_pipe, 'heart_best', models_dir='../models', columns=X_train.columns)
+
+Servidor e requisição:
+
+    python src/scoring_service.py serve models/heart_best.joblib --port 8000 --max-latency-ms 5
+    curl -X POST localhost:8000/predict -d '{"records": [{"age": 52, "sex": 1, "cp": 0, ...}]}'
+
+Benchmark (exporta um pipeline do heart se o modelo ainda não existir):
+
+    python src/scoring_service.py export-heart data/heart.csv
+    python src/scoring_service.py benchmark models/heart_best.joblib --data data/heart.csv
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / 'models'
+MODEL_FORMAT_VERSION = 1
+
+
+def export_model(pipeline, name, models_dir=MODELS_DIR, columns=None, text_preprocessor=None, metadata=None):
+    """
+    Salva o pipeline ajustado em `<models_dir>/<name>.joblib` e devolve o caminho.
+
+    `columns`: colunas do DataFrame de entrada (modelos tabulares); sem
+    `columns` a entrada é texto, pré-processado com a configuração de
+    `text_preprocessor` (se houver) antes do `predict`.
+    """
+    import sklearn
+
+    bundle = {
+        'version': MODEL_FORMAT_VERSION,
+        'pipeline': pipeline,
+        'input': 'text' if columns is None else 'frame',
+        'columns': None if columns is None else [str(c) for c in columns],
+        'preprocessor': None if text_preprocessor is None else {
+            'stop_words': sorted(text_preprocessor.stop_words),
+            'use_lemmatization': text_preprocessor.use_lemmatization,
+        },
+        'metadata': {
+            'name': name,
+            'model': type(pipeline[-1]).__name__ if hasattr(pipeline, 'steps') else type(pipeline).__name__,
+            'sklearn_version': sklearn.__version__,
+            'exported_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            **(metadata or {}),
+        },
+    }
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    path = models_dir / f'{name}.joblib'
+    fd, tmp = tempfile.mkstemp(prefix=path.name + '.tmp', dir=models_dir)
+    os.close(fd)
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _to_native(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ModelScorer:
+    """
+    Pipeline exportado por `export_model`, pronto para predizer listas de
+    registros (dicts no modo tabular, strings no modo texto).
+    """
+
+    def __init__(self, bundle):
+        if bundle.get('version') != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Formato de modelo desconhecido: {bundle.get('version')}")
+        self.pipeline = bundle['pipeline']
+        self.input = bundle['input']
+        self.columns = bundle['columns']
+        self.metadata = bundle['metadata']
+        self.preprocessor = None
+        if bundle['preprocessor'] is not None:
+            from text_preprocess import TextPreprocessor
+
+            self.preprocessor = TextPreprocessor(**bundle['preprocessor'])
+        self.classes = getattr(self.pipeline, 'classes_', None)
+        self.has_proba = hasattr(self.pipeline, 'predict_proba')
+
+    @classmethod
+    def load(cls, path):
+        return cls(joblib.load(path))
+
+    def _inputs(self, records):
+        if self.input == 'frame':
+            import pandas as pd
+
+            return pd.DataFrame.from_records(records, columns=self.columns)
+        texts = [str(r) for r in records]
+        if self.preprocessor is not None:
+            texts = [self.preprocessor(text) for text in texts]
+        return texts
+
+    def predict(self, records):
+        """
+        Uma saída por registro: {'prediction': ...} e, para classificadores
+        com `predict_proba`, {'proba': {classe: probabilidade}}.
+        """
+        X = self._inputs(records)
+        predictions = self.pipeline.predict(X)
+        if not self.has_proba:
+            return [{'prediction': _to_native(p)} for p in predictions]
+        proba = self.pipeline.predict_proba(X)
+        labels = [str(_to_native(c)) for c in self.classes]
+        return [{'prediction': _to_native(p), 'proba': dict(zip(labels, row.round(6).tolist()))}
+                for p, row in zip(predictions, proba)]
+
+
+class MicroBatcher:
+    """
+    Fila assíncrona que agrupa requisições concorrentes em lotes.
+
+    O `predict` roda numa thread separada, então o loop continua aceitando
+    requisições (que formam o próximo lote) enquanto o lote atual é predito.
+    `max_batch_rows=1` desliga o agrupamento.
+    """
+
+    def __init__(self, predict, max_batch_rows=256, max_latency_ms=5.0):
+        self.predict = predict
+        self.max_batch_rows = max_batch_rows
+        self.max_latency = max_latency_ms / 1000
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.n_batches = 0
+        self.n_rows = 0
+        self.n_requests = 0
+
+    async def submit(self, records):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self.queue.get()]
+        rows = len(items[0][0])
+        deadline = loop.time() + self.max_latency
+        while rows < self.max_batch_rows:
+            if not self.queue.empty():
+                item = self.queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            items.append(item)
+            rows += len(item[0])
+        return items
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            batch = [record for records, _ in items for record in records]
+            try:
+                outputs = await loop.run_in_executor(self.executor, self.predict, batch)
+            except Exception:
+                # Um registro inválido não derruba o lote: repete requisição a requisição
+                await self._predict_each(items)
+                continue
+            start = 0
+            for records, future in items:
+                if not future.done():
+                    future.set_result(outputs[start:start + len(records)])
+                start += len(records)
+            self.n_batches += 1
+            self.n_rows += len(batch)
+            self.n_requests += len(items)
+
+    async def _predict_each(self, items):
+        loop = asyncio.get_running_loop()
+        for records, future in items:
+            try:
+                result = await loop.run_in_executor(self.executor, self.predict, records)
+            except Exception as exc:
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            self.n_batches += 1
+            self.n_rows += len(records)
+            self.n_requests += 1
+
+    def stats(self):
+        return {
+            'lotes': self.n_batches,
+            'requisicoes': self.n_requests,
+            'linhas': self.n_rows,
+            'linhas_por_lote': self.n_rows / self.n_batches if self.n_batches else 0.0,
+        }
+
+
+async def _read_message(reader):
+    """
+    Lê uma mensagem HTTP/1.1 (linha inicial, cabeçalhos e corpo com
+    Content-Length). Devolve None quando a conexão foi fechada.
+    """
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return start_line.decode('latin-1').rstrip('\r\n'), headers, body
+
+
+def _http_response(status, payload):
+    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f'HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(data)}\r\n\r\n')
+    return head.encode('latin-1') + data
+
+
+class ScoringServer:
+    """
+    Servidor HTTP em asyncio para um `ModelScorer`.
+
+    `POST /predict` aceita `{"records": [...]}`, uma lista ou um registro
+    isolado e responde `{"predictions": [...]}` na mesma ordem.
+    """
+
+    def __init__(self, scorer, host='127.0.0.1', port=8000, max_batch_rows=256, max_latency_ms=5.0):
+        self.scorer = scorer
+        self.host = host
+        self.port = port
+        self.batcher = MicroBatcher(scorer.predict, max_batch_rows, max_latency_ms)
+
+    async def _route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return '200 OK', {'status': 'ok', 'modelo': self.scorer.metadata,
+                              'max_batch_rows': self.batcher.max_batch_rows,
+                              'max_latency_ms': self.batcher.max_latency * 1000}
+        if method == 'GET' and path == '/stats':
+            return '200 OK', self.batcher.stats()
+        if method == 'POST' and path == '/predict':
+            try:
+                payload = json.loads(body or b'null')
+            except ValueError:
+                return '400 Bad Request', {'erro': 'corpo não é JSON válido'}
+            records = payload.get('records') if isinstance(payload, dict) and 'records' in payload else payload
+            if not isinstance(records, list):
+                records = [records]
+            if not records:
+                return '200 OK', {'predictions': []}
+            try:
+                return '200 OK', {'predictions': await self.batcher.submit(records)}
+            except Exception as exc:
+                return '400 Bad Request', {'erro': f'{type(exc).__name__}: {exc}'}
+        return '404 Not Found', {'erro': f'rota desconhecida: {method} {path}'}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                start_line, headers, body = message
+                method, path = (start_line.split(' ') + ['', ''])[:2]
+                status, payload = await self._route(method, path, body)
+                writer.write(_http_response(status, payload))
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        batcher = asyncio.create_task(self.batcher.run())
+        print(f"Servindo {self.scorer.metadata['name']} em http://{self.host}:{self.port} "
+              f"(lote até {self.batcher.max_batch_rows} linhas / {self.batcher.max_latency * 1000:g} ms)",
+              flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def serve(model_path, host='127.0.0.1', port=8000, max_batch_rows=256, max_latency_ms=5.0):
+    scorer = ModelScorer.load(model_path)
+    server = ScoringServer(scorer, host, port, max_batch_rows, max_latency_ms)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+async def _client(host, port, payloads, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for payload in payloads:
+            request = (f'POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                       f'Content-Length: {len(payload)}\r\n\r\n').encode('latin-1') + payload
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, _, _ = await _read_message(reader)
+            latencies.append(time.perf_counter() - start)
+            if ' 200 ' not in status + ' ':
+                raise RuntimeError(f'Resposta inesperada: {status}')
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, records, n_requests=2000, concurrency=32, rows_per_request=1):
+    """
+    `concurrency` clientes com conexão keep-alive enviando `n_requests`
+    requisições de `rows_per_request` registros no total.
+    """
+    payloads = []
+    for i in range(n_requests):
+        start = (i * rows_per_request) % len(records)
+        chunk = [records[(start + j) % len(records)] for j in range(rows_per_request)]
+        payloads.append(json.dumps({'records': chunk}).encode('utf-8'))
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, payloads[w::concurrency], latencies)
+                           for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        'requisicoes': n_requests,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'linhas_s': n_requests * rows_per_request / elapsed,
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('O servidor terminou antes de ficar pronto')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError('O servidor não respondeu a tempo')
+
+
+def sample_records(model_path, data_path, limit=2000):
+    """
+    Registros de exemplo no formato que o modelo espera, lidos do CSV de origem.
+    """
+    import pandas as pd
+
+    bundle = joblib.load(model_path)
+    df = pd.read_csv(data_path, nrows=limit)
+    if bundle['input'] == 'frame':
+        return df[bundle['columns']].to_dict('records')
+    return (df['Title'] + ' ' + df['Description']).tolist()
+
+
+def benchmark(model_path, records, configs=((1, 0.0), (64, 2.0), (256, 5.0)), n_requests=2000,
+              concurrency=32, rows_per_request=1):
+    """
+    Sobe o servidor num subprocesso para cada configuração (max_batch_rows,
+    max_latency_ms) e roda o mesmo teste de carga. A primeira linha é a
+    referência: o pipeline chamado registro a registro, sem HTTP.
+    """
+    scorer = ModelScorer.load(model_path)
+    n_direct = min(n_requests, 500)
+    start = time.perf_counter()
+    for i in range(n_direct):
+        scorer.predict([records[i % len(records)]])
+    direct = time.perf_counter() - start
+    rows = [{'configuracao': 'predict direto, 1 registro', 'requisicoes': n_direct,
+             'p50_ms': direct / n_direct * 1000, 'p99_ms': float('nan'), 'linhas_s': n_direct / direct}]
+
+    for max_batch_rows, max_latency_ms in configs:
+        port = _free_port()
+        proc = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), 'serve', str(model_path), '--port', str(port),
+             '--max-batch-rows', str(max_batch_rows), '--max-latency-ms', str(max_latency_ms)],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(port, proc)
+            result = asyncio.run(load_test('127.0.0.1', port, records, n_requests, concurrency, rows_per_request))
+        finally:
+            proc.terminate()
+            proc.wait()
+        label = 'sem lotes' if max_batch_rows == 1 else f'lote {max_batch_rows} / {max_latency_ms:g} ms'
+        rows.append({'configuracao': label, **result})
+    return rows
+
+
+def export_heart(data_path, models_dir=MODELS_DIR, random_state=42):
+    """
+    Ajusta o pipeline do notebook heart (pré-processamento + regressão
+    logística) e exporta como `heart_best`, para usar o serviço sem rodar o notebook.
+    """
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import Pipeline
+
+    from fold_cache import HEART_CAT_COLS, HEART_NUM_COLS, heart_preprocess
+
+    df = pd.read_csv(data_path)
+    X = df.drop(columns=['target'])
+    y = df['target']
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=random_state, stratify=y)
+    pipe = Pipeline([('preprocess', heart_preprocess(HEART_CAT_COLS, HEART_NUM_COLS)),
+                     ('model', LogisticRegression(max_iter=5000, random_state=random_state))])
+    pipe.fit(X_train, y_train)
+    return export_model(pipe, 'heart_best', models_dir, columns=X.columns, metadata={'origem': 'export-heart'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serviço de predição com micro-lotes para os modelos exportados.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('export-heart', help='ajusta e exporta o pipeline do heart')
+    p.add_argument('data', help='heart.csv')
+    p.add_argument('--models-dir', default=str(MODELS_DIR))
+
+    p = sub.add_parser('serve', help='sobe o servidor HTTP')
+    p.add_argument('model', help='arquivo .joblib exportado')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    p.add_argument('--max-batch-rows', type=int, default=256)
+    p.add_argument('--max-latency-ms', type=float, default=5.0)
+
+    p = sub.add_parser('benchmark', help='teste de carga com e sem micro-lotes')
+    p.add_argument('model', help='arquivo .joblib exportado')
+    p.add_argument('--data', required=True, help='CSV de onde vêm os registros de teste')
+    p.add_argument('--requests', type=int, default=2000)
+    p.add_argument('--concurrency', type=int, default=32)
+    p.add_argument('--rows-per-request', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'export-heart':
+        print(f'Modelo salvo em {export_heart(args.data, args.models_dir)}')
+    elif args.command == 'serve':
+        serve(args.model, args.host, args.port, args.max_batch_rows, args.max_latency_ms)
+    else:
+        import pandas as pd
+
+        records = sample_records(args.model, args.data)
+        rows = benchmark(args.model, records, n_requests=args.requests, concurrency=args.concurrency,
+                         rows_per_request=args.rows_per_request)
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f'{v:.1f}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,560 @@
+"""
+Sketch de quantis KLL (Karnin, Lang e Liberty) mesclável, e resumos de
+tabela (describe, boxplots, mediana por grupo) feitos a partir dele.
+
+Guarda uma amostra ponderada e compactada dos valores vistos: o nível h tem
+itens de peso 2**h, e quando um nível passa da capacidade metade dos itens
+(pares ou ímpares, por sorteio) sobe para o nível seguinte. O tamanho fica em
+O(k log(n/k)) e dois sketches podem ser mesclados nível a nível, então blocos
+ou processos diferentes podem ser combinados sem reler os dados.
+
+Enquanto nenhuma compactação acontece (n <= k) o sketch guarda todos os
+valores e os quantis são exatos.
+
+`describe()`, os boxplots e `.agg(['mean', 'median', 'count'])` dos notebooks
+ordenam ou particionam colunas inteiras. `TableSketch` lê a tabela uma vez,
+em blocos (de um DataFrame, de um CSV ou de processos diferentes), e guarda um
+`ColumnSketch` por coluna numérica e por grupo de `by`: contagem, média,
+desvio, mínimo e máximo exatos (momentos mesclados pela fórmula de Chan) e
+quantis do KLL, com erro de rank `rank_error()`. Com `exact=True` os valores
+são guardados inteiros e o resultado é o do pandas/matplotlib.
+
+Uso:
+
+    from sketches import TableSketch, describe
+
+    describe(df)                                   # mesmo formato de df.describe()
+    acidentes = TableSketch.from_frame(df, columns=['price'], by='accident_history')
+    acidentes.agg('price', ['mean', 'median', 'count'])
+    ax.bxp(acidentes.box_stats('price', fliers=False))
+
+Benchmark contra o pandas (tempo e erro de rank observado vs. garantido):
+
+    python src/sketches.py --rows 1000000 10000000
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 200
+
+# Fator de decaimento da capacidade entre níveis (valor usado no artigo do KLL)
+DECAY = 2 / 3
+
+
+class KLLSketch:
+    """
+    Sketch de quantis para uma coluna numérica (NaN são ignorados).
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = int(k)
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def exact(self):
+        """
+        True enquanto todos os valores vistos estão guardados (sem compactação).
+        """
+        return len(self.levels) == 1
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * DECAY ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        level = int(np.log2(len(values) / self.k)) if len(values) > 2 * self.k else 0
+        if level:
+            self._bulk_insert(values, level)
+        else:
+            self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def _bulk_insert(self, values, level):
+        # Um bloco grande ordenado uma vez e compactado `level` vezes de uma só
+        # vez: cada compactação de uma lista ordenada fica com as posições de
+        # paridade sorteada, então `level` seguidas ficam com uma posição a cada
+        # 2**level, a partir de um deslocamento sorteado. As sobras (len % 2**level)
+        # ficam no nível 0, e o peso total continua igual a len(values)
+        values = np.sort(values)
+        step = 1 << level
+        rest = len(values) % step
+        promoted = values[rest:][self._rng.integers(step)::step]
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0))
+        self.levels[0] = np.concatenate([self.levels[0], values[:rest]])
+        self.levels[level] = np.concatenate([self.levels[level], promoted])
+
+    def merge(self, other):
+        """
+        Incorpora outro sketch (o resultado equivale a ter visto os dois fluxos).
+        """
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        while sum(len(items) for items in self.levels) > sum(self.capacity(h) for h in range(len(self.levels))):
+            for h, items in enumerate(self.levels):
+                if len(items) > self.capacity(h):
+                    break
+            else:
+                return
+            items = np.sort(items)
+            # Com número ímpar de itens, um fica no nível atual
+            keep = items[:1] if len(items) % 2 else items[:0]
+            pairs = items[len(keep):]
+            promoted = pairs[self._rng.integers(2)::2]
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = keep
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2 ** h, dtype=np.float64) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """
+        Quantil(is) q em [0, 1]. No modo exato usa interpolação linear, como
+        `np.quantile`/`Series.quantile`; depois da compactação devolve o item
+        cujo peso acumulado alcança q * n.
+        """
+        scalar = np.isscalar(q)
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            out = np.full(len(q), np.nan)
+        elif self.exact:
+            out = np.quantile(self.levels[0], q)
+        else:
+            items, cum = self._weighted()
+            idx = np.searchsorted(cum, q * cum[-1], side='left')
+            out = items[np.clip(idx, 0, len(items) - 1)]
+            out[q <= 0] = self.min
+            out[q >= 1] = self.max
+        return out[0] if scalar else out
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def rank(self, value):
+        """
+        Fração aproximada de valores <= value.
+        """
+        if self.n == 0:
+            return np.nan
+        items, cum = self._weighted()
+        pos = np.searchsorted(items, value, side='right')
+        return cum[pos - 1] / cum[-1] if pos else 0.0
+
+    def rank_error(self):
+        """
+        Erro de rank normalizado aproximado (99% de confiança), pela fórmula
+        empírica do KLL da Apache DataSketches; 0 no modo exato.
+        """
+        if self.exact:
+            return 0.0
+        return 2.296 / self.k ** 0.9723
+
+    def items(self):
+        """
+        Itens guardados, ordenados (a "amostra" que representa o fluxo).
+        """
+        return self._weighted()[0]
+
+    def size(self):
+        """
+        Número de itens guardados (memória ~ 8 bytes por item).
+        """
+        return sum(len(items) for items in self.levels)
+
+
+# Linhas da tabela do describe() do pandas, na mesma ordem
+DESCRIBE_INDEX = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+
+class ColumnSketch:
+    """
+    Resumo mesclável de uma coluna numérica: contagem, média, M2, mínimo e
+    máximo exatos e quantis do KLL (ou de todos os valores, com `exact=True`).
+    """
+
+    def __init__(self, k=DEFAULT_K, exact=False, seed=0):
+        self.count = 0
+        self._mean = 0.0
+        self.m2 = 0.0
+        self._min = np.inf
+        self._max = -np.inf
+        self.exact = exact
+        self.quantiles = None if exact else KLLSketch(k, seed)
+        self._values = []
+
+    def _merge_moments(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        mean = values.mean()
+        self._merge_moments(len(values), mean, float(((values - mean) ** 2).sum()))
+        self._min = min(self._min, values.min())
+        self._max = max(self._max, values.max())
+        if self.exact:
+            self._values.append(values)
+        else:
+            self.quantiles.update(values)
+        return self
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if other.exact != self.exact:
+            raise ValueError('não dá para mesclar um ColumnSketch exato com um aproximado')
+        self._merge_moments(other.count, other._mean, other.m2)
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        if self.exact:
+            self._values.extend(other._values)
+        else:
+            self.quantiles.merge(other.quantiles)
+        return self
+
+    def values(self):
+        """
+        Valores guardados, ordenados: todos no modo exato, a amostra do KLL no aproximado.
+        """
+        if self.exact:
+            self._values = [np.sort(np.concatenate(self._values))] if self._values else []
+            return self._values[0] if self._values else np.empty(0)
+        return self.quantiles.items()
+
+    def quantile(self, q):
+        if self.exact:
+            values = self.values()
+            if not len(values):
+                return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+            return np.quantile(values, q)
+        return self.quantiles.quantile(q)
+
+    def median(self):
+        return self.quantile(0.5)
+
+    # Sem valores (grupo só com NaN), média, mínimo e máximo são NaN, como no pandas
+    @property
+    def mean(self):
+        return self._mean if self.count else np.nan
+
+    @property
+    def min(self):
+        return self._min if self.count else np.nan
+
+    @property
+    def max(self):
+        return self._max if self.count else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def rank_error(self):
+        return 0.0 if self.exact else self.quantiles.rank_error()
+
+    def describe(self):
+        quartiles = self.quantile([0.25, 0.5, 0.75]) if self.count else [np.nan] * 3
+        return pd.Series([self.count, self.mean, self.std, self.min, *quartiles, self.max], index=DESCRIBE_INDEX,
+                         dtype=np.float64)
+
+    def box_stats(self, label=None, whis=1.5, fliers=True):
+        """
+        Dicionário no formato de `matplotlib.cbook.boxplot_stats` (para
+        `ax.bxp`). Os bigodes vão até o valor mais extremo dentro de
+        `whis` x IQR; no modo aproximado esse valor e os `fliers` vêm da
+        amostra do sketch (mais mínimo e máximo), não de todas as linhas.
+        """
+        values = self.values()
+        if not self.exact:
+            values = np.unique(np.concatenate([[self.min], values, [self.max]]))
+        q1, med, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        low, high = q1 - whis * iqr, q3 + whis * iqr
+        inside = values[(values >= low) & (values <= high)]
+        whislo = inside.min() if len(inside) and inside.min() <= q1 else q1
+        whishi = inside.max() if len(inside) and inside.max() >= q3 else q3
+        notch = 1.57 * iqr / np.sqrt(self.count)
+        stats = {
+            'mean': self.mean, 'iqr': iqr, 'cilo': med - notch, 'cihi': med + notch,
+            'whislo': whislo, 'whishi': whishi, 'q1': q1, 'med': med, 'q3': q3,
+            'fliers': values[(values < whislo) | (values > whishi)] if fliers else np.empty(0),
+        }
+        if label is not None:
+            stats['label'] = label
+        return stats
+
+
+def _numeric(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.cat.categories.dtype)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class TableSketch:
+    """
+    Um `ColumnSketch` por coluna numérica e, com `by`, por grupo. `update`
+    recebe blocos de linhas; `merge` junta sketches de outros blocos/processos.
+    """
+
+    def __init__(self, columns=None, by=None, k=DEFAULT_K, exact=False):
+        self.columns = None if columns is None else list(columns)
+        self.by = [] if by is None else [by] if isinstance(by, str) else list(by)
+        self.k = k
+        self.exact = exact
+        self.sketches = {}
+        self.n_rows = 0
+
+    def _sketch(self, column, key):
+        sketch = self.sketches.get((column, key))
+        if sketch is None:
+            sketch = self.sketches[column, key] = ColumnSketch(self.k, self.exact, seed=len(self.sketches))
+        return sketch
+
+    def _resolve_columns(self, frame):
+        # Colunas numéricas pelos dtypes, então valem também para um DataFrame sem linhas
+        if self.columns is None:
+            numeric = frame.select_dtypes(include='number').columns
+            self.columns = [col for col in numeric if col not in self.by]
+        return self
+
+    def update(self, chunk):
+        self._resolve_columns(chunk)
+        values = {col: _numeric(chunk[col]) for col in self.columns}
+        if not self.by:
+            for col in self.columns:
+                self._sketch(col, ()).update(values[col])
+        else:
+            groups = chunk.groupby(self.by, observed=True, sort=False).indices
+            for key, rows in groups.items():
+                key = key if isinstance(key, tuple) else (key,)
+                key = tuple(k.item() if isinstance(k, np.generic) else k for k in key)
+                for col in self.columns:
+                    self._sketch(col, key).update(values[col][rows])
+        self.n_rows += len(chunk)
+        return self
+
+    def merge(self, other):
+        if self.columns is None:
+            self.columns = other.columns
+        for (column, key), sketch in other.sketches.items():
+            self._sketch(column, key).merge(sketch)
+        self.n_rows += other.n_rows
+        return self
+
+    @classmethod
+    def from_chunks(cls, chunks, **kwargs):
+        table = cls(**kwargs)
+        for chunk in chunks:
+            table.update(chunk)
+        return table
+
+    @classmethod
+    def from_frame(cls, df, chunksize=1_000_000, max_workers=None, **kwargs):
+        """
+        Sketch de um DataFrame em blocos de `chunksize` linhas; com
+        `max_workers` > 1 cada bloco é resumido num processo e os sketches
+        são mesclados no processo principal.
+        """
+        table = cls(**kwargs)._resolve_columns(df)
+        chunks = (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+        if not max_workers or max_workers <= 1:
+            for chunk in chunks:
+                table.update(chunk)
+            return table
+        kwargs = dict(kwargs, columns=table.columns)
+        with ProcessPoolExecutor(max_workers) as pool:
+            for part in pool.map(_sketch_chunk, chunks, [kwargs] * -(-len(df) // chunksize)):
+                table.merge(part)
+        return table
+
+    @classmethod
+    def from_csv(cls, path, chunksize=1_000_000, read_kwargs=None, **kwargs):
+        """
+        Sketch de um CSV lido em blocos (memória de um bloco, não do arquivo).
+        """
+        return cls.from_chunks(pd.read_csv(path, chunksize=chunksize, **(read_kwargs or {})), **kwargs)
+
+    def groups(self, column):
+        keys = [key for col, key in self.sketches if col == column]
+        return sorted(keys, key=lambda key: tuple(map(str, key)))
+
+    def _group_index(self, keys):
+        if len(self.by) == 1:
+            return pd.Index([key[0] for key in keys], name=self.by[0])
+        return pd.MultiIndex.from_tuples(keys, names=self.by)
+
+    def describe(self, column=None):
+        """
+        Sem `by`: tabela do `df.describe()` (uma coluna por variável). Com `by`:
+        a de `df.groupby(by)[column].describe()` (uma linha por grupo).
+        """
+        if not self.by:
+            columns = (self.columns or []) if column is None else [column]
+            return pd.DataFrame({col: self._sketch(col, ()).describe() for col in columns}, index=DESCRIBE_INDEX)
+        column = column or self.columns[0]
+        keys = self.groups(column)
+        return pd.DataFrame([self.sketches[column, key].describe() for key in keys],
+                            index=self._group_index(keys), columns=DESCRIBE_INDEX)
+
+    def agg(self, column, stats=('mean', 'median', 'count')):
+        """
+        Tabela de `df.groupby(by)[column].agg(stats)` (mean, median, count,
+        std, min, max e quantis 'q25', 'q75'...).
+        """
+        def value(sketch, stat):
+            if stat == 'median':
+                return sketch.median()
+            if stat.startswith('q') and stat[1:].isdigit():
+                return sketch.quantile(int(stat[1:]) / 100)
+            return getattr(sketch, stat)
+
+        keys = self.groups(column)
+        rows = [[value(self.sketches[column, key], stat) for stat in stats] for key in keys]
+        index = self._group_index(keys) if self.by else None
+        return pd.DataFrame(rows, columns=list(stats), index=index)
+
+    def box_stats(self, column, whis=1.5, fliers=True):
+        """
+        Lista de estatísticas de boxplot (uma por grupo, rotulada pela chave)
+        para `ax.bxp`.
+        """
+        return [self.sketches[column, key].box_stats(' / '.join(map(str, key)) if key else column, whis, fliers)
+                for key in self.groups(column)]
+
+    def rank_errors(self):
+        """
+        Erro de rank garantido (99%) de cada (coluna, grupo); 0 no modo exato
+        ou enquanto o sketch guarda todos os valores.
+        """
+        return pd.Series({(col, key): sketch.quantiles.rank_error() if not sketch.exact else 0.0
+                          for (col, key), sketch in self.sketches.items()}, dtype=np.float64)
+
+
+def _sketch_chunk(chunk, kwargs):
+    return TableSketch(**kwargs).update(chunk)
+
+
+def describe(df, exact=False, k=DEFAULT_K, chunksize=1_000_000):
+    """
+    `df.describe()` das colunas numéricas a partir dos sketches.
+    """
+    return TableSketch.from_frame(df, chunksize=chunksize, k=k, exact=exact).describe()
+
+
+def _observed_rank_error(values, sketch, qs):
+    values = np.sort(values[~np.isnan(values)])
+    estimates = sketch.quantile(qs)
+    ranks = np.searchsorted(values, estimates, side='right') / len(values)
+    return float(np.abs(ranks - np.asarray(qs)).max())
+
+
+def benchmark(df, column='price', by='accident_history', k=DEFAULT_K, chunksize=1_000_000):
+    """
+    describe(), describe por grupo e boxplots: pandas/matplotlib vs. sketches,
+    com o erro de rank observado nos quartis e o garantido.
+    """
+    from matplotlib import cbook
+
+    qs = [0.25, 0.5, 0.75]
+    rows = []
+
+    def timed(func):
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+    _, pandas_s = timed(lambda: df.describe())
+    table, sketch_s = timed(lambda: TableSketch.from_frame(df, chunksize=chunksize, k=k))
+    values = _numeric(df[column])
+    rows.append({'etapa': 'describe()', 'pandas_s': pandas_s, 'sketch_s': sketch_s,
+                 'erro_rank_obs': _observed_rank_error(values, table.sketches[column, ()], qs),
+                 'erro_rank_garantido': table.rank_errors().max()})
+
+    groups = df.groupby(by, observed=True)[column]
+
+    def pandas_groups():
+        groups.describe()
+        groups.agg(['mean', 'median', 'count'])
+        return [cbook.boxplot_stats(vals.dropna().to_numpy(dtype=np.float64), labels=[str(label)])[0]
+                for label, vals in groups]
+
+    _, pandas_s = timed(pandas_groups)
+
+    def sketch_groups():
+        grouped = TableSketch.from_frame(df[[by, column]], chunksize=chunksize, columns=[column], by=by, k=k)
+        grouped.describe(column)
+        grouped.agg(column)
+        grouped.box_stats(column, fliers=False)
+        return grouped
+
+    grouped, sketch_s = timed(sketch_groups)
+    codes = df[by].astype(str).to_numpy()
+    observed = max(_observed_rank_error(values[codes == str(key[0])], grouped.sketches[column, key], qs)
+                   for key in grouped.groups(column))
+    rows.append({'etapa': f'{column} por {by} (describe + agg + boxplot)', 'pandas_s': pandas_s,
+                 'sketch_s': sketch_s, 'erro_rank_obs': observed,
+                 'erro_rank_garantido': grouped.rank_errors().max()})
+    return rows
+
+
+def main():
+    from synthetic import generate
+
+    parser = argparse.ArgumentParser(description='Sketches de quantis vs. pandas no dataset de veículos.')
+    parser.add_argument('--rows', nargs='+', type=int, default=[1_000_000])
+    parser.add_argument('-k', type=int, default=DEFAULT_K)
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        df = generate('vehicles', n_rows).rename(columns=str.strip).fillna({'accident_history': 'N.A'})
+        table = pd.DataFrame(benchmark(df, k=args.k))
+        table['ganho'] = table['pandas_s'] / table['sketch_s']
+        print(f'{n_rows:,} linhas (k={args.k})')
+        print(table.to_string(index=False, float_format='{:.4g}'.format))
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Índice ordenado de uma coluna numérica (preço) para consultas de faixa e top-k.
+
+O vehicle-notebook.py procura carros caros com `df[df['price'] >= 90000]` e
+monta os 10 mais caros / mais baratos com dois `sort_values(by='price')`
+completos seguidos de `.head(10)`: cada consulta percorre ou ordena a base
+inteira. `SortedIndex` guarda a permutação estável que ordena a coluna
+(`order`) e os valores já ordenados (`sorted_values`):
+
+- faixa [lo, hi]: duas buscas binárias em `sorted_values`, O(log n) + o
+  tamanho do resultado;
+- k maiores / k menores: as pontas de `order`, O(k);
+- o índice é gravado como `.npy` dentro do diretório do cache colunar do
+  dataset (`dataset_cache`), então vale enquanto o CSV e a receita forem os
+  mesmos, e é aberto com `mmap_mode='r'`.
+
+Sem índice, `top_k`/`bottom_k` usam `np.partition` (O(n), sem ordenar a
+base toda). Em todos os casos o resultado é o mesmo de
+`sort_values(kind='stable').head(k)` (empates na ordem das linhas, NaN por
+último) e de `df[máscara]` (linhas na ordem original).
+
+Uso no notebook:
+
+    from sorted_index import PriceQueries, load_index
+
+    consultas = PriceQueries(df, load_index('../data/vehicle_price_prediction.csv', 'price', sep=','))
+    consultas.at_least(90000)
+    consultas.top(10, ['make', 'model', 'year', 'mileage', 'price'])
+
+Benchmark contra os sort_values completos:
+
+    python src/sorted_index.py data/vehicle_price_prediction.csv --rows 200000 2000000 10000000
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+INDEX_PREFIX = 'index-'
+
+
+def _as_float(values):
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def top_k(values, k, descending=True):
+    """
+    Posições das k linhas de maior (ou menor) valor sem índice, com
+    `np.partition` (O(n)). NaN vai para o fim, como no `sort_values`.
+    """
+    values = _as_float(values)
+    valid = np.flatnonzero(~np.isnan(values))
+    nan_rows = np.flatnonzero(np.isnan(values))
+    k = min(k, len(values))
+    n_valid = min(k, len(valid))
+    if n_valid == 0:
+        return nan_rows[:k]
+    sub = values[valid]
+    if descending:
+        threshold = np.partition(sub, len(sub) - n_valid)[len(sub) - n_valid]
+        above = valid[sub > threshold]
+    else:
+        threshold = np.partition(sub, n_valid - 1)[n_valid - 1]
+        above = valid[sub < threshold]
+    # Todas as linhas estritamente além do limiar + as primeiras empatadas nele
+    ties = valid[sub == threshold]
+    chosen = np.concatenate([above, ties[:n_valid - len(above)]])
+    key = -values[chosen] if descending else values[chosen]
+    return np.concatenate([chosen[np.lexsort((chosen, key))], nan_rows[:k - n_valid]])
+
+
+def bottom_k(values, k):
+    return top_k(values, k, descending=False)
+
+
+class SortedIndex:
+    """
+    Permutação estável que ordena uma coluna + os valores ordenados (NaN no fim).
+    """
+
+    def __init__(self, order, sorted_values):
+        self.order = order
+        self.sorted_values = sorted_values
+        self.n_valid = int(np.searchsorted(sorted_values, np.inf, side='right'))
+
+    @classmethod
+    def build(cls, values):
+        values = _as_float(values)
+        order = np.argsort(values, kind='stable')
+        return cls(order, values[order])
+
+    def __len__(self):
+        return len(self.order)
+
+    @staticmethod
+    def paths(directory, column):
+        prefix = Path(directory) / f'{INDEX_PREFIX}{column}'
+        return Path(f'{prefix}.order.npy'), Path(f'{prefix}.sorted.npy')
+
+    def save(self, directory, column):
+        for path, array in zip(self.paths(directory, column), (self.order, self.sorted_values)):
+            tmp = path.with_name(path.name + f'.tmp{os.getpid()}.npy')
+            np.save(tmp, np.asarray(array))
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory, column):
+        """
+        Abre um índice gravado com `save`, ou None se não existir.
+        """
+        order_path, sorted_path = cls.paths(directory, column)
+        if not (order_path.exists() and sorted_path.exists()):
+            return None
+        return cls(np.load(order_path, mmap_mode='r'), np.load(sorted_path, mmap_mode='r'))
+
+    def between(self, lo=None, hi=None, by_value=False):
+        """
+        Posições das linhas com lo <= valor <= hi (limites None = abertos), na
+        ordem das linhas ou, com `by_value=True`, em ordem crescente de valor.
+        """
+        start = 0 if lo is None else int(np.searchsorted(self.sorted_values[:self.n_valid], lo, side='left'))
+        stop = self.n_valid if hi is None else int(np.searchsorted(self.sorted_values[:self.n_valid], hi,
+                                                                   side='right'))
+        rows = np.asarray(self.order[start:max(start, stop)])
+        return rows if by_value else np.sort(rows)
+
+    def _block(self, value):
+        valid = self.sorted_values[:self.n_valid]
+        return int(np.searchsorted(valid, value, side='left')), int(np.searchsorted(valid, value, side='right'))
+
+    def bottom(self, k):
+        """
+        k menores: o começo da permutação (já estável); NaN só se faltar linha.
+        """
+        return np.asarray(self.order[:min(k, len(self.order))])
+
+    def top(self, k):
+        """
+        k maiores em ordem decrescente, empates na ordem das linhas.
+        """
+        k = min(k, len(self.order))
+        n_valid = min(k, self.n_valid)
+        nan_rows = np.asarray(self.order[self.n_valid:self.n_valid + k - n_valid])
+        if n_valid == 0:
+            return nan_rows
+        # O fim da permutação estável tem os empates do limiar nas últimas
+        # linhas; o sort_values decrescente estável fica com as primeiras.
+        threshold = self.sorted_values[self.n_valid - n_valid]
+        tie_start, tie_stop = self._block(threshold)
+        n_above = self.n_valid - tie_stop
+        chosen = np.concatenate([self.order[tie_stop:self.n_valid], self.order[tie_start:tie_stop][:n_valid - n_above]])
+        key = np.concatenate([self.sorted_values[tie_stop:self.n_valid], np.full(n_valid - n_above, threshold)])
+        return np.concatenate([chosen[np.lexsort((chosen, -key))], nan_rows])
+
+
+def load_index(path, column='price', recipe=None, cache_dir=None, build=True, **read_kwargs):
+    """
+    Índice de `column` guardado junto ao cache colunar de (CSV, receita).
+    Constrói e grava na primeira vez (com `build=True`).
+    """
+    from dataset_cache import cache_path, load_dataset
+
+    directory = cache_path(path, recipe, cache_dir, read_kwargs)
+    index = SortedIndex.load(directory, column) if directory.exists() else None
+    if index is None and build:
+        df = load_dataset(path, recipe=recipe, cache_dir=cache_dir, **read_kwargs)
+        index = SortedIndex.build(df[column])
+        index.save(directory, column)
+        index = SortedIndex.load(directory, column)
+    return index
+
+
+class PriceQueries:
+    """
+    Consultas de faixa e ranking sobre `df[column]`; usa o índice quando
+    existe e bate com o número de linhas, senão cai no cálculo direto.
+    """
+
+    def __init__(self, df, index=None, column='price'):
+        self.df = df
+        self.column = column
+        self.index = index if index is not None and len(index) == len(df) else None
+
+    def between(self, lo=None, hi=None, columns=None):
+        if self.index is not None:
+            rows = self.index.between(lo, hi)
+        else:
+            values = _as_float(self.df[self.column])
+            mask = ~np.isnan(values)
+            if lo is not None:
+                mask &= values >= lo
+            if hi is not None:
+                mask &= values <= hi
+            rows = np.flatnonzero(mask)
+        out = self.df.iloc[rows]
+        return out if columns is None else out.loc[:, columns]
+
+    def at_least(self, value, columns=None):
+        return self.between(lo=value, columns=columns)
+
+    def top(self, k=10, columns=None):
+        rows = self.index.top(k) if self.index is not None else top_k(self.df[self.column], k)
+        out = self.df.iloc[rows]
+        return out if columns is None else out.loc[:, columns]
+
+    def bottom(self, k=10, columns=None):
+        rows = self.index.bottom(k) if self.index is not None else bottom_k(self.df[self.column], k)
+        out = self.df.iloc[rows]
+        return out if columns is None else out.loc[:, columns]
+
+
+def _timed(func, repeats=5):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def benchmark(df, sizes, threshold=90000, k=10, seed=0):
+    """
+    Consultas do notebook (máscara + dois sort_values completos) vs. índice
+    ordenado e vs. argpartition, conferindo que os resultados coincidem.
+    """
+    columns = ['make', 'model', 'year', 'mileage', 'price']
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n_rows in sizes:
+        big = df[columns].iloc[rng.integers(0, len(df), n_rows)].reset_index(drop=True)
+        big['price'] = (big['price'] * rng.normal(1, 0.01, n_rows)).round(2)
+
+        def notebook():
+            return (big[big['price'] >= threshold],
+                    big.loc[:, columns].sort_values(by='price', ascending=False, kind='stable').head(k),
+                    big.loc[:, columns].sort_values(by='price', ascending=True, kind='stable').head(k))
+
+        ref, notebook_s = _timed(notebook, repeats=3)
+        index, build_s = _timed(lambda: SortedIndex.build(big['price']), repeats=1)
+        indexed = PriceQueries(big, index)
+        fallback = PriceQueries(big)
+        got, index_s = _timed(lambda: (indexed.at_least(threshold), indexed.top(k, columns), indexed.bottom(k, columns)))
+        alt, fallback_s = _timed(lambda: (fallback.at_least(threshold), fallback.top(k, columns),
+                                          fallback.bottom(k, columns)), repeats=3)
+        for a, b, c in zip(ref, got, alt):
+            pd.testing.assert_frame_equal(a, b)
+            pd.testing.assert_frame_equal(a, c)
+        _, topk_index_s = _timed(lambda: (index.top(k), index.bottom(k)))
+        _, topk_sort_s = _timed(lambda: (big['price'].sort_values(ascending=False, kind='stable').head(k),
+                                         big['price'].sort_values(kind='stable').head(k)), repeats=3)
+        rows.append({
+            'linhas': n_rows,
+            'notebook_s': notebook_s,
+            'indice_s': index_s,
+            'argpartition_s': fallback_s,
+            'top_bottom_sort_ms': topk_sort_s * 1000,
+            'top_bottom_indice_ms': topk_index_s * 1000,
+            'construcao_indice_s': build_s,
+            'linhas_acima': len(got[0]),
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Índice ordenado de preço vs. sort_values completos.')
+    parser.add_argument('path', help='vehicle_price_prediction.csv')
+    parser.add_argument('--rows', type=int, nargs='+', default=[200_000, 2_000_000])
+    parser.add_argument('--threshold', type=float, default=90000)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    df.columns = df.columns.str.strip()
+    with pd.option_context('display.float_format', '{:.4g}'.format):
+        print(benchmark(df, args.rows, args.threshold).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
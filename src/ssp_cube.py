@@ -0,0 +1,536 @@
+"""
+Cubo pré-agregado tempo x local x tipo de crime das ocorrências da SSP-SP.
+
+Toda pergunta do notebook da SSP é um recorte ou uma soma do registro (por
+ano/mês, por município ou região, por tipo de crime), e cada uma relia o CSV
+inteiro (src/ssp_stream.py). Aqui o registro é lido uma vez e somado num
+array denso:
+
+- `ocorrencias.npy`: int32 de forma (meses, locais, crimes), com o eixo de
+  tempo começando em janeiro do primeiro ano (então `(anos, 12, ...)` é só
+  um reshape) e os locais ordenados por (regiao_ssp, id_municipio);
+- `linhas.npy`: número de linhas do registro em cada (mês, local), para saber
+  quais grupos foram observados (os mesmos de um `groupby(observed=True)`);
+- `meta.json`: primeiro ano, crimes, locais e arquivos já somados, com os
+  meses que cada um cobre.
+
+Um município pode aparecer em mais de uma região no registro, então o eixo de
+locais guarda os pares (id_municipio, regiao_ssp) observados em vez de duas
+dimensões quase vazias. Os arrays são abertos com `np.load(mmap_mode='r')`:
+roll-ups, drill-downs e séries temporais viram somas sobre eixos do cubo, em
+milissegundos, sem tocar no CSV. Contagens vazias (NaN) contam como zero, como
+em `ssp_stream.StreamingAggregator`, e `table`/`long`/`by_crime` devolvem as
+mesmas tabelas dele.
+
+Quando chega o arquivo de um novo mês, `update` lê só esse arquivo, soma no
+cubo (aumentando os eixos se aparecerem anos, locais ou crimes novos) e
+regrava o diretório (temporário + rename, como `dataset_cache.write_cache`).
+Cada arquivo vale pelos meses que contém: um mês que já estava no cubo (ex.:
+a reexportação corrigida de um mês) tem a fatia substituída, não somada.
+Um arquivo já somado (mesmo conteúdo) é ignorado; `open_or_build` reconstrói o
+cubo quando o registro pedido não é nenhum dos arquivos somados.
+
+Uso no notebook:
+
+    from ssp_cube import SSPCube
+
+    cubo = SSPCube.open_or_build('../data/.cache/ssp-cubo', arquivo)
+    display(cubo.table(['ano', 'regiao_ssp']))
+    display(cubo.table(['id_municipio'], ano=2019, crimes=['roubo_de_veiculo']))
+    cubo.series('furto_de_veiculo', regiao_ssp='Capital').plot()
+    cubo = cubo.update('../data/ssp-2020-01.csv')
+
+Benchmark (cubo vs. releitura do CSV a cada pergunta) e atualização mensal:
+
+    python src/ssp_cube.py benchmark
+    python src/ssp_cube.py build data/br_sp_gov_ssp_ocorrencias_registradas.csv --cube data/.cache/ssp-cubo
+    python src/ssp_cube.py update novo-mes.csv --cube data/.cache/ssp-cubo
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import default_cache_dir, file_sha256
+from ssp_stream import (DATA_DIR, DEFAULT_CHUNKSIZE, DEFAULT_GROUPINGS, SSP_CSV, crime_columns, iter_chunks,
+                        summarize)
+
+CUBE_VERSION = 3
+CUBE_DTYPE = 'int32'
+DEFAULT_CUBE_DIR = DATA_DIR / '.cache' / 'ssp-cubo'
+
+TIME_KEYS = ['ano', 'mes']
+LOCATION_KEYS = ['regiao_ssp', 'id_municipio']
+KEYS = TIME_KEYS + LOCATION_KEYS
+
+
+def file_digest(path):
+    # SHA-256 memorizado por (tamanho, mtime) no hashes.json do cache do CSV, o mesmo do
+    # dataset_cache: abrir o cubo não relê o registro enquanto o arquivo não muda
+    return file_sha256(path, default_cache_dir(path))
+
+
+def partial_counts(chunks):
+    """
+    Somas por (ano, mes, regiao_ssp, id_municipio) de uma sequência de blocos
+    do registro, com a coluna `linhas` (linhas somadas em cada grupo).
+    """
+    parts, crimes = [], []
+    for chunk in chunks:
+        names = crime_columns(chunk.columns)
+        crimes += [c for c in names if c not in crimes]
+        counts = chunk[names].fillna(0).astype('int64')
+        counts['linhas'] = 1
+        keys = [np.asarray(chunk[k]) for k in KEYS]
+        parts.append(counts.groupby(keys, sort=False).sum().rename_axis(KEYS))
+    if not parts:
+        return pd.DataFrame(columns=KEYS + ['linhas']), crimes
+    total = pd.concat(parts).fillna(0).astype('int64')
+    if len(parts) > 1:
+        total = total.groupby(level=KEYS, sort=False).sum()
+    return total.reset_index(), crimes
+
+
+class SSPCube:
+    """
+    Cubo denso de contagens (mês, local, crime) guardado num diretório.
+    """
+
+    def __init__(self, counts, rows, first_year, crimes, locations, files=()):
+        self.counts = counts
+        self.rows = rows
+        self.first_year = int(first_year)
+        self.crimes = list(crimes)
+        self.locations = pd.DataFrame(locations, columns=LOCATION_KEYS)
+        self.locations['id_municipio'] = self.locations['id_municipio'].astype('int64')
+        self.files = list(files)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 0, 0), dtype=CUBE_DTYPE), np.zeros((0, 0), dtype=CUBE_DTYPE), 0, [], [])
+
+    @property
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.counts.shape[0] // 12)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.rows.nbytes
+
+    # --- construção e atualização -------------------------------------------------
+
+    @classmethod
+    def build(cls, path=SSP_CSV, directory=None, chunksize=DEFAULT_CHUNKSIZE, sep=','):
+        """
+        Lê o registro uma vez e devolve o cubo (gravado em `directory`, se dado).
+        """
+        return cls.empty().update(path, directory, chunksize, sep)
+
+    @classmethod
+    def open_or_build(cls, directory, path=SSP_CSV, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Abre o cubo de `directory` se `path` (mesmo conteúdo) já foi somado
+        nele; senão (cubo ausente, ou registro substituído/reexportado)
+        reconstrói a partir de `path`.
+        """
+        directory = Path(directory)
+        meta_path = directory / 'meta.json'
+        if meta_path.exists() and json.loads(meta_path.read_text())['version'] == CUBE_VERSION:
+            cube = cls.load(directory)
+            if any(f['hash'] == file_digest(path) for f in cube.files):
+                return cube
+            print(f'{Path(path).name} não está no cubo de {directory}: reconstruindo')
+        return cls.build(path, directory, chunksize)
+
+    def update(self, path, directory=None, chunksize=DEFAULT_CHUNKSIZE, sep=','):
+        """
+        Soma um arquivo novo (ex.: o registro de um mês) ao cubo. Lê só esse
+        arquivo; um arquivo já somado é ignorado e os meses do arquivo que já
+        estavam no cubo são substituídos pelos do arquivo. Devolve o cubo
+        atualizado, regravado em `directory` (padrão: o diretório de onde foi
+        carregado).
+        """
+        directory = directory or getattr(self, 'directory', None)
+        digest = file_digest(path)
+        if any(f['hash'] == digest for f in self.files):
+            print(f'{Path(path).name}: já está no cubo, nada a fazer')
+            return self
+
+        partial, crimes = partial_counts(iter_chunks(path, chunksize, sep=sep))
+        months = sorted({f'{ano:04d}-{mes:02d}' for ano, mes in zip(partial['ano'], partial['mes'])})
+        cube = self._grow(partial, crimes)
+        cube._clear_months(months)
+        cube._add(partial)
+        cube.files.append({'nome': Path(path).name, 'hash': digest, 'linhas': int(partial['linhas'].sum()),
+                           'meses': months})
+        return cube.save(directory) if directory is not None else cube
+
+    def _grow(self, partial, crimes):
+        # Eixos novos = união dos atuais com os do lote; os valores antigos são copiados para as novas posições
+        years = np.concatenate([self.years, partial['ano'].to_numpy()])
+        first_year = int(years.min()) if len(years) else 0
+        n_years = int(years.max()) - first_year + 1 if len(years) else 0
+        crimes = self.crimes + [c for c in crimes if c not in self.crimes]
+        locations = pd.concat([self.locations, partial[LOCATION_KEYS].astype({'id_municipio': 'int64'})])
+        locations = locations.drop_duplicates().sort_values(LOCATION_KEYS, ignore_index=True)
+
+        if (first_year, n_years * 12, crimes) == (self.first_year, self.counts.shape[0], self.crimes) and \
+                len(locations) == len(self.locations):
+            return SSPCube(np.array(self.counts), np.array(self.rows), first_year, crimes, locations, self.files)
+
+        counts = np.zeros((n_years * 12, len(locations), len(crimes)), dtype=CUBE_DTYPE)
+        rows = np.zeros(counts.shape[:2], dtype=CUBE_DTYPE)
+        if self.counts.size:
+            t = (self.first_year - first_year) * 12 + np.arange(self.counts.shape[0])
+            loc = pd.MultiIndex.from_frame(locations).get_indexer(pd.MultiIndex.from_frame(self.locations))
+            counts[np.ix_(t, loc, np.arange(len(self.crimes)))] = self.counts
+            rows[np.ix_(t, loc)] = self.rows
+        return SSPCube(counts, rows, first_year, crimes, locations, self.files)
+
+    def _clear_months(self, months):
+        # Meses já cobertos por arquivos anteriores: zera a fatia e tira o mês desses arquivos
+        replaced = set(months) & {month for f in self.files for month in f['meses']}
+        if not replaced:
+            return
+        print(f'Substituindo {len(replaced)} mês(es) já presentes no cubo: {", ".join(sorted(replaced))}')
+        t = [(int(month[:4]) - self.first_year) * 12 + int(month[5:]) - 1 for month in replaced]
+        self.counts[t] = 0
+        self.rows[t] = 0
+        files = []
+        for f in self.files:
+            f = dict(f, meses=[month for month in f['meses'] if month not in replaced])
+            # Arquivo sem nenhum mês restante sai da lista (pode ser aplicado de novo)
+            if f['meses']:
+                files.append(f)
+        self.files = files
+
+    def _add(self, partial):
+        if not len(partial):
+            return
+        t = (partial['ano'].to_numpy() - self.first_year) * 12 + partial['mes'].to_numpy() - 1
+        loc = pd.MultiIndex.from_frame(self.locations).get_indexer(
+            pd.MultiIndex.from_frame(partial[LOCATION_KEYS].astype({'id_municipio': 'int64'})))
+        crimes = [c for c in self.crimes if c in partial.columns]
+        c = np.array([self.crimes.index(name) for name in crimes])
+
+        # Cada (ano, mes, local) aparece uma vez no lote: atribuição indexada em vez de np.add.at
+        counts = self.counts[t[:, None], loc[:, None], c] + partial[crimes].to_numpy(dtype=np.int64)
+        rows = self.rows[t, loc] + partial['linhas'].to_numpy(dtype=np.int64)
+        limit = np.iinfo(CUBE_DTYPE).max
+        if counts.max(initial=0) > limit or rows.max(initial=0) > limit:
+            raise OverflowError(f'Contagem acima do limite de {CUBE_DTYPE} no cubo')
+        self.counts[t[:, None], loc[:, None], c] = counts
+        self.rows[t, loc] = rows
+
+    # --- persistência --------------------------------------------------------------
+
+    def save(self, directory):
+        """
+        Grava o cubo num diretório temporário e troca pelo antigo no final.
+        Devolve o cubo reaberto com os arrays mapeados em memória; cubos já
+        abertos do diretório antigo continuam válidos (os arquivos deles só
+        saem do diretório, os mapas não são fechados).
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=directory.name + '.tmp', dir=directory.parent))
+        np.save(tmp / 'ocorrencias.npy', self.counts)
+        np.save(tmp / 'linhas.npy', self.rows)
+        meta = {
+            'version': CUBE_VERSION,
+            'primeiro_ano': self.first_year,
+            'crimes': self.crimes,
+            'locais': self.locations.astype(object).values.tolist(),
+            'arquivos': self.files,
+        }
+        (tmp / 'meta.json').write_text(json.dumps(meta, indent=1, ensure_ascii=False))
+
+        # Troca por rename: o diretório antigo sai do caminho antes de ser apagado
+        old = None
+        if directory.exists():
+            old = Path(tempfile.mkdtemp(prefix=directory.name + '.old', dir=directory.parent))
+            os.replace(directory, old / directory.name)
+        os.replace(tmp, directory)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+        return SSPCube.load(directory)
+
+    @classmethod
+    def load(cls, directory):
+        directory = Path(directory)
+        meta = json.loads((directory / 'meta.json').read_text())
+        if meta['version'] != CUBE_VERSION:
+            raise ValueError(f'Cubo na versão {meta["version"]}, esperado {CUBE_VERSION}: reconstrua com build')
+        cube = cls(np.load(directory / 'ocorrencias.npy', mmap_mode='r'),
+                   np.load(directory / 'linhas.npy', mmap_mode='r'),
+                   meta['primeiro_ano'], meta['crimes'], meta['locais'], meta['arquivos'])
+        cube.directory = directory
+        return cube
+
+    # --- consultas -------------------------------------------------------------------
+
+    def _select(self, crimes=None, **filters):
+        """
+        Recorte (drill-down) do cubo: arrays (anos, 12, locais, crimes) e
+        (anos, 12, locais), mais os locais e crimes que sobraram.
+        """
+        unknown = set(filters) - set(KEYS)
+        if unknown:
+            raise KeyError(f'Filtros desconhecidos: {sorted(unknown)}. Disponíveis: {KEYS}')
+        crimes = self.crimes if crimes is None else [crimes] if isinstance(crimes, str) else list(crimes)
+        c = [self.crimes.index(name) for name in crimes]
+        n_years = self.counts.shape[0] // 12
+        counts = self.counts.reshape(n_years, 12, *self.counts.shape[1:])
+        rows = self.rows.reshape(n_years, 12, -1)
+
+        years, months = np.arange(n_years), np.arange(12)
+        if 'ano' in filters:
+            years = np.flatnonzero(np.isin(self.years, np.atleast_1d(filters['ano'])))
+        if 'mes' in filters:
+            months = np.atleast_1d(filters['mes']) - 1
+        locations = self.locations
+        mask = np.ones(len(locations), dtype=bool)
+        for key in LOCATION_KEYS:
+            if key in filters:
+                mask &= locations[key].isin(np.atleast_1d(filters[key])).to_numpy()
+        loc = np.flatnonzero(mask)
+
+        if len(years) < n_years or len(months) < 12:
+            counts, rows = counts[np.ix_(years, months)], rows[np.ix_(years, months)]
+        if len(loc) < len(locations):
+            counts, rows = counts[:, :, loc], rows[:, :, loc]
+        if len(c) < len(self.crimes) or c != sorted(c):
+            counts = counts[..., c]
+        return counts, rows, self.years[years], months + 1, locations.iloc[loc], crimes
+
+    def table(self, keys, crimes=None, **filters):
+        """
+        Tabela larga como `StreamingAggregator.table`: índice = `keys`
+        (subconjunto de ano, mes, regiao_ssp, id_municipio), colunas = crimes.
+        `filters` recortam o cubo antes da soma (ex.: `ano=2019`,
+        `regiao_ssp=['Capital', 'Santos']`).
+        """
+        keys = list(keys)
+        unknown = set(keys) - set(KEYS)
+        if unknown:
+            raise KeyError(f'Chaves desconhecidas: {sorted(unknown)}. Disponíveis: {KEYS}')
+        counts, rows, years, months, locations, crimes = self._select(crimes, **filters)
+
+        # Soma os eixos de tempo que não estão nas chaves
+        time_axes = tuple(i for i, key in enumerate(TIME_KEYS) if key not in keys)
+        counts = counts.sum(axis=time_axes, dtype=np.int64)
+        rows = rows.sum(axis=time_axes, dtype=np.int64)
+        time_keys = [key for key in TIME_KEYS if key in keys]
+        time_values = {'ano': years, 'mes': months}
+        time_shape = counts.shape[:len(time_keys)]
+        counts = counts.reshape(-1, *counts.shape[len(time_keys):])
+        rows = rows.reshape(-1, rows.shape[-1])
+
+        # Locais agrupados pelas chaves de local pedidas: ordena pelo grupo e soma trechos contíguos
+        location_keys = [key for key in LOCATION_KEYS if key in keys]
+        if location_keys:
+            codes, groups = pd.MultiIndex.from_frame(locations[location_keys]).factorize()
+        else:
+            codes, groups = np.zeros(len(locations), dtype=np.int64), None
+        order = np.argsort(codes, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0]) if len(order) else np.empty(0, dtype=int)
+        counts = np.add.reduceat(counts[:, order], starts, axis=1) if len(starts) else counts[:, :0]
+        rows = np.add.reduceat(rows[:, order], starts, axis=1) if len(starts) else rows[:, :0]
+        group_codes = codes[order][starts]
+
+        # Índice: valores de tempo x grupos de local, só os observados
+        n_time = int(np.prod(time_shape))
+        observed = rows.ravel() > 0
+        time_pos = np.unravel_index(np.repeat(np.arange(n_time), len(starts)), time_shape) if time_keys else ()
+        group_pos = np.tile(group_codes, n_time)
+        arrays = {key: time_values[key][pos] for key, pos in zip(time_keys, time_pos)}
+        for i, key in enumerate(location_keys):
+            arrays[key] = groups.get_level_values(i).to_numpy()[group_pos]
+        arrays = [arrays[key][observed] for key in keys]
+        index = pd.MultiIndex.from_arrays(arrays, names=keys) if len(keys) > 1 else pd.Index(arrays[0], name=keys[0])
+        out = pd.DataFrame(counts.reshape(-1, len(crimes))[observed], index=index, columns=crimes)
+        return out.sort_index()
+
+    def long(self, keys, crimes=None, **filters):
+        """
+        Mesma tabela em formato longo, com `crime` como coluna categórica.
+        """
+        wide = self.table(keys, crimes, **filters)
+        out = wide.reset_index().melt(id_vars=list(keys), var_name='crime', value_name='ocorrencias')
+        out['crime'] = pd.Categorical(out['crime'], categories=wide.columns)
+        return out
+
+    def by_crime(self, **filters):
+        """
+        Total por tipo de crime (em ordem decrescente).
+        """
+        counts = self._select(**filters)[0]
+        totals = counts.reshape(-1, counts.shape[-1]).sum(axis=0, dtype=np.int64)
+        return pd.Series(totals, index=self.crimes).sort_values(ascending=False)
+
+    def series(self, crimes=None, **filters):
+        """
+        Série mensal (índice `PeriodIndex`) de um crime, ou tabela mensal de
+        vários, somando os locais do recorte.
+        """
+        counts, rows, years, months, _, names = self._select(crimes, **filters)
+        values = counts.sum(axis=2, dtype=np.int64).reshape(-1, len(names))
+        periods = pd.PeriodIndex.from_fields(year=np.repeat(years, len(months)), month=np.tile(months, len(years)),
+                                             freq='M')
+        out = pd.DataFrame(values, index=periods, columns=names)
+        return out.iloc[:, 0] if isinstance(crimes, str) else out
+
+
+def check_update_keeps_original(path=SSP_CSV, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    `update` com diretório devolve um cubo novo e não mexe no cubo de quem
+    chamou: o original continua respondendo as mesmas tabelas de antes.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix='ssp-cubo-'))
+    try:
+        base, month, _ = _split_last_month(path, workdir)
+        cube = SSPCube.build(base, workdir / 'cubo', chunksize)
+        before = cube.table(['ano', 'regiao_ssp'])
+        updated = cube.update(month)
+        pd.testing.assert_frame_equal(cube.table(['ano', 'regiao_ssp']), before)
+        if updated.table(['ano']).to_numpy().sum() <= before.to_numpy().sum():
+            raise AssertionError('Cubo atualizado sem as linhas do mês novo')
+        cube = updated = None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check_replaces_months(path=SSP_CSV, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Um arquivo com meses que já estão no cubo (aqui, o último ano do próprio
+    registro) substitui essas fatias em vez de somar: o cubo não muda.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix='ssp-cubo-'))
+    try:
+        df = pd.read_csv(path)
+        last_year = workdir / 'ultimo-ano.csv'
+        df[df['ano'] == df['ano'].max()].to_csv(last_year, index=False)
+        cube = SSPCube.build(path, workdir / 'cubo', chunksize)
+        updated = cube.update(last_year)
+        if not (np.array_equal(updated.counts, cube.counts) and np.array_equal(updated.rows, cube.rows)):
+            raise AssertionError('Meses reenviados foram somados de novo no cubo')
+        cube = updated = None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _split_last_month(path, workdir):
+    # Separa o último mês do registro num arquivo à parte, simulando a chegada de um arquivo mensal
+    df = pd.read_csv(path)
+    period = df['ano'] * 12 + df['mes']
+    last = period == period.max()
+    base, month = Path(workdir) / 'base.csv', Path(workdir) / 'ultimo-mes.csv'
+    df[~last].to_csv(base, index=False)
+    df[last].to_csv(month, index=False)
+    return base, month, int(last.sum())
+
+
+def benchmark(path=SSP_CSV, chunksize=DEFAULT_CHUNKSIZE, repeat=5):
+    """
+    Cada agrupamento de `ssp_stream.DEFAULT_GROUPINGS` (mais um drill-down e
+    uma série temporal) respondido relendo o CSV vs. pelo cubo mapeado; confere
+    que as tabelas são iguais. Mede também o build e a atualização mensal.
+    """
+    rows = []
+    workdir = Path(tempfile.mkdtemp(prefix='ssp-cubo-'))
+    try:
+        start = time.perf_counter()
+        cube = SSPCube.build(path, workdir / 'cubo', chunksize)
+        rows.append({'etapa': 'build (leitura única)', 'csv_s': np.nan, 'cubo_s': time.perf_counter() - start})
+
+        questions = [(keys, {}) for keys in DEFAULT_GROUPINGS] + [(('id_municipio',), {'ano': 2019,
+                                                                                        'regiao_ssp': 'Capital'})]
+        for keys, filters in questions:
+            start = time.perf_counter()
+            agg = summarize(path, chunksize, groupings=[keys])
+            expected = agg.table(keys)
+            csv_seconds = time.perf_counter() - start
+            if filters:
+                start = time.perf_counter()
+                chunks = [chunk for chunk in iter_chunks(path, chunksize)]
+                df = pd.concat([c[(c['ano'] == filters['ano']) & (c['regiao_ssp'] == filters['regiao_ssp'])]
+                                for c in chunks])
+                expected = (df[cube.crimes].fillna(0).astype('int64')
+                            .groupby(np.asarray(df['id_municipio']), sort=True).sum().rename_axis('id_municipio'))
+                csv_seconds = time.perf_counter() - start
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                got = cube.table(keys, **filters)
+                timings.append(time.perf_counter() - start)
+            pd.testing.assert_frame_equal(got, expected, check_index_type=False, check_names=False,
+                                          check_column_type=False)
+            label = ' x '.join(keys) + (f' ({filters})' if filters else '')
+            rows.append({'etapa': label, 'csv_s': csv_seconds, 'cubo_s': min(timings)})
+
+        start = time.perf_counter()
+        cube.series(cube.crimes[0], regiao_ssp='Capital')
+        rows.append({'etapa': f'série mensal {cube.crimes[0]} (Capital)', 'csv_s': np.nan,
+                     'cubo_s': time.perf_counter() - start})
+
+        # Atualização mensal: cubo sem o último mês + arquivo do mês == cubo completo
+        base, month, n_month = _split_last_month(path, workdir)
+        partial = SSPCube.build(base, workdir / 'incremental', chunksize)
+        start = time.perf_counter()
+        partial = partial.update(month)
+        rows.append({'etapa': f'update mensal ({n_month} linhas)', 'csv_s': np.nan,
+                     'cubo_s': time.perf_counter() - start})
+        if not (np.array_equal(partial.counts, cube.counts) and np.array_equal(partial.rows, cube.rows)):
+            raise AssertionError('Cubo atualizado difere do cubo completo')
+        partial = cube = None
+        check_update_keeps_original(path, chunksize)
+        check_replaces_months(path, chunksize)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out = pd.DataFrame(rows)
+    out['speedup'] = out['csv_s'] / out['cubo_s']
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cubo pré-agregado tempo x local x crime da SSP-SP.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='lê o registro e grava o cubo')
+    build.add_argument('path', nargs='?', default=str(SSP_CSV))
+    update = sub.add_parser('update', help='soma um arquivo novo (ex.: um mês) ao cubo')
+    update.add_argument('path')
+    bench = sub.add_parser('benchmark', help='perguntas relendo o CSV vs. pelo cubo')
+    bench.add_argument('path', nargs='?', default=str(SSP_CSV))
+    bench.add_argument('--repeat', type=int, default=5)
+    for p in (build, update, bench):
+        p.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    for p in (build, update):
+        p.add_argument('--cube', default=str(DEFAULT_CUBE_DIR), help='diretório do cubo')
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        with pd.option_context('display.width', 120, 'display.max_colwidth', 60):
+            print(benchmark(args.path, args.chunksize, args.repeat).to_string(index=False, float_format='{:.4f}'.format))
+        return
+
+    start = time.perf_counter()
+    if args.command == 'build':
+        cube = SSPCube.build(args.path, args.cube, args.chunksize)
+    else:
+        cube = SSPCube.load(args.cube).update(args.path, chunksize=args.chunksize)
+    print(f'{args.command} em {time.perf_counter() - start:.2f}s: cubo {cube.counts.shape} '
+          f'({cube.nbytes / 1024 ** 2:.1f} MB) em {args.cube}')
+    print(f'Arquivos somados: {[f["nome"] for f in cube.files]}')
+
+
+if __name__ == '__main__':
+    main()
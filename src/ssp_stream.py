@@ -0,0 +1,196 @@
+"""
+Leitura em blocos do registro de ocorrências da SSP-SP.
+
+O CSV completo (`br_sp_gov_ssp_ocorrencias_registradas.csv`) não cabe na memória
+do kernel quando lido de uma vez com tipos padrão (float64 para cada contagem).
+Aqui o arquivo é lido em blocos de tamanho fixo, com tipos compactos:
+
+- `ano` e `mes` como inteiros pequenos;
+- `id_municipio` e `regiao_ssp` como `category`;
+- contagens de ocorrências como `float32` (4 bytes, exato para inteiros até 2**24
+  e preserva os NaN do arquivo; o parser de inteiros anuláveis do pandas é ~8x
+  mais lento). Na agregação as contagens viram int64 antes de somar.
+
+As agregações (totais por ano, região, município e tipo de crime) são acumuladas
+bloco a bloco, então o pico de memória depende do tamanho do bloco e não do
+tamanho do arquivo. Para várias perguntas sobre o mesmo registro, src/ssp_cube.py
+lê o arquivo uma vez e guarda as somas num cubo mês x local x crime em disco.
+
+Uso no notebook:
+
+    from ssp_stream import SSP_CSV, preview, summarize
+
+    display(preview(SSP_CSV))
+    agg = summarize(SSP_CSV, chunksize=100_000)
+    display(agg.table(['ano']))
+    display(agg.long(['ano', 'regiao_ssp']))
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from groupagg import plain_index
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+SSP_CSV = DATA_DIR / 'br_sp_gov_ssp_ocorrencias_registradas.csv'
+
+# Colunas de identificação; todas as demais são contagens de um tipo de crime
+KEY_DTYPES = {
+    'ano': 'int16',
+    'mes': 'int8',
+    'id_municipio': 'int32',
+    'regiao_ssp': 'category',
+}
+CATEGORY_COLUMNS = ['id_municipio', 'regiao_ssp']
+COUNT_DTYPE = 'float32'
+
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_GROUPINGS = [('ano',), ('regiao_ssp',), ('id_municipio',), ('ano', 'regiao_ssp')]
+
+
+def read_header(path, sep=','):
+    return pd.read_csv(path, sep=sep, nrows=0).columns.tolist()
+
+
+def ssp_dtypes(columns, count_dtype=COUNT_DTYPE):
+    """
+    Mapa coluna -> dtype compacto para o `read_csv`.
+    """
+    return {col: KEY_DTYPES.get(col, count_dtype) for col in columns}
+
+
+def crime_columns(columns):
+    return [col for col in columns if col not in KEY_DTYPES]
+
+
+def iter_chunks(path=SSP_CSV, chunksize=DEFAULT_CHUNKSIZE, usecols=None, sep=','):
+    """
+    Itera sobre o CSV em blocos de `chunksize` linhas com tipos compactos.
+    """
+    columns = read_header(path, sep)
+    if usecols is not None:
+        columns = [col for col in columns if col in set(usecols)]
+    reader = pd.read_csv(
+        path,
+        sep=sep,
+        usecols=columns,
+        dtype=ssp_dtypes(columns),
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            yield _categorize(chunk)
+
+
+def _categorize(chunk):
+    # O código IBGE é lido como inteiro e só então vira categoria (mantém o tipo dos valores)
+    for col in CATEGORY_COLUMNS:
+        if col in chunk.columns and not isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            chunk[col] = chunk[col].astype('category')
+    return chunk
+
+
+def preview(path=SSP_CSV, n=5, sep=','):
+    """
+    Primeiras `n` linhas com os mesmos tipos da leitura em blocos
+    (substitui o `display(data)` do arquivo inteiro).
+    """
+    columns = read_header(path, sep)
+    return _categorize(pd.read_csv(path, sep=sep, nrows=n, dtype=ssp_dtypes(columns)))
+
+
+class StreamingAggregator:
+    """
+    Acumula somas de ocorrências por grupo, um bloco de cada vez.
+
+    Para cada agrupamento (tupla de colunas-chave) é mantida uma tabela
+    pequena `grupo x tipo de crime` com as somas em int64. O tamanho dessas
+    tabelas depende do número de grupos (anos, regiões, municípios), nunca
+    do número de linhas lidas.
+    """
+
+    def __init__(self, groupings=DEFAULT_GROUPINGS, crimes=None):
+        self.groupings = [tuple(g) for g in groupings]
+        self.crimes = list(crimes) if crimes is not None else None
+        self.totals = {}
+        self.n_rows = 0
+        self.n_chunks = 0
+        self.peak_chunk_bytes = 0
+
+    def update(self, chunk):
+        if self.crimes is None:
+            self.crimes = crime_columns(chunk.columns)
+
+        # Soma em inteiro: float32 perderia precisão nos totais grandes
+        counts = chunk[self.crimes].fillna(0).astype('int64')
+        for keys in self.groupings:
+            partial = counts.groupby([chunk[k] for k in keys], observed=True, sort=False).sum()
+            # Categorias variam entre blocos: acumula pelo valor, não pelo código
+            partial.index = plain_index(partial.index)
+            previous = self.totals.get(keys)
+            self.totals[keys] = partial if previous is None else previous.add(partial, fill_value=0).astype('int64')
+
+        self.n_rows += len(chunk)
+        self.n_chunks += 1
+        self.peak_chunk_bytes = max(self.peak_chunk_bytes, int(chunk.memory_usage(deep=True).sum()))
+        return self
+
+    def table(self, keys):
+        """
+        Tabela larga: índice = chaves do agrupamento, colunas = tipos de crime.
+        """
+        keys = tuple(keys)
+        if keys not in self.totals:
+            raise KeyError(f'Agrupamento não acumulado: {keys}. Disponíveis: {self.groupings}')
+        return self.totals[keys].sort_index()
+
+    def long(self, keys):
+        """
+        Mesma tabela em formato longo, com `crime` como coluna categórica.
+        """
+        wide = self.table(keys)
+        out = wide.reset_index().melt(id_vars=list(keys), var_name='crime', value_name='ocorrencias')
+        out['crime'] = pd.Categorical(out['crime'], categories=self.crimes)
+        return out
+
+    def by_crime(self):
+        """
+        Total geral por tipo de crime (derivado do primeiro agrupamento).
+        """
+        first = self.totals[self.groupings[0]]
+        return first.sum().sort_values(ascending=False)
+
+
+def summarize(path=SSP_CSV, chunksize=DEFAULT_CHUNKSIZE, groupings=DEFAULT_GROUPINGS, sep=','):
+    """
+    Lê o arquivo inteiro em blocos e devolve o `StreamingAggregator` preenchido.
+    """
+    agg = StreamingAggregator(groupings)
+    for chunk in iter_chunks(path, chunksize, sep=sep):
+        agg.update(chunk)
+    return agg
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agregação em blocos do registro de ocorrências da SSP-SP.')
+    parser.add_argument('path', nargs='?', default=str(SSP_CSV))
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    agg = summarize(args.path, args.chunksize)
+    elapsed = time.perf_counter() - start
+
+    print(f'Linhas lidas: {agg.n_rows} em {agg.n_chunks} blocos ({elapsed:.2f}s)')
+    print(f'Maior bloco em memória: {agg.peak_chunk_bytes / 1024 ** 2:.1f} MB')
+    print('\nOcorrências por ano (5 primeiros tipos de crime):')
+    print(agg.table(['ano']).iloc[:, :5])
+    print('\nTotal por tipo de crime:')
+    print(agg.by_crime())
+
+
+if __name__ == '__main__':
+    main()
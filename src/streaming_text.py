@@ -0,0 +1,291 @@
+"""
+Treino out-of-core para corpora de notícias maiores que a memória.
+
+O pipeline do notebook do AG News mantém o corpus, a coluna `processed_text` e
+uma matriz esparsa com o vocabulário completo em memória; com bigramas o
+vocabulário explode. O modo streaming aqui:
+
+1. lê o CSV em blocos (`pd.read_csv(chunksize=...)`);
+2. pré-processa cada bloco com o `TextPreprocessor` (src/text_preprocess.py);
+3. projeta os tokens num espaço de dimensão fixa com `HashingVectorizer`
+   (`alternate_sign=False`, para o Naive Bayes continuar recebendo valores não
+   negativos; bigramas opcionais), sem vocabulário a guardar;
+4. treina os modelos lineares com `partial_fit`: regressão logística
+   (`SGDClassifier(loss='log_loss')`), SVM linear (`SGDClassifier(loss='hinge')`)
+   e `MultinomialNB`.
+
+A divisão treino/teste é feita por linha (hash do número da linha), então não
+depende de ver o arquivo inteiro, e a avaliação acumula só a matriz de
+confusão. A memória fica limitada pelo tamanho do bloco e por
+`n_features` x classes dos coeficientes, independente do tamanho do corpus.
+
+Uso:
+
+    from streaming_text import StreamingTextClassifier
+
+    clf = StreamingTextClassifier(ngram_range=(1, 2))
+    clf.fit_csv('../data/agnews.csv', chunksize=10_000)
+    clf.evaluate_csv('../data/agnews.csv')
+
+Comparação com o caminho em memória (TF-IDF), cada um num processo separado
+para medir o pico de RSS:
+
+    python src/streaming_text.py data/agnews.csv --repeat 1 10 --ngram 2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+TEXT_COLUMNS = ('Title', 'Description')
+TARGET_COLUMN = 'Class Index'
+CLASSES = np.array([0, 1, 2, 3])
+
+# Dimensão do espaço de hashing (2**20 colunas, ~4 MB de coeficientes por classe em float32)
+DEFAULT_N_FEATURES = 1 << 20
+
+
+def peak_rss_mb():
+    """
+    Pico de memória residente do processo atual, em MB.
+    """
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        if hasattr(info, 'peak_wset'):  # Windows
+            return info.peak_wset / 2 ** 20
+    except ImportError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def is_test_row(row_numbers, test_fraction=0.2, seed=42):
+    """
+    Sorteio determinístico e sem estado de quais linhas ficam no teste.
+    """
+    mixed = (np.asarray(row_numbers, dtype=np.uint64) + np.uint64(seed)) * np.uint64(0x9E3779B97F4A7C15)
+    mixed ^= mixed >> np.uint64(31)
+    return (mixed % np.uint64(10_000)) < np.uint64(int(test_fraction * 10_000))
+
+
+def iter_chunks(path, chunksize=10_000, preprocessor=None):
+    """
+    Gera (número das linhas, textos, rótulos 0-3) bloco a bloco.
+    """
+    usecols = [TARGET_COLUMN, *TEXT_COLUMNS]
+    start = 0
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+        text = chunk[TEXT_COLUMNS[0]].fillna('') + ' ' + chunk[TEXT_COLUMNS[1]].fillna('')
+        texts = preprocessor.transform(text) if preprocessor is not None else text.tolist()
+        rows = np.arange(start, start + len(chunk))
+        start += len(chunk)
+        yield rows, texts, chunk[TARGET_COLUMN].to_numpy() - 1
+
+
+def default_models():
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.naive_bayes import MultinomialNB
+
+    return {
+        'Logistic Regression (SGD)': SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42),
+        'Linear SVM (SGD)': SGDClassifier(loss='hinge', alpha=1e-5, random_state=42),
+        'Multinomial Naive Bayes': MultinomialNB(alpha=0.1),
+    }
+
+
+def scores_from_confusion(cm):
+    """
+    Acurácia e F1 ponderado a partir da matriz de confusão acumulada.
+    """
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    total = cm.sum()
+    return {'accuracy': tp.sum() / total, 'f1_weighted': float((f1 * support).sum() / total)}
+
+
+class StreamingTextClassifier:
+    """
+    HashingVectorizer + modelos com `partial_fit`, treinados bloco a bloco.
+    """
+
+    def __init__(self, models=None, n_features=DEFAULT_N_FEATURES, ngram_range=(1, 1),
+                 preprocessor='default', test_fraction=0.2, classes=CLASSES):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.models = default_models() if models is None else models
+        self.vectorizer = HashingVectorizer(n_features=n_features, ngram_range=ngram_range,
+                                            alternate_sign=False, norm='l2', dtype=np.float32)
+        if preprocessor == 'default':
+            from text_preprocess import TextPreprocessor
+
+            preprocessor = TextPreprocessor(use_lemmatization=True)
+        self.preprocessor = preprocessor
+        self.test_fraction = test_fraction
+        self.classes = np.asarray(classes)
+        self.n_seen = 0
+
+    def partial_fit(self, texts, y):
+        X = self.vectorizer.transform(texts)
+        for model in self.models.values():
+            model.partial_fit(X, y, classes=self.classes)
+        self.n_seen += len(y)
+        return self
+
+    def fit_csv(self, path, chunksize=10_000, epochs=1):
+        """
+        Treina com as linhas de treino do CSV, `epochs` passadas pelo arquivo.
+        """
+        for _ in range(epochs):
+            for rows, texts, y in iter_chunks(path, chunksize, self.preprocessor):
+                train = ~is_test_row(rows, self.test_fraction)
+                if train.any():
+                    self.partial_fit([t for t, keep in zip(texts, train) if keep], y[train])
+        return self
+
+    def evaluate_csv(self, path, chunksize=10_000):
+        """
+        Acurácia e F1 ponderado de cada modelo nas linhas de teste do CSV.
+        """
+        n_classes = len(self.classes)
+        confusion = {name: np.zeros((n_classes, n_classes), dtype=np.int64) for name in self.models}
+        for rows, texts, y in iter_chunks(path, chunksize, self.preprocessor):
+            test = is_test_row(rows, self.test_fraction)
+            if not test.any():
+                continue
+            X = self.vectorizer.transform([t for t, keep in zip(texts, test) if keep])
+            y_true = np.searchsorted(self.classes, y[test])
+            for name, model in self.models.items():
+                y_pred = np.searchsorted(self.classes, model.predict(X))
+                np.add.at(confusion[name], (y_true, y_pred), 1)
+        return {name: scores_from_confusion(cm) for name, cm in confusion.items()}
+
+
+def run_streaming(path, chunksize=10_000, ngram_range=(1, 1), n_features=DEFAULT_N_FEATURES, epochs=1):
+    clf = StreamingTextClassifier(n_features=n_features, ngram_range=ngram_range)
+    clf.fit_csv(path, chunksize, epochs)
+    return clf.evaluate_csv(path, chunksize)
+
+
+def run_in_memory(path, ngram_range=(1, 1), test_fraction=0.2):
+    """
+    Caminho do notebook: corpus inteiro em memória + TfidfVectorizer com
+    vocabulário completo + ajuste em lote (mesma divisão treino/teste).
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, f1_score
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.svm import LinearSVC
+
+    from text_preprocess import TextPreprocessor
+
+    df = pd.read_csv(path)
+    texts = np.array(TextPreprocessor().transform(df['Title'].fillna('') + ' ' + df['Description'].fillna('')),
+                     dtype=object)
+    y = df[TARGET_COLUMN].to_numpy() - 1
+    test = is_test_row(np.arange(len(df)), test_fraction)
+
+    vectorizer = TfidfVectorizer(ngram_range=ngram_range)
+    X_train = vectorizer.fit_transform(texts[~test])
+    X_test = vectorizer.transform(texts[test])
+    models = {
+        'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
+        'Linear SVM': LinearSVC(random_state=42),
+        'Multinomial Naive Bayes': MultinomialNB(alpha=0.1),
+    }
+    results = {}
+    for name, model in models.items():
+        y_pred = model.fit(X_train, y[~test]).predict(X_test)
+        results[name] = {'accuracy': accuracy_score(y[test], y_pred),
+                         'f1_weighted': f1_score(y[test], y_pred, average='weighted')}
+    results['vocabulario'] = len(vectorizer.vocabulary_)
+    return results
+
+
+def replicate_csv(path, repeat, directory):
+    """
+    CSV com o corpus repetido `repeat` vezes, para simular um feed maior.
+    As cópias repetem textos entre treino e teste: serve para medir tempo e
+    memória, não a qualidade dos modelos.
+    """
+    target = os.path.join(directory, f'corpus_x{repeat}.csv')
+    df = pd.read_csv(path)
+    for i in range(repeat):
+        df.to_csv(target, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return target
+
+
+def benchmark(path, repeats=(1, 10), ngram_range=(1, 2), chunksize=10_000):
+    """
+    Roda os dois caminhos em subprocessos (o pico de RSS é por processo) para
+    cada tamanho de corpus e devolve tempo, pico de RSS e métricas.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for repeat in repeats:
+            source = path if repeat == 1 else replicate_csv(path, repeat, tmp)
+            for mode in ('memoria', 'streaming'):
+                cmd = [sys.executable, os.path.abspath(__file__), source, '--mode', mode,
+                       '--ngram', str(ngram_range[1]), '--chunksize', str(chunksize)]
+                out = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                result.update({'repeticoes': repeat, 'modo': mode})
+                rows.append(result)
+    return rows
+
+
+def _run_single(args):
+    ngram_range = (1, args.ngram)
+    start = time.perf_counter()
+    if args.mode == 'streaming':
+        results = run_streaming(args.path, args.chunksize, ngram_range)
+    else:
+        results = run_in_memory(args.path, ngram_range)
+    print(json.dumps({'segundos': time.perf_counter() - start, 'pico_rss_mb': peak_rss_mb(),
+                      'resultados': results}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Treino out-of-core (hashing + partial_fit) vs. TF-IDF em memória.')
+    parser.add_argument('path', help='CSV do AG News (colunas Class Index, Title e Description)')
+    parser.add_argument('--mode', choices=['memoria', 'streaming'], default=None,
+                        help='roda um único caminho e imprime o resultado em JSON')
+    parser.add_argument('--repeat', type=int, nargs='+', default=[1, 10],
+                        help='tamanhos do corpus (em cópias do CSV) no benchmark')
+    parser.add_argument('--ngram', type=int, default=2, help='maior n-grama (1 = só unigramas)')
+    parser.add_argument('--chunksize', type=int, default=10_000)
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_single(args)
+        return
+
+    for row in benchmark(args.path, args.repeat, (1, args.ngram), args.chunksize):
+        print(f"\n{row['modo']} (corpus x{row['repeticoes']}): {row['segundos']:.1f}s, "
+              f"pico de RSS {row['pico_rss_mb']:.0f} MB")
+        for name, metrics in row['resultados'].items():
+            if isinstance(metrics, dict):
+                print(f"  {name:28s} acurácia {metrics['accuracy']:.4f}  F1 {metrics['f1_weighted']:.4f}")
+            else:
+                print(f"  {name:28s} {metrics}")
+
+
+if __name__ == '__main__':
+    main()
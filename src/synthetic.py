@@ -0,0 +1,308 @@
+"""
+Geradores sintéticos (com semente) no esquema dos quatro datasets dos notebooks.
+
+O repositório só traz amostras pequenas (heart.csv ~1k linhas, agnews.csv
+~7.6k) e os CSVs de veículos, IMDb e SSP não são versionados. Para medir como
+cada pipeline escala (src/benchmark_suite.py) os geradores produzem tabelas
+com as mesmas colunas, tipos e formatos dos CSVs originais, em qualquer
+tamanho:
+
+- `vehicles`: colunas do vehicle_price_prediction.csv na mesma ordem
+  (inclusive o espaço no cabeçalho ' make' e `accident_history` vazio em ~1/3
+  das linhas); no CSV original todas as colunas são independentes e
+  uniformes nas faixas abaixo, e o gerador reproduz isso;
+- `news`: Class Index, Title, Description do AG News. Os tokens saem das
+  frequências por classe e por campo do data/agnews.csv (títulos e descrições
+  com os comprimentos empíricos) mais uma cauda Zipf de palavras novas, para
+  o vocabulário crescer com o corpus como num corpus real (lei de Heaps);
+- `heart`: as 14 colunas do heart.csv; por classe do `target`, categóricas
+  com as frequências do arquivo e contínuas de uma normal multivariada com a
+  média e a covariância do arquivo, arredondadas e limitadas às faixas dele;
+- `imdb`: colunas do world_best_movies.csv usadas pelo notebook (mais as que
+  a receita descarta), com listas "A, B" em genre/language/country_origin/
+  writer e orçamento/bilheteria log-normais com faltantes.
+
+As linhas são geradas em blocos de `BLOCK_ROWS`, cada um com a semente
+(semente, número do bloco): a mesma semente dá o mesmo arquivo qualquer que
+seja o tamanho do bloco de escrita, e 10M de linhas não precisam caber na
+memória de uma vez (`write_csv`).
+
+Uso:
+
+    from synthetic import generate, write_csv
+
+    df = generate('vehicles', 100_000, seed=0)
+    write_csv('news', '/tmp/news-1M.csv', 1_000_000, seed=0)
+
+Linha de comando:
+
+    python src/synthetic.py vehicles 1000000 /tmp/vehicles-1M.csv --seed 0
+"""
+
+import argparse
+import functools
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BLOCK_ROWS = 100_000
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+VEHICLE_MAKES = ['Audi', 'BMW', 'Chevrolet', 'Ford', 'Honda', 'Hyundai', 'Kia', 'Land Rover', 'Mercedes',
+                 'Porsche', 'Tesla', 'Toyota']
+VEHICLE_CHOICES = {
+    'model': ['A', 'B', 'C', 'D', 'F-150', 'X5'],
+    'transmission': ['Automatic', 'Manual'],
+    'fuel_type': ['Diesel', 'Electric', 'Gasoline'],
+    'drivetrain': ['AWD', 'FWD', 'RWD'],
+    'body_type': ['Coupe', 'Minivan', 'Pickup', 'SUV', 'Sedan', 'Wagon'],
+    'exterior_color': ['Black', 'Blue', 'Red'],
+    'interior_color': ['Beige', 'Black'],
+    'seller_type': ['Dealer', 'Private'],
+}
+VEHICLE_COLUMNS = [' make', 'model', 'year', 'mileage', 'engine_hp', 'transmission', 'fuel_type', 'drivetrain',
+                   'body_type', 'exterior_color', 'interior_color', 'owner_count', 'mileage_per_year',
+                   'seller_type', 'accident_history', 'brand_popularity', 'price']
+
+HEART_CATEGORICAL = ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal']
+HEART_CONTINUOUS = ['age', 'trestbps', 'chol', 'thalach', 'oldpeak']
+HEART_COLUMNS = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 'thalach', 'exang', 'oldpeak', 'slope',
+                 'ca', 'thal', 'target']
+
+MOVIE_GENRES = ['Drama', 'Comedy', 'Action', 'Crime', 'Adventure', 'Thriller', 'Romance', 'Horror', 'Mystery',
+                'Biography', 'Sci-Fi', 'Fantasy', 'Family', 'Animation', 'History', 'War', 'Music', 'Sport',
+                'Western', 'Musical', 'Documentary']
+MOVIE_LANGUAGES = ['English', 'French', 'Spanish', 'German', 'Italian', 'Japanese', 'Russian', 'Hindi', 'Mandarin',
+                   'Portuguese', 'Korean', 'Arabic', 'Latin', 'Swedish']
+MOVIE_COUNTRIES = ['United States', 'United Kingdom', 'France', 'Germany', 'Canada', 'India', 'Japan', 'Italy',
+                   'Spain', 'Australia', 'Brazil', 'South Korea', 'Mexico', 'China']
+MOVIE_RATINGS = ['R', 'PG-13', 'PG', 'Not Rated', 'G', 'Approved', 'TV-MA', 'Passed']
+
+# Fração dos tokens de notícia tirada da cauda de palavras novas
+NEWS_TAIL_FRACTION = 0.03
+SYLLABLES = np.array(['ka', 'ro', 'mi', 'tu', 'sen', 'la', 'vo', 'qui', 'dra', 'pel', 'no', 'ster', 'ga', 'bri',
+                      'mon', 'te', 'lu', 'fa', 'zor', 'chi', 'ben', 'ax', 'or', 'ul', 'tes', 'mar', 'ni', 'po',
+                      'ric', 'dos', 'ha', 'gel'])
+
+
+def _vehicles_block(rng, start, n_rows, n_total):
+    year = rng.integers(1995, 2026, n_rows)
+    accident = rng.choice(np.array(['Major', 'Minor', None], dtype=object), n_rows)
+    data = {
+        ' make': rng.choice(VEHICLE_MAKES, n_rows),
+        'model': rng.choice(VEHICLE_CHOICES['model'], n_rows),
+        'year': year,
+        'mileage': rng.integers(0, 300_000, n_rows),
+        'engine_hp': rng.integers(70, 600, n_rows),
+    }
+    for column in ['transmission', 'fuel_type', 'drivetrain', 'body_type', 'exterior_color', 'interior_color']:
+        data[column] = rng.choice(VEHICLE_CHOICES[column], n_rows)
+    data['owner_count'] = rng.integers(1, 6, n_rows)
+    data['mileage_per_year'] = rng.uniform(0, 20_000, n_rows)
+    data['seller_type'] = rng.choice(VEHICLE_CHOICES['seller_type'], n_rows)
+    data['accident_history'] = accident
+    data['brand_popularity'] = rng.uniform(0, 1, n_rows)
+    data['price'] = rng.uniform(0, 100_000, n_rows).round(2)
+    return pd.DataFrame(data, columns=VEHICLE_COLUMNS)
+
+
+@functools.lru_cache(maxsize=None)
+def news_model(path=None):
+    """
+    Frequências de token por (classe, campo) e comprimentos empíricos dos
+    campos, estimados do data/agnews.csv.
+    """
+    df = pd.read_csv(path or DATA_DIR / 'agnews.csv')
+    model = {'classes': np.sort(df['Class Index'].unique()), 'fields': {}}
+    for field in ['Title', 'Description']:
+        tokens = df[field].fillna('').str.split()
+        lengths = tokens.str.len().to_numpy()
+        per_class = {}
+        for label in model['classes']:
+            counts = pd.Series([t for row in tokens[df['Class Index'] == label] for t in row]).value_counts()
+            per_class[label] = (counts.index.to_numpy(dtype=object), (counts / counts.sum()).to_numpy())
+        model['fields'][field] = {'lengths': lengths[lengths > 0], 'tokens': per_class}
+    return model
+
+
+def _tail_words(rng, size):
+    # Ranks Zipf -> pseudo-palavras (dígitos do rank na base das sílabas)
+    ranks = rng.zipf(1.3, size)
+    unique, inverse = np.unique(ranks, return_inverse=True)
+    words = []
+    for rank in unique:
+        parts = []
+        while True:
+            rank, digit = divmod(int(rank), len(SYLLABLES))
+            parts.append(SYLLABLES[digit])
+            if rank == 0:
+                break
+        words.append(''.join(parts))
+    return np.array(words, dtype=object)[inverse]
+
+
+def _news_field(rng, labels, field):
+    spec = news_model()['fields'][field]
+    lengths = rng.choice(spec['lengths'], len(labels))
+    out = np.empty(len(labels), dtype=object)
+    for label in np.unique(labels):
+        rows = np.flatnonzero(labels == label)
+        vocabulary, p = spec['tokens'][label]
+        n_tokens = int(lengths[rows].sum())
+        tokens = vocabulary[rng.choice(len(vocabulary), n_tokens, p=p)]
+        tail = rng.random(n_tokens) < NEWS_TAIL_FRACTION
+        tokens[tail] = _tail_words(rng, int(tail.sum()))
+        bounds = np.cumsum(lengths[rows])[:-1]
+        out[rows] = [' '.join(doc) for doc in np.split(tokens, bounds)]
+    return out
+
+
+def _news_block(rng, start, n_rows, n_total):
+    labels = rng.choice(news_model()['classes'], n_rows)
+    return pd.DataFrame({
+        'Class Index': labels,
+        'Title': _news_field(rng, labels, 'Title'),
+        'Description': _news_field(rng, labels, 'Description'),
+    })
+
+
+@functools.lru_cache(maxsize=None)
+def heart_model(path=None):
+    """
+    Por classe do target: prevalência, frequências das categóricas e média/
+    covariância das contínuas do heart.csv.
+    """
+    df = pd.read_csv(path or DATA_DIR / 'heart.csv')
+    model = {'prevalence': df['target'].value_counts(normalize=True).sort_index(), 'classes': {},
+             'bounds': df[HEART_CONTINUOUS].agg(['min', 'max'])}
+    for label, part in df.groupby('target'):
+        model['classes'][label] = {
+            'categorical': {col: part[col].value_counts(normalize=True).sort_index() for col in HEART_CATEGORICAL},
+            'mean': part[HEART_CONTINUOUS].mean().to_numpy(),
+            'cov': part[HEART_CONTINUOUS].cov().to_numpy(),
+        }
+    return model
+
+
+def _heart_block(rng, start, n_rows, n_total):
+    model = heart_model()
+    prevalence = model['prevalence']
+    target = rng.choice(prevalence.index.to_numpy(), n_rows, p=prevalence.to_numpy())
+    data = {col: np.empty(n_rows, dtype=np.int64) for col in HEART_COLUMNS}
+    data['oldpeak'] = np.empty(n_rows)
+    for label, spec in model['classes'].items():
+        rows = np.flatnonzero(target == label)
+        for col, freq in spec['categorical'].items():
+            data[col][rows] = rng.choice(freq.index.to_numpy(), len(rows), p=freq.to_numpy())
+        values = rng.multivariate_normal(spec['mean'], spec['cov'], len(rows))
+        for i, col in enumerate(HEART_CONTINUOUS):
+            low, high = model['bounds'][col]
+            column = values[:, i].clip(low, high)
+            data[col][rows] = column.round(1) if col == 'oldpeak' else column.round()
+    data['target'] = target
+    return pd.DataFrame(data, columns=HEART_COLUMNS)
+
+
+def _lists(rng, pool, n_rows, max_len, p=None):
+    pool = np.asarray(pool, dtype=object)
+    lengths = rng.integers(1, max_len + 1, n_rows)
+    picks = pool[rng.choice(len(pool), (n_rows, max_len), p=p)]
+    return [', '.join(picks[i, :k]) for i, k in enumerate(lengths)]
+
+
+def _with_missing(rng, values, fraction):
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) < fraction] = None
+    return values
+
+
+def _imdb_block(rng, start, n_rows, n_total):
+    ids = np.arange(start, start + n_rows)
+    people = np.array([f'Person {i}' for i in range(max(100, n_total // 20))], dtype=object)
+    genre_weights = 1 / np.arange(1, len(MOVIE_GENRES) + 1)
+    budget = np.exp(rng.normal(16, 1.5, n_rows)).round()
+    budget[rng.random(n_rows) < 0.3] = np.nan
+    gross = (budget * np.exp(rng.normal(0.5, 1.0, n_rows))).round()
+    gross[rng.random(n_rows) < 0.1] = np.nan
+    minutes = rng.normal(115, 20, n_rows).clip(60, 240).astype(int)
+    duration = [f'{m // 60}h {m % 60}m' for m in minutes]
+    return pd.DataFrame({
+        'id': [f'tt{i:08d}' for i in ids],
+        'title': [f'Movie {i}' for i in ids],
+        'year': rng.integers(1960, 2025, n_rows),
+        'duration': _with_missing(rng, duration, 0.01),
+        'rating_mpa': _with_missing(rng, rng.choice(MOVIE_RATINGS, n_rows), 0.05),
+        'rating_imdb': rng.normal(7.5, 0.6, n_rows).clip(1, 10).round(1),
+        'vote': rng.integers(1000, 2_000_000, n_rows),
+        'budget': budget,
+        'gross_world_wide': gross,
+        'director': _with_missing(rng, rng.choice(people, n_rows), 0.01),
+        'writer': _with_missing(rng, _lists(rng, people, n_rows, 3), 0.02),
+        'genre': _with_missing(rng, _lists(rng, MOVIE_GENRES, n_rows, 3, genre_weights / genre_weights.sum()), 0.01),
+        'country_origin': _with_missing(rng, _lists(rng, MOVIE_COUNTRIES, n_rows, 2), 0.01),
+        'filming_location': _with_missing(rng, rng.choice(MOVIE_COUNTRIES, n_rows), 0.1),
+        'production_company': rng.choice(people, n_rows),
+        'language': _with_missing(rng, _lists(rng, MOVIE_LANGUAGES, n_rows, 2), 0.01),
+        'nomination': rng.poisson(1.5, n_rows).astype(float),
+        'link': [f'https://www.imdb.com/title/tt{i:08d}/' for i in ids],
+    })
+
+
+GENERATORS = {
+    'vehicles': _vehicles_block,
+    'news': _news_block,
+    'heart': _heart_block,
+    'imdb': _imdb_block,
+}
+
+
+def iter_blocks(name, n_rows, seed=0, block_rows=BLOCK_ROWS):
+    """
+    Gera o dataset `name` em DataFrames de até `block_rows` linhas.
+    """
+    block = GENERATORS[name]
+    for index, start in enumerate(range(0, n_rows, block_rows)):
+        rng = np.random.default_rng([seed, index])
+        size = min(block_rows, n_rows - start)
+        frame = block(rng, start, size, n_rows)
+        frame.index = pd.RangeIndex(start, start + size)
+        yield frame
+
+
+def generate(name, n_rows, seed=0):
+    return pd.concat(iter_blocks(name, n_rows, seed), copy=False)
+
+
+def write_csv(name, path, n_rows, seed=0):
+    """
+    Escreve o dataset em CSV bloco a bloco (memória de um bloco), de forma
+    atômica. Devolve o caminho.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f'.tmp{os.getpid()}')
+    for i, frame in enumerate(iter_blocks(name, n_rows, seed)):
+        frame.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Datasets sintéticos no esquema dos notebooks.')
+    parser.add_argument('name', choices=sorted(GENERATORS))
+    parser.add_argument('rows', type=int)
+    parser.add_argument('path', help='CSV de saída')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = write_csv(args.name, args.path, args.rows, args.seed)
+    print(f'{args.rows} linhas de {args.name} em {time.perf_counter() - start:.1f}s -> {path} '
+          f'({path.stat().st_size / 2**20:.0f} MB)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+Pré-processamento de texto em lote para o notebook do AG News.
+
+Reproduz exatamente a saída de `preprocess_text_advanced` (notebooks/agnews.ipynb),
+mas pensado para o corpus inteiro:
+
+- as quatro expressões regulares são compiladas uma única vez;
+- a disponibilidade do tokenizador do NLTK é testada uma vez (e não com um
+  try/except por documento);
+- cada token distinto passa uma única vez pelo filtro de stopwords e pelas três
+  chamadas de `lemmatize` (ou pelo stemmer): o resultado fica numa tabela
+  token -> token processado, já que a maioria dos tokens se repete entre
+  documentos;
+- `transform(..., n_jobs=N)` divide o corpus em blocos e processa cada bloco
+  num processo separado.
+
+Uso no notebook:
+
+    from text_preprocess import TextPreprocessor
+
+    preprocessor = TextPreprocessor(stop_words=stop_words, use_lemmatization=True)
+    df['processed_text'] = preprocessor.transform(df['text'], n_jobs=-1)
+
+Benchmark (documentos/s para 1..N processos):
+
+    python src/text_preprocess.py data/agnews.csv
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Stopwords específicas do domínio de notícias (mesmas do notebook)
+ADDITIONAL_STOPWORDS = {
+    'said', 'would', 'could', 'also', 'one', 'two', 'new', 'like',
+    'first', 'last', 'year', 'years', 'time', 'times', 'day', 'days',
+    'week', 'weeks', 'month', 'months', 'according', 'ap', 'reuters',
+    'com', 'www', 'http', 'https', 'html', 'htm'
+}
+
+# Lista usada pelo notebook quando o NLTK não consegue carregar as stopwords
+FALLBACK_STOPWORDS = {
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're", "you've", "you'll", "you'd",
+    'your', 'yours', 'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', "she's", 'her', 'hers',
+    'herself', 'it', "it's", 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves', 'what', 'which',
+    'who', 'whom', 'this', 'that', "that'll", 'these', 'those', 'am', 'is', 'are', 'was', 'were', 'be', 'been',
+    'being', 'have', 'has', 'had', 'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if',
+    'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between',
+    'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down', 'in', 'out',
+    'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why',
+    'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
+    'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', "don't",
+    'should', "should've", 'now', 'd', 'll', 'm', 'o', 're', 've', 'y', 'ain', 'aren', "aren't", 'couldn',
+    "couldn't", 'didn', "didn't", 'doesn', "doesn't", 'hadn', "hadn't", 'hasn', "hasn't", 'haven', "haven't",
+    'isn', "isn't", 'ma', 'mightn', "mightn't", 'mustn', "mustn't", 'needn', "needn't", 'shan', "shan't",
+    'shouldn', "shouldn't", 'wasn', "wasn't", 'weren', "weren't", 'won', "won't", 'wouldn', "wouldn't"
+}
+
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+}
+
+URL_RE = re.compile(r'http\S+|www\S+|https\S+', flags=re.MULTILINE)
+MENTION_RE = re.compile(r'@\w+|#\w+')
+SPECIAL_RE = re.compile(r'[^a-zA-Z\s\-\.\']')
+SPACES_RE = re.compile(r'\s+')
+
+
+def ensure_nltk_resources(quiet=True):
+    """
+    Baixa apenas os recursos do NLTK que ainda não estão instalados.
+    Devolve a lista dos que continuam indisponíveis (ex.: sem rede).
+    """
+    import nltk
+
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            if not nltk.download(name, quiet=quiet):
+                missing.append(name)
+    return missing
+
+
+def load_nltk_components():
+    """
+    (stop_words, stemmer, lemmatizer) com o mesmo fallback do notebook:
+    se o NLTK falhar, stopwords básicas e nenhum stemmer/lematizador.
+    """
+    try:
+        from nltk.corpus import stopwords
+        from nltk.stem import PorterStemmer, WordNetLemmatizer
+
+        stop_words = set(stopwords.words('english'))
+        stemmer = PorterStemmer()
+        lemmatizer = WordNetLemmatizer()
+    except Exception:
+        stop_words = set(FALLBACK_STOPWORDS)
+        stemmer = None
+        lemmatizer = None
+    stop_words.update(ADDITIONAL_STOPWORDS)
+    return stop_words, stemmer, lemmatizer
+
+
+def _resolve_tokenizer():
+    # Mesmo comportamento do try/except do notebook, decidido uma única vez
+    try:
+        from nltk.tokenize import word_tokenize
+
+        word_tokenize('teste de tokenizador.')
+        return word_tokenize, 'word_tokenize'
+    except Exception:
+        return str.split, 'split'
+
+
+def clean_text(text):
+    """
+    Etapas de limpeza por regex de `preprocess_text_advanced`.
+    """
+    text = text.lower()
+    text = URL_RE.sub('', text)
+    text = MENTION_RE.sub('', text)
+    text = SPECIAL_RE.sub(' ', text)
+    return SPACES_RE.sub(' ', text).strip()
+
+
+class TextPreprocessor:
+    """
+    Versão em lote de `preprocess_text_advanced` com memoização de tokens.
+
+    `stop_words=None` carrega as stopwords como o notebook (NLTK + domínio);
+    passe o conjunto do notebook para garantir a mesma configuração.
+    """
+
+    def __init__(self, stop_words=None, use_lemmatization=True):
+        default_stop_words, self.stemmer, self.lemmatizer = load_nltk_components()
+        self.stop_words = frozenset(default_stop_words if stop_words is None else stop_words)
+        self.use_lemmatization = use_lemmatization
+        self.tokenize, self.tokenizer_name = _resolve_tokenizer()
+        self.token_table = {}
+
+    @property
+    def mode(self):
+        if self.use_lemmatization and self.lemmatizer is not None:
+            return 'lemmatize'
+        if self.stemmer is not None:
+            return 'stem'
+        return 'none'
+
+    def config(self):
+        """
+        Parâmetros que determinam a saída (usados como chave de cache).
+        """
+        return {
+            'stop_words': sorted(self.stop_words),
+            'mode': self.mode,
+            'tokenizer': self.tokenizer_name,
+        }
+
+    def fingerprint(self):
+        payload = repr(sorted(self.config().items())).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def _process_token(self, token):
+        if token in self.stop_words or len(token) < 3:
+            return None
+        mode = self.mode
+        if mode == 'lemmatize':
+            token = self.lemmatizer.lemmatize(token, pos='v')
+            token = self.lemmatizer.lemmatize(token, pos='n')
+            return self.lemmatizer.lemmatize(token, pos='a')
+        if mode == 'stem':
+            return self.stemmer.stem(token)
+        return token
+
+    def __call__(self, text):
+        table = self.token_table
+        out = []
+        for token in self.tokenize(clean_text(text)):
+            try:
+                processed = table[token]
+            except KeyError:
+                processed = table[token] = self._process_token(token)
+            if processed is not None:
+                out.append(processed)
+        return ' '.join(out)
+
+    def transform(self, texts, n_jobs=1, chunks_per_job=4):
+        """
+        Processa uma sequência de textos. Com `n_jobs != 1` o corpus é dividido
+        em blocos processados em paralelo (-1 = todos os núcleos).
+        """
+        texts = list(texts)
+        n_jobs = os.cpu_count() if n_jobs in (-1, None) else n_jobs
+        if n_jobs <= 1 or len(texts) < 2 * n_jobs:
+            return [self(text) for text in texts]
+
+        bounds = np.linspace(0, len(texts), n_jobs * chunks_per_job + 1).astype(int)
+        blocks = [texts[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(self.stop_words, self.use_lemmatization),
+        ) as pool:
+            results = pool.map(_process_block, blocks)
+            return [text for block in results for text in block]
+
+
+_worker = None
+
+
+def _init_worker(stop_words, use_lemmatization):
+    global _worker
+    _worker = TextPreprocessor(stop_words=stop_words, use_lemmatization=use_lemmatization)
+
+
+def _process_block(texts):
+    return [_worker(text) for text in texts]
+
+
+def reference_preprocess(text, stop_words, stemmer, lemmatizer, use_lemmatization=True):
+    """
+    Cópia fiel de `preprocess_text_advanced` do notebook, usada para validar a
+    saída e como base de comparação no benchmark.
+    """
+    from nltk.tokenize import word_tokenize
+
+    text = text.lower()
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'@\w+|#\w+', '', text)
+    text = re.sub(r'[^a-zA-Z\s\-\.\']', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    try:
+        tokens = word_tokenize(text)
+    except Exception:
+        tokens = text.split()
+    processed_tokens = []
+    for token in tokens:
+        if token in stop_words or len(token) < 3:
+            continue
+        if use_lemmatization and lemmatizer is not None:
+            processed_token = lemmatizer.lemmatize(token, pos='v')
+            processed_token = lemmatizer.lemmatize(processed_token, pos='n')
+            processed_token = lemmatizer.lemmatize(processed_token, pos='a')
+        elif stemmer is not None:
+            processed_token = stemmer.stem(token)
+        else:
+            processed_token = token
+        processed_tokens.append(processed_token)
+    return ' '.join(processed_tokens)
+
+
+def benchmark(texts, max_workers=None, use_lemmatization=True):
+    """
+    Documentos/s da versão original (um núcleo) e do motor com 1..N processos.
+    Confere que todas as saídas são idênticas à original.
+    """
+    max_workers = max_workers or os.cpu_count()
+    stop_words, stemmer, lemmatizer = load_nltk_components()
+
+    start = time.perf_counter()
+    expected = [reference_preprocess(t, stop_words, stemmer, lemmatizer, use_lemmatization) for t in texts]
+    ref_s = time.perf_counter() - start
+    rows = [{'versao': 'original', 'processos': 1, 'segundos': ref_s, 'docs_por_s': len(texts) / ref_s}]
+
+    for workers in range(1, max_workers + 1):
+        engine = TextPreprocessor(stop_words=stop_words, use_lemmatization=use_lemmatization)
+        start = time.perf_counter()
+        got = engine.transform(texts, n_jobs=workers)
+        elapsed = time.perf_counter() - start
+        if got != expected:
+            raise AssertionError(f'Saída diferente da original com {workers} processo(s)')
+        rows.append({'versao': 'motor', 'processos': workers, 'segundos': elapsed,
+                     'docs_por_s': len(texts) / elapsed})
+    return rows
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Benchmark do pré-processamento de texto do AG News.')
+    parser.add_argument('path', help='CSV do AG News (colunas Title e Description)')
+    parser.add_argument('--workers', type=int, default=None, help='máximo de processos (padrão: núcleos)')
+    parser.add_argument('--repeat', type=int, default=1, help='replica o corpus N vezes')
+    parser.add_argument('--stem', action='store_true', help='usa stemming em vez de lematização')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    texts = (df['Title'] + ' ' + df['Description']).tolist() * args.repeat
+
+    missing = ensure_nltk_resources()
+    if missing:
+        print(f'Recursos do NLTK indisponíveis (usando fallback do notebook): {missing}')
+
+    print(f'{len(texts)} documentos')
+    for row in benchmark(texts, args.workers, use_lemmatization=not args.stem):
+        print(f"{row['versao']:9s} {row['processos']:2d} processo(s): {row['segundos']:7.2f}s "
+              f"{row['docs_por_s']:10.0f} docs/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -57,11 +57,26 @@ from matplotlib import pyplot as plt
 import seaborn as sns
 import numpy as np
 
+from binned_scatter import binned_scatter, draw_binned_scatter
+from compact_dtypes import check_aggregates, optimize_dtypes
+from dataset_cache import VEHICLE_RECIPE, load_dataset
+from dedup import duplicated_rows
+from groupagg import vehicle_tables
+from profiling import Profiler
+from sketches import TableSketch, describe
+from sorted_index import PriceQueries, load_index
+
 pd.set_option('display.max_columns', 20)
 pd.set_option('display.max_rows', None)
 pd.options.display.float_format = '{:.2f}'.format
 
-data = pd.read_csv('../data/vehicle_price_prediction.csv', sep=',')
+# Tempo/memória por célula (no Jupyter) e pelas etapas marcadas com prof.stage (src/profiling.py)
+prof = Profiler('vehicle-notebook', trace_dir='../reports/profiles')
+prof.watch_cells()
+
+# Leitura via cache colunar (o CSV só é convertido na primeira execução)
+with prof.stage('load_dataset'):
+    data = load_dataset('../data/vehicle_price_prediction.csv', sep=',')
 
 print("=== APRESENTAÇÃO DOS DADOS ===")
 print(f"Total de veículos: {len(data)}")
@@ -85,11 +100,15 @@ display(data.head())
 
 
 print("Removendo as colunas:")
-df = data.copy()
-df.columns = df.columns.str.strip()
-df = df.drop(["seller_type", "brand_popularity"], axis=1)
+# Limpeza da receita VEHICLE_RECIPE (src/dataset_cache.py): strip dos nomes, remoção de
+# seller_type/brand_popularity e accident_history vazio -> "N.A"; o resultado também fica em cache
+with prof.stage('load_dataset_limpo'):
+    df = load_dataset('../data/vehicle_price_prediction.csv', VEHICLE_RECIPE, sep=',')
 df.info()
 
+# As mesmas colunas antes do preenchimento, para as verificações de 2.2 e 2.3
+brutos = data.set_axis(data.columns.str.strip(), axis=1)[df.columns]
+
 
 # ## 2.2 Verificação de Dados Faltantes
 # 
@@ -106,7 +125,7 @@ df.info()
 
 
 print("\nDados faltantes por coluna:")
-missing_data = (df.isnull().sum() / len(df) * 100).sort_values(ascending=False)
+missing_data = (brutos.isnull().sum() / len(brutos) * 100).sort_values(ascending=False)
 print(missing_data[missing_data > 0])
 
 
@@ -123,37 +142,69 @@ print(missing_data[missing_data > 0])
 
 
 print("Analisando distribuição do histórico de acidentes:")
-df['accident_history'].value_counts(dropna=False)
+brutos['accident_history'].value_counts(dropna=False)
 
 
 # ### 2.4 Tratamento de Dados Faltantes
 # #### Objetivo
 # Preencher os valores ausentes na coluna `accident_history` e observar possíveis dados faltantes no dataset.
 # #### Método
-# - substituindo os campos 'NAN' por 'N.A'
+# - substituindo os campos 'NAN' por 'N.A' (feito pela receita VEHICLE_RECIPE na carga da seção 2.1)
 # - exibindo a soma dos valores nulos
 
 # In[51]:
 
 
+# accident_history já vem preenchido com "N.A" pela receita
 print("Quantidade de dados faltantes para cada coluna")
-df['accident_history'] = df['accident_history'].fillna("N.A")
 df.isnull().sum()
 
 
+# ### 2.4.1 Otimização dos Tipos de Dados
+# #### Objetivo
+# Reduzir a memória ocupada pelo DataFrame e acelerar os agrupamentos das próximas seções.
+# #### Método
+# - textos com poucos valores distintos (`make`, `fuel_type`, `body_type`, `accident_history`...) viram `category`
+# - inteiros e floats são reduzidos para o menor tipo que não perde valores
+# - todas as agregações usadas no notebook são recalculadas e comparadas com a versão original
+
+# In[52]:
+
+
+with prof.stage('optimize_dtypes'):
+    df_otimizado, relatorio_memoria = optimize_dtypes(df)
+display(relatorio_memoria)
+
+check_aggregates(df, df_otimizado)
+df = df_otimizado
+
+
+# ### 2.4.2 Agregações de Preço
+# #### Objetivo
+# Calcular de uma só vez todas as tabelas de preço usadas nos gráficos das próximas seções (por ano, marca, marca x donos, histórico de acidentes, carroceria e combustível x período), em vez de percorrer o DataFrame inteiro a cada gráfico.
+# #### Método
+# - `vehicle_tables()` (src/groupagg.py): chaves fatoradas uma vez + `np.bincount` por agrupamento
+
+# In[53]:
+
+
+with prof.stage('vehicle_tables'):
+    tabelas = vehicle_tables(df)
+
+
 # ## 2.5 Análise Estatística Descritiva dos Dados Numéricos
 # 
 # ### Objetivo
 # Gerar um resumo estatístico abrangente das variáveis numéricas do dataset para compreender sua distribuição, tendência central e dispersão.
 # 
 # ### Método
-# - método describe()
+# - `describe` de src/sketches.py: contagem, média, desvio, mínimo e máximo exatos e quartis de um sketch KLL numa passada (erro de rank limitado); `exact=True` dá o mesmo resultado de `df.describe()`
 
 # In[36]:
 
 
 print("Describe dos dados numéricos:")
-df.describe()
+describe(df)
 
 
 # ### 2.6 Verificação de Dados Duplicados
@@ -162,13 +213,13 @@ df.describe()
 # Identificar e examinar registros duplicados no dataset que possam distorcer análises estatísticas e modelos preditivos.
 # 
 # #### Método
-# - método duplicated()
+# - hash de 64 bits por linha (src/dedup.py), confirmado contra a primeira ocorrência; mesmo resultado de `df.duplicated()`
 
 # In[37]:
 
 
 print("Verificar dados duplicados")
-df.loc[df.duplicated()]
+df.loc[duplicated_rows(df)]
 
 
 # ### 2.7 Análise de Valores Únicos por Coluna
@@ -192,12 +243,17 @@ df.nunique()
 # Visualizar a distribuição, dispersão e presença de outliers em todas as variáveis numéricas do dataset através de boxplots individuais, permitindo uma análise comparativa rápida das características dos dados.
 # 
 # #### Método
-# - método plot()
+# - estatísticas dos boxplots de um `TableSketch` (src/sketches.py) desenhadas com `ax.bxp`, sem ordenar cada coluna (`exact=True` para os valores exatos)
 
 # In[39]:
 
 
-df.plot(kind='box', figsize=(16,6), subplots=True)
+numeric_sketch = TableSketch.from_frame(df.select_dtypes(include='number'))
+fig, axes = plt.subplots(1, len(numeric_sketch.columns), figsize=(16, 6))
+for ax, col in zip(axes, numeric_sketch.columns):
+    ax.bxp(numeric_sketch.box_stats(col))
+plt.tight_layout()
+plt.show()
 
 
 # ### 3.0 Identificação de Veículos de Alto Valor
@@ -207,11 +263,13 @@ df.plot(kind='box', figsize=(16,6), subplots=True)
 # 
 # #### Método
 # - metodo display como argumento que seguem abaixo
+# - as consultas de preço usam um índice ordenado guardado junto ao cache do dataset (busca binária em vez de percorrer a base)
 
 # In[40]:
 
 
-display(df[df['price'] >= 90000])
+consultas = PriceQueries(df, load_index('../data/vehicle_price_prediction.csv', 'price', sep=','))
+display(consultas.at_least(90000))
 
 
 # ### 3.1 Top 10 Veículos Mais Caros e Mais Baratos do Dataset
@@ -220,20 +278,20 @@ display(df[df['price'] >= 90000])
 # Identificar e analisar os 10 veículos com os maiores preços de venda no dataset, examinando as características que os posicionam no segmento premium do mercado automotivo.
 # 
 # #### Método
-# - método loc() com argumento ascending = False
+# - os 10 maiores preços lidos do fim do índice ordenado (sem ordenar a base inteira)
 
 # In[41]:
 
 
-df.loc[:, ['make','model', 'year', 'mileage', 'price']].sort_values(by='price', ascending = False).head(10)
+consultas.top(10, ['make','model', 'year', 'mileage', 'price'])
 
 
-# - método loc() com argumento ascending = True
+# - os 10 menores preços lidos do começo do índice ordenado
 
 # In[42]:
 
 
-df.loc[:, ['make','model', 'year', 'mileage', 'price']].sort_values(by='price', ascending = True).head(10)
+consultas.bottom(10, ['make','model', 'year', 'mileage', 'price'])
 
 
 # ### 3.2 Distribuição de Veículos por Ano de Fabricação
@@ -270,8 +328,8 @@ ax.set_ylabel('Carros fabricados')
 # In[44]:
 
 
-# Agrupa por ano e calcula a média dos preços
-preco_medio_por_ano = df.groupby('year')['price'].mean().sort_index()
+# Preço médio por ano (calculado em `tabelas`, já ordenado por ano)
+preco_medio_por_ano = tabelas['preco_medio_por_ano']
 
 # Gráfico de barras
 plt.figure(figsize=(12,6))
@@ -332,16 +390,14 @@ plt.show()
 # In[45]:
 
 
-brand_owner_avg = (
-    df.groupby(["make", "owner_count"])["price"]
-    .mean()
-    .reset_index()
-)
+brand_owner_avg = tabelas["preco_marca_donos"].rename("price").reset_index()
 
-brand_avg_price = df.groupby("make")["price"].mean().sort_values(ascending=False)
+brand_avg_price = tabelas["preco_medio_marca"].sort_values(ascending=False)
 
 top_brands = brand_avg_price.head(25).index
 filtered = brand_owner_avg[brand_owner_avg["make"].isin(top_brands)]
+# Remove as marcas fora do top 25 das categorias (senão o seaborn reserva espaço para elas)
+filtered = filtered.assign(make=filtered["make"].cat.remove_unused_categories())
 
 plt.figure(figsize=(16,6))
 sns.barplot(
@@ -400,7 +456,7 @@ plt.show()
 # 
 # ---
 # 
-# *Análise baseada em amostra representativa de 5.000 veículos, utilizando visualização multivariada para capturar interações entre quilometragem, idade e preço, com linha de tendência por regressão linear.*
+# *Análise baseada em todos os veículos, agregados em uma grade de quilometragem x preço com a idade média de cada célula, utilizando visualização multivariada para capturar interações entre quilometragem, idade e preço, com linha de tendência por regressão linear.*
 
 # In[46]:
 
@@ -408,26 +464,17 @@ plt.show()
 current_year = 2025
 df["age"] = current_year - df["year"]
 
-sample_n = min(5000, len(df))
-df_sample = df.sample(sample_n, random_state=42)
-
-plt.figure(figsize=(12,6))
-sns.scatterplot(
-    data=df_sample,
-    x="mileage",
-    y="price",
-    hue="age",
-    palette="RdBu_r",  # Paleta com vermelhos e azuis fortes nas extremidades
-    alpha=0.6
-)
-
-sns.regplot(
-    data=df_sample,
-    x="mileage",
-    y="price",
-    scatter=False,
-    color="black",
-    line_kws={"linewidth": 1}
+# Todas as linhas, agregadas numa grade (quilometragem x preço) colorida pela idade média;
+# a reta de regressão sai das estatísticas suficientes de todas as linhas (src/binned_scatter.py)
+with prof.stage('binned_scatter'):
+    binned = binned_scatter(df["mileage"], df["price"], df["age"])
+
+fig, ax = plt.subplots(figsize=(12,6))
+draw_binned_scatter(
+    ax,
+    binned,
+    cmap="RdBu_r",  # Paleta com vermelhos e azuis fortes nas extremidades
+    color_label="Idade média (anos)"
 )
 
 plt.title("Relação entre Preço, Quilometragem e Idade do Veículo", fontsize=14, weight='bold')
@@ -481,9 +528,9 @@ plt.show()
 # In[47]:
 
 
-accident_price = df.groupby('accident_history')['price'].agg(['mean', 'median', 'count']).reset_index()
+accident_price = tabelas['preco_acidentes'].reset_index()
 
-total_mean = df['price'].mean()
+total_mean = tabelas['preco_total']
 
 plt.figure(figsize=(10, 7))  
 sns.barplot(
@@ -516,15 +563,11 @@ plt.grid(axis='y', linestyle='--', alpha=0.7)
 plt.tight_layout()
 plt.show()
 
-plt.figure(figsize=(10, 6))
-sns.boxplot(
-    data=df,
-    x='accident_history',
-    y='price',
-    hue='accident_history',
-    palette='pastel',
-    showfliers=False 
-    )
+accident_sketch = TableSketch.from_frame(df[['accident_history', 'price']], columns=['price'], by='accident_history')
+fig, ax = plt.subplots(figsize=(10, 6))
+boxes = ax.bxp(accident_sketch.box_stats('price', fliers=False), showfliers=False, patch_artist=True)
+for patch, color in zip(boxes['boxes'], sns.color_palette('pastel')):
+    patch.set_facecolor(color)
 plt.title('Distribuição de Preços por Histórico de Acidentes', fontsize=14, weight='bold')
 plt.xlabel('Histórico de Acidentes', fontsize=12)
 plt.ylabel('Preço (USD)', fontsize=12)
@@ -568,16 +611,12 @@ plt.show()
 # In[48]:
 
 
-# Converter price para numérico
-df['price'] = pd.to_numeric(df['price'], errors='coerce')
-
-# Filtrar não nulos e calcular média por make, top 10
-df_filtered = df.dropna(subset=['price', 'make'])
-mean_prices_make = df_filtered.groupby('make')['price'].mean().sort_values(ascending=False).head(10)
+# Média por make, top 10 (price já convertido e nulos ignorados em `tabelas`)
+mean_prices_make = tabelas['preco_medio_marca'].sort_values(ascending=False).head(10)
 
-# Configurar o plot
+# Configurar o plot (índice como texto para manter a ordem por preço no eixo)
 plt.figure(figsize=(12, 8))
-sns.barplot(x=mean_prices_make.values, y=mean_prices_make.index, palette='Greens_d')
+sns.barplot(x=mean_prices_make.values, y=mean_prices_make.index.astype(str), palette='Greens_d')
 
 # Títulos e rótulos
 plt.title('Top 10 Marcas com Preços Médios Mais Altos em Veículos (EUA, 2000-2025)')
@@ -628,12 +667,8 @@ plt.show()
 # In[49]:
 
 
-# Converter price para numérico
-df['price'] = pd.to_numeric(df['price'], errors='coerce')
-
-# Filtrar não nulos e calcular média por body_type
-df_filtered = df.dropna(subset=['price', 'body_type'])
-mean_prices_body = df_filtered.groupby('body_type')['price'].mean().sort_values(ascending=False)
+# Média por body_type (price já convertido e nulos ignorados em `tabelas`)
+mean_prices_body = tabelas['preco_medio_carroceria'].sort_values(ascending=False)
 
 # Configurar o plot
 plt.figure(figsize=(10, 10))
@@ -687,16 +722,10 @@ plt.show()
 # In[50]:
 
 
-df['year'] = pd.to_numeric(df['year'], errors='coerce')
-df = df[df['year'] >= 2000].dropna(subset=['year', 'price', 'fuel_type'])
-
-bins = np.arange(2000, int(df['year'].max()) + 5, 4)
-labels = [f"{b}-{b+3}" for b in bins[:-1]]
-df['group'] = pd.cut(df['year'], bins=bins, labels=labels, right=False)
-
-
+# Faixas de 4 anos a partir de 2000 (mesmo pd.cut de antes, calculado em `tabelas`)
 plt.figure(figsize=(12, 8))
-data = df.groupby(['fuel_type', 'group'], observed=False)['price'].mean().reset_index()
+data = tabelas['preco_combustivel_periodo'].rename('price').reset_index()
+labels = list(data['group'].cat.categories)
 data['x'] = data['group'].cat.codes
 offset = {'Diesel': -0.1, 'Gasoline': 0.1, 'Electric': 0}
 
@@ -720,3 +749,17 @@ plt.grid(alpha=0.3)
 plt.tight_layout()
 plt.show()
 
+
+# ## Perfil de execução
+# 
+# Tempo, CPU e memória de cada célula e das etapas marcadas (`src/profiling.py`). O trace fica em `reports/profiles/`; para comparar com a execução anterior:
+# 
+# `python src/profiling.py compare reports/profiles vehicle-notebook`
+
+# In[54]:
+
+
+prof.unwatch_cells()
+display(prof.report().sort_values('wall_s', ascending=False).head(15))
+print('Trace salvo em', prof.save())
+
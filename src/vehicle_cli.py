@@ -0,0 +1,347 @@
+"""
+Linha de comando da análise de veículos (tabelas e gráficos do vehicle-notebook.py).
+
+O vehicle-notebook.py é o export do notebook: importa pandas, seaborn,
+matplotlib e IPython.display no topo, chama `display()`, lê um caminho fixo
+(`'../data/vehicle_price_prediction.csv'`), usa `current_year = 2025` e só
+roda do começo ao fim. Aqui:
+
+- cada análise é uma função registrada em `ANALYSES` que recebe um
+  `VehicleRun`; o run carrega o CSV (cache colunar) e calcula os
+  intermediários (DataFrame limpo, tabelas de preço, índice de preço) só
+  quando alguma análise pede;
+- os gráficos são os de `vehicle_report.DRAWERS`, desenhados sem tela e
+  salvos em `--out`; matplotlib/seaborn só são importados quando `--charts`
+  pede algum gráfico, e IPython nunca;
+- aceita vários arquivos (para o cron): cada um tem sua saída e um erro num
+  arquivo não interrompe os demais (código de saída 1 no fim);
+- `--current-year` substitui o 2025 fixo (padrão: o ano corrente);
+- `describe` e os boxplots vêm de sketches de quantis (src/sketches.py):
+  contagem, média, desvio, mínimo e máximo exatos e quartis com erro de rank
+  limitado; `--exact` volta ao cálculo exato do pandas/matplotlib.
+
+Uso:
+
+    python src/vehicle_cli.py data/vehicle_price_prediction.csv
+    python src/vehicle_cli.py data/*.csv --analyses resumo alto_valor mais_caros --json --out reports/cli
+    python src/vehicle_cli.py data/vehicle_price_prediction.csv --analyses resumo \\
+        --charts preco_km_idade top10_marcas --out reports/cli
+
+Tempo de partida (-X importtime) do script do notebook vs. esta CLI:
+
+    python src/vehicle_cli.py data/vehicle_price_prediction.csv --startup-benchmark
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from functools import cached_property
+from pathlib import Path
+
+import pandas as pd
+
+TOP_COLUMNS = ['make', 'model', 'year', 'mileage', 'price']
+
+# Imports do topo do vehicle-notebook.py (célula In[31])
+NOTEBOOK_IMPORTS = ('import pandas, numpy; from IPython.display import display; '
+                    'from matplotlib import pyplot; import seaborn; '
+                    'import binned_scatter, compact_dtypes, dataset_cache, dedup, groupagg, profiling, sorted_index')
+
+# O que uma execução só de estatísticas importa
+CLI_IMPORTS = 'import vehicle_cli, vehicle_report, compact_dtypes, dataset_cache, dedup, groupagg, sorted_index'
+
+
+class VehicleRun:
+    """
+    Um arquivo de entrada e os intermediários das análises, calculados sob
+    demanda e reaproveitados entre elas.
+    """
+
+    def __init__(self, path, current_year=None, threshold=90000, k=10, exact=False):
+        self.path = path
+        self.current_year = current_year or datetime.date.today().year
+        self.threshold = threshold
+        self.k = k
+        self.exact = exact
+
+    @cached_property
+    def raw(self):
+        """
+        CSV com a receita do notebook, menos o preenchimento de nulos (as
+        análises de dados faltantes olham o dado antes dele).
+        """
+        from dataset_cache import VEHICLE_RECIPE, load_dataset
+
+        recipe = {key: value for key, value in VEHICLE_RECIPE.items() if key != 'fillna'}
+        return load_dataset(self.path, recipe=recipe, sep=',')
+
+    @cached_property
+    def _optimized(self):
+        from compact_dtypes import optimize_dtypes
+        from dataset_cache import VEHICLE_RECIPE
+
+        df = self.raw.fillna(VEHICLE_RECIPE['fillna'])
+        return optimize_dtypes(df)
+
+    @property
+    def df(self):
+        return self._optimized[0]
+
+    @cached_property
+    def tabelas(self):
+        from groupagg import vehicle_tables
+
+        return vehicle_tables(self.df)
+
+    @cached_property
+    def consultas(self):
+        from sorted_index import PriceQueries, SortedIndex
+
+        return PriceQueries(self.df, SortedIndex.build(self.df['price']))
+
+
+def resumo(run):
+    data = run.raw
+    return pd.Series({
+        'veiculos': len(data),
+        'colunas': len(data.columns),
+        'ano_min': data['year'].min(),
+        'ano_max': data['year'].max(),
+        'preco_min': data['price'].min(),
+        'preco_max': data['price'].max(),
+    }, dtype=object)
+
+
+def faltantes(run):
+    missing = (run.raw.isnull().sum() / len(run.raw) * 100).sort_values(ascending=False)
+    return missing[missing > 0]
+
+
+def acidentes(run):
+    return run.raw['accident_history'].value_counts(dropna=False)
+
+
+def memoria(run):
+    return run._optimized[1]
+
+
+def describe(run):
+    if run.exact:
+        return run.df.describe()
+    from sketches import describe as sketch_describe
+
+    return sketch_describe(run.df)
+
+
+def duplicatas(run):
+    from dedup import duplicated_rows
+
+    return run.df.loc[duplicated_rows(run.df)]
+
+
+def unicos(run):
+    return run.df.nunique()
+
+
+def alto_valor(run):
+    return run.consultas.at_least(run.threshold)
+
+
+def mais_caros(run):
+    return run.consultas.top(run.k, TOP_COLUMNS)
+
+
+def mais_baratos(run):
+    return run.consultas.bottom(run.k, TOP_COLUMNS)
+
+
+def tabelas(run):
+    return run.tabelas
+
+
+ANALYSES = {
+    'resumo': resumo,
+    'faltantes': faltantes,
+    'acidentes': acidentes,
+    'memoria': memoria,
+    'describe': describe,
+    'duplicatas': duplicatas,
+    'unicos': unicos,
+    'alto_valor': alto_valor,
+    'mais_caros': mais_caros,
+    'mais_baratos': mais_baratos,
+    'tabelas': tabelas,
+}
+
+DEFAULT_ANALYSES = ['resumo', 'faltantes', 'acidentes', 'describe', 'duplicatas', 'unicos',
+                    'alto_valor', 'mais_caros', 'mais_baratos']
+
+
+def _jsonable(result):
+    if isinstance(result, dict):
+        return {str(key): _jsonable(value) for key, value in result.items()}
+    if isinstance(result, pd.DataFrame):
+        return json.loads(result.reset_index().to_json(orient='records', date_format='iso'))
+    if isinstance(result, pd.Series):
+        return json.loads(result.to_json(orient='index', date_format='iso'))
+    return result
+
+
+def _as_text(result):
+    if isinstance(result, dict):
+        return '\n\n'.join(f'--- {key} ---\n{_as_text(value)}' for key, value in result.items())
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.to_string()
+    return str(result)
+
+
+def run_file(path, analyses, charts=(), out=None, as_json=False, current_year=None, threshold=90000, k=10,
+             workers=0, formats=('png',), exact=False):
+    """
+    Roda as análises (e os gráficos, se pedidos) de um arquivo. Devolve
+    {análise: resultado} e os tempos.
+    """
+    run = VehicleRun(path, current_year, threshold, k, exact)
+    results, seconds = {}, {}
+    for name in analyses:
+        start = time.perf_counter()
+        results[name] = ANALYSES[name](run)
+        seconds[name] = time.perf_counter() - start
+
+    target = Path(out) / Path(path).stem if out else None
+    if charts:
+        # Só aqui o matplotlib entra no processo
+        from vehicle_report import render_report
+
+        start = time.perf_counter()
+        render_report(run.df, target or Path('reports') / 'veiculos' / Path(path).stem, formats=formats,
+                      max_workers=workers, verbose=False, names=charts, current_year=run.current_year,
+                      exact=exact)
+        seconds['graficos'] = time.perf_counter() - start
+
+    if as_json or target is not None:
+        payload = {'arquivo': str(path), 'ano_corrente': run.current_year,
+                   'analises': {name: _jsonable(result) for name, result in results.items()},
+                   'segundos': seconds}
+        text = json.dumps(payload, ensure_ascii=False, indent=2, default=str)
+        if target is not None:
+            target.mkdir(parents=True, exist_ok=True)
+            tmp = target / f'analises.json.tmp{os.getpid()}'
+            tmp.write_text(text, encoding='utf-8')
+            os.replace(tmp, target / 'analises.json')
+        if as_json:
+            print(text)
+    else:
+        print(f'##### {path}')
+        for name, result in results.items():
+            print(f'\n=== {name} ({seconds[name]:.2f}s) ===')
+            print(_as_text(result))
+    return results, seconds
+
+
+def _importtime(code, cwd):
+    """
+    Roda `python -X importtime -c code`; devolve o tempo de parede e o tempo
+    próprio (self) somado por pacote raiz (pandas, matplotlib...).
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd,
+                          capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(own) / 1000
+    return wall, packages
+
+
+def _wall(args, cwd):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=cwd, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def startup_benchmark(path, repeats=3, top=8):
+    """
+    Partida do script do notebook (imports do topo) vs. a CLI só com
+    estatísticas, e execuções completas da CLI. Devolve (resumo, pacotes).
+    """
+    src = Path(__file__).resolve().parent
+    path = str(Path(path).resolve())
+    scenarios = {
+        'imports do notebook': NOTEBOOK_IMPORTS,
+        'imports da CLI (estatísticas)': CLI_IMPORTS,
+    }
+    # Aquece o cache colunar e os .pyc antes de medir
+    _wall(['vehicle_cli.py', path, '--analyses', 'resumo'], src)
+
+    rows, breakdown = [], []
+    for label, code in scenarios.items():
+        runs = [_importtime(code, src) for _ in range(repeats)]
+        wall, packages = min(runs, key=lambda run: run[0])
+        rows.append({'cenario': label, 'segundos': wall, 'imports_ms': sum(packages.values())})
+        for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            breakdown.append({'cenario': label, 'pacote': package, 'ms': ms})
+
+    commands = {
+        'CLI --analyses resumo': ['vehicle_cli.py', path, '--analyses', 'resumo'],
+        'CLI análises padrão': ['vehicle_cli.py', path],
+        'CLI resumo + 1 gráfico': ['vehicle_cli.py', path, '--analyses', 'resumo', '--charts', 'top10_marcas',
+                                   '--out', str(Path(os.environ.get('TMPDIR', '/tmp')) / 'vehicle_cli_bench')],
+    }
+    for label, args in commands.items():
+        rows.append({'cenario': label, 'segundos': min(_wall(args, src) for _ in range(repeats)),
+                     'imports_ms': float('nan')})
+    return pd.DataFrame(rows), pd.DataFrame(breakdown)
+
+
+def main(argv=None):
+    from vehicle_report import DRAWERS
+
+    parser = argparse.ArgumentParser(description='Análise de veículos (tabelas e gráficos do notebook).')
+    parser.add_argument('paths', nargs='+', help='um ou mais CSVs no formato do vehicle_price_prediction.csv')
+    parser.add_argument('--analyses', nargs='*', default=DEFAULT_ANALYSES, choices=sorted(ANALYSES),
+                        metavar='ANALISE', help=f'análises a rodar (padrão: {" ".join(DEFAULT_ANALYSES)}; '
+                                                f'disponíveis: {" ".join(ANALYSES)})')
+    parser.add_argument('--charts', nargs='*', default=[], choices=['all'] + list(DRAWERS), metavar='GRAFICO',
+                        help=f'gráficos a salvar ("all" = todos; disponíveis: {" ".join(DRAWERS)})')
+    parser.add_argument('--out', default=None, help='diretório de saída (analises.json e gráficos por arquivo)')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado em JSON')
+    parser.add_argument('--current-year', type=int, default=None, help='ano usado no cálculo da idade')
+    parser.add_argument('--threshold', type=float, default=90000, help='preço mínimo de "alto_valor"')
+    parser.add_argument('-k', type=int, default=10, help='linhas de "mais_caros"/"mais_baratos"')
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    parser.add_argument('--workers', type=int, default=0, help='processos para os gráficos (0 = sem pool)')
+    parser.add_argument('--exact', action='store_true', help='describe e boxplots exatos (sem sketches)')
+    parser.add_argument('--startup-benchmark', action='store_true',
+                        help='mede a partida (-X importtime) do notebook vs. CLI com o primeiro arquivo')
+    args = parser.parse_args(argv)
+
+    if args.startup_benchmark:
+        summary, breakdown = startup_benchmark(args.paths[0])
+        print(summary.to_string(index=False, float_format='{:.3f}'.format))
+        print()
+        print(breakdown.to_string(index=False, float_format='{:.1f}'.format))
+        return 0
+
+    charts = list(DRAWERS) if 'all' in args.charts else args.charts
+    failed = 0
+    for path in args.paths:
+        try:
+            run_file(path, args.analyses, charts, args.out, args.json, args.current_year, args.threshold, args.k,
+                     args.workers, args.formats, args.exact)
+        except Exception as exc:
+            failed += 1
+            print(f'{path}: {type(exc).__name__}: {exc}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+Relatório headless (backend Agg) com os gráficos do vehicle-notebook.py.
+
+O script do notebook desenha os gráficos um depois do outro com `plt.show()`
+e cada gráfico recalcula o que precisa sobre o DataFrame inteiro (o boxplot
+por acidentes percorre todas as linhas, o `regplot` faz bootstrap do
+intervalo de confiança...). Para gerar o relatório de muitas fatias do
+dataset (por tipo de vendedor, carroceria, combustível...):
+
+1. `chart_data` calcula de uma vez, no processo principal, tudo o que os
+   gráficos usam: as tabelas de `groupagg.vehicle_tables`, as contagens por
+   ano, as estatísticas dos boxplots (quartis e bigodes dos sketches de
+   src/sketches.py, numa passada e sem ordenar as colunas; `exact=True` usa
+   todos os valores, como o matplotlib) e a
+   grade agregada do gráfico de dispersão com a reta de regressão de todas
+   as linhas (`binned_scatter`), no lugar da amostra + bootstrap do regplot;
+2. cada figura vira uma tarefa num `ProcessPoolExecutor` cujos processos
+   importam matplotlib/seaborn uma vez só; a tarefa recebe apenas os dados
+   agregados da figura, desenha, salva PNG/SVG e mede o próprio tempo;
+3. cada fatia ganha um `index.html` com as figuras e os tempos, e o diretório
+   de saída um `index.html` com as fatias e um `timings.json`.
+
+matplotlib/seaborn só são importados quando uma figura é desenhada (ou
+`render_figure` é chamado): importar este módulo para `load_vehicles` ou
+`chart_data` não paga a partida do matplotlib (ver src/vehicle_cli.py).
+
+Uso:
+
+    from vehicle_report import load_vehicles, render_report
+
+    df = load_vehicles('../data/vehicle_price_prediction.csv', keep=['seller_type'])
+    render_report(df, '../reports/veiculos', by='seller_type', max_workers=4)
+
+Linha de comando (relatório geral + uma fatia por tipo de vendedor):
+
+    python src/vehicle_report.py data/vehicle_price_prediction.csv --out reports/veiculos --by seller_type
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from binned_scatter import binned_scatter, draw_binned_scatter
+from groupagg import vehicle_tables
+from sketches import TableSketch
+
+CURRENT_YEAR = 2025
+DEFAULT_FORMATS = ('png', 'svg')
+
+
+def load_vehicles(path, keep=()):
+    """
+    Dataset de veículos com a limpeza do notebook (cache colunar + dtypes
+    compactos). `keep` mantém colunas que a receita descarta (ex.: seller_type,
+    útil para fatiar o relatório).
+    """
+    from compact_dtypes import optimize_dtypes
+    from dataset_cache import VEHICLE_RECIPE, load_dataset
+
+    recipe = dict(VEHICLE_RECIPE, drop=[col for col in VEHICLE_RECIPE['drop'] if col not in keep])
+    df = load_dataset(path, recipe=recipe, sep=',')
+    df, _ = optimize_dtypes(df)
+    return df
+
+
+def chart_data(df, names=None, current_year=CURRENT_YEAR, exact=False):
+    """
+    Dados das figuras do relatório (todas, ou só as de `names`):
+    {nome: (título, dados)}. Os boxplots vêm de sketches de quantis
+    (`exact=True`: quartis, bigodes e outliers exatos).
+    """
+    want = set(DRAWERS if names is None else names)
+    unknown = want - set(DRAWERS)
+    if unknown:
+        raise ValueError(f'figuras desconhecidas: {sorted(unknown)}')
+    tables_needed = want - {'carros_por_ano', 'preco_km_idade', 'boxplot_acidentes', 'boxplots_numericos'}
+    tabelas = vehicle_tables(df) if tables_needed else None
+    data = {}
+
+    if 'carros_por_ano' in want:
+        data['carros_por_ano'] = ('Carros fabricados por ano', df['year'].value_counts().sort_index())
+    if 'preco_medio_por_ano' in want:
+        data['preco_medio_por_ano'] = ('Preço Médio por Ano do Veículo', tabelas['preco_medio_por_ano'])
+
+    if 'preco_marca_donos' in want:
+        brand_owner_avg = tabelas['preco_marca_donos'].rename('price').reset_index()
+        top_brands = tabelas['preco_medio_marca'].sort_values(ascending=False).head(25).index
+        filtered = brand_owner_avg[brand_owner_avg['make'].isin(top_brands)]
+        if isinstance(filtered['make'].dtype, pd.CategoricalDtype):
+            filtered = filtered.assign(make=filtered['make'].cat.remove_unused_categories())
+        data['preco_marca_donos'] = ('Preço médio por número de donos nas 25 marcas', filtered)
+
+    if 'preco_km_idade' in want:
+        age = current_year - pd.to_numeric(df['year'], errors='coerce')
+        data['preco_km_idade'] = ('Relação entre Preço, Quilometragem e Idade do Veículo',
+                                  binned_scatter(df['mileage'], df['price'], age))
+
+    if 'preco_acidentes' in want:
+        data['preco_acidentes'] = ('Impacto do Histórico de Acidentes no Preço dos Veículos',
+                                   {'table': tabelas['preco_acidentes'].reset_index(),
+                                    'total': tabelas['preco_total']})
+
+    if 'boxplot_acidentes' in want:
+        sketch = TableSketch.from_frame(df[['accident_history', 'price']], columns=['price'], by='accident_history',
+                                        exact=exact)
+        data['boxplot_acidentes'] = ('Distribuição de Preços por Histórico de Acidentes',
+                                     sketch.box_stats('price', fliers=False))
+
+    if 'top10_marcas' in want:
+        data['top10_marcas'] = ('Top 10 Marcas com Preços Médios Mais Altos em Veículos (EUA, 2000-2025)',
+                                tabelas['preco_medio_marca'].sort_values(ascending=False).head(10))
+    if 'preco_carroceria' in want:
+        data['preco_carroceria'] = ('Tipos de Carroceria com Preços Médios Mais Altos (EUA, 2010-2025)',
+                                    tabelas['preco_medio_carroceria'].sort_values(ascending=False))
+    if 'preco_combustivel_periodo' in want:
+        data['preco_combustivel_periodo'] = ('Evolução do Preço Médio por Combustível (4 em 4 anos)',
+                                             tabelas['preco_combustivel_periodo'].rename('price').reset_index())
+
+    if 'boxplots_numericos' in want:
+        sketch = TableSketch.from_frame(df.select_dtypes(include='number'), exact=exact)
+        data['boxplots_numericos'] = ('Boxplots das colunas numéricas',
+                                      [stats for col in sketch.columns for stats in sketch.box_stats(col)])
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Desenho de cada figura (roda nos processos do pool)
+# ---------------------------------------------------------------------------
+
+def _draw_carros_por_ano(plt, sns, title, counts):
+    fig = plt.figure()
+    ax = counts.plot(kind='bar')
+    ax.set_xlabel('Ano de fabricação')
+    ax.set_ylabel('Carros fabricados')
+    ax.set_title(title)
+    return fig
+
+
+def _draw_preco_medio_por_ano(plt, sns, title, means):
+    fig = plt.figure(figsize=(12, 6))
+    plt.bar(means.index, means.values, color='skyblue')
+    plt.title(title, fontsize=14)
+    plt.xlabel('Ano do Veículo')
+    plt.ylabel('Preço Médio (USD)')
+    plt.xticks(rotation=45)
+    return fig
+
+
+def _draw_preco_marca_donos(plt, sns, title, filtered):
+    fig = plt.figure(figsize=(16, 6))
+    sns.barplot(data=filtered, x='make', y='price', hue='owner_count', palette='viridis', errorbar=None)
+    plt.title(title, fontsize=14, weight='bold')
+    plt.xlabel('Marca', fontsize=12)
+    plt.ylabel('Preço Médio (USD)', fontsize=12)
+    plt.legend(title='Nº de Donos', bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.xticks(rotation=45)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig
+
+
+def _draw_preco_km_idade(plt, sns, title, binned):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    draw_binned_scatter(ax, binned, cmap='RdBu_r')
+    plt.title(title, fontsize=14, weight='bold')
+    plt.xlabel('Quilometragem', fontsize=12)
+    plt.ylabel('Preço (USD)', fontsize=12)
+    plt.grid(axis='both', linestyle='--', alpha=0.5)
+    return fig
+
+
+def _draw_preco_acidentes(plt, sns, title, data):
+    accident_price, total_mean = data['table'], data['total']
+    fig = plt.figure(figsize=(10, 7))
+    sns.barplot(data=accident_price, x='accident_history', y='mean', hue='accident_history', palette='viridis',
+                errorbar=None)
+    plt.title(title, fontsize=14, weight='bold', pad=20)
+    plt.xlabel('Histórico de Acidentes', fontsize=12)
+    plt.ylabel('Preço Médio (USD)', fontsize=12)
+    max_price = accident_price['mean'].max()
+    for i, row in accident_price.iterrows():
+        diff_percent = ((row['mean'] - total_mean) / total_mean) * 100
+        plt.text(i, row['mean'] + (max_price * 0.02), f'${row["mean"]:,.0f}\n({diff_percent:+.1f}%)',
+                 ha='center', va='bottom', fontweight='bold')
+    plt.axhline(y=total_mean, color='red', linestyle='--', alpha=0.7, linewidth=2,
+                label=f'Média Geral: ${total_mean:,.0f}')
+    plt.legend()
+    plt.ylim(0, max_price * 1.15)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig
+
+
+def _draw_boxplot_acidentes(plt, sns, title, stats):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    boxes = ax.bxp(stats, showfliers=False, patch_artist=True)
+    for patch, color in zip(boxes['boxes'], sns.color_palette('pastel', len(stats))):
+        patch.set_facecolor(color)
+    ax.set_title(title, fontsize=14, weight='bold')
+    ax.set_xlabel('Histórico de Acidentes', fontsize=12)
+    ax.set_ylabel('Preço (USD)', fontsize=12)
+    ax.tick_params(axis='x', rotation=45)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig
+
+
+def _draw_top10_marcas(plt, sns, title, means):
+    fig = plt.figure(figsize=(12, 8))
+    labels = means.index.astype(str)
+    sns.barplot(x=means.values, y=labels, hue=labels, palette='Greens_d', legend=False)
+    plt.title(title)
+    plt.suptitle('Análise para estratégias de branding e investimento.')
+    plt.xlabel('Preço Médio (em USD)')
+    plt.ylabel('Marca')
+    plt.grid(axis='x')
+    return fig
+
+
+def _draw_preco_carroceria(plt, sns, title, means):
+    fig = plt.figure(figsize=(10, 10))
+    plt.pie(means.values, labels=means.index, autopct='%1.1f%%',
+            colors=plt.cm.viridis(np.linspace(0, 1, len(means))), startangle=90)
+    plt.title(title)
+    plt.suptitle('Análise para tendências de demanda por versatilidade.')
+    plt.legend([f'{body} ({price:.2f} USD)' for body, price in zip(means.index, means.values)],
+               title='Tipo de Carroceria (Preço Médio)', loc='center left', bbox_to_anchor=(1, 0.5))
+    return fig
+
+
+def _draw_preco_combustivel_periodo(plt, sns, title, data):
+    fig = plt.figure(figsize=(12, 8))
+    labels = list(data['group'].cat.categories)
+    data = data.assign(x=data['group'].cat.codes)
+    offset = {'Diesel': -0.1, 'Gasoline': 0.1, 'Electric': 0}
+    colors = {'Diesel': 'black', 'Gasoline': 'blue', 'Electric': 'red'}
+    for fuel in data['fuel_type'].unique():
+        d = data[data['fuel_type'] == fuel]
+        plt.plot(d['x'] + offset.get(fuel, 0), d['price'], 'o-', ms=10, lw=3, label=fuel,
+                 color=colors.get(fuel), markeredgecolor='white', markeredgewidth=1.5)
+        for _, r in d.dropna(subset=['price']).iterrows():
+            plt.annotate(f'${r.price:,.0f}', (r.x + offset.get(fuel, 0), r.price),
+                         xytext=(5, 5), textcoords='offset points', fontsize=9, fontweight='bold',
+                         bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.8))
+    plt.xticks(range(len(labels)), labels, rotation=45)
+    plt.title(title, fontweight='bold')
+    plt.xlabel('Faixa de Ano')
+    plt.ylabel('Preço Médio (USD)')
+    plt.legend(title='Combustível')
+    plt.grid(alpha=0.3)
+    return fig
+
+
+def _draw_boxplots_numericos(plt, sns, title, stats):
+    fig, axes = plt.subplots(1, len(stats), figsize=(16, 6), squeeze=False)
+    for ax, column_stats in zip(axes[0], stats):
+        ax.bxp([column_stats])
+    fig.suptitle(title)
+    return fig
+
+
+DRAWERS = {
+    'carros_por_ano': _draw_carros_por_ano,
+    'preco_medio_por_ano': _draw_preco_medio_por_ano,
+    'preco_marca_donos': _draw_preco_marca_donos,
+    'preco_km_idade': _draw_preco_km_idade,
+    'preco_acidentes': _draw_preco_acidentes,
+    'boxplot_acidentes': _draw_boxplot_acidentes,
+    'top10_marcas': _draw_top10_marcas,
+    'preco_carroceria': _draw_preco_carroceria,
+    'preco_combustivel_periodo': _draw_preco_combustivel_periodo,
+    'boxplots_numericos': _draw_boxplots_numericos,
+}
+
+
+def _init_worker():
+    # Importa matplotlib/seaborn uma vez por processo, não uma vez por figura
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import seaborn  # noqa: F401
+    from matplotlib import pyplot  # noqa: F401
+
+
+def render_figure(name, title, payload, out_base, formats=DEFAULT_FORMATS, dpi=100):
+    """
+    Desenha uma figura e salva em `<out_base>.<formato>`. Devolve o tempo gasto.
+    """
+    _init_worker()
+    import seaborn as sns
+    from matplotlib import pyplot as plt
+
+    start = time.perf_counter()
+    fig = DRAWERS[name](plt, sns, title, payload)
+    fig.tight_layout()
+    files = []
+    for fmt in formats:
+        path = f'{out_base}.{fmt}'
+        fig.savefig(path, dpi=dpi)
+        files.append(os.path.basename(path))
+    plt.close(fig)
+    return {'figura': name, 'titulo': title, 'arquivos': files, 'segundos': time.perf_counter() - start}
+
+
+def _slug(value):
+    slug = re.sub(r'[^0-9A-Za-z._-]+', '_', str(value)).strip('_')
+    return slug or 'vazio'
+
+
+def _write_html(path, title, summary, figures, links=()):
+    parts = [
+        '<!DOCTYPE html>',
+        '<html lang="pt-br"><head><meta charset="utf-8">',
+        f'<title>{html.escape(title)}</title>',
+        '<style>body{font-family:sans-serif;margin:2em;max-width:1200px}'
+        'figure{margin:2em 0}img{max-width:100%;border:1px solid #ddd}'
+        'figcaption{color:#555}table{border-collapse:collapse}td,th{padding:4px 12px;text-align:left}</style>',
+        '</head><body>',
+        f'<h1>{html.escape(title)}</h1>',
+        f'<p>{html.escape(summary)}</p>',
+    ]
+    if links:
+        parts.append('<ul>')
+        parts += [f'<li><a href="{html.escape(href)}">{html.escape(text)}</a></li>' for href, text in links]
+        parts.append('</ul>')
+    for fig in figures:
+        image = next((f for f in fig['arquivos'] if f.endswith('.png')), fig['arquivos'][0])
+        others = ' '.join(f'<a href="{html.escape(f)}">{f.rsplit(".", 1)[-1].upper()}</a>'
+                          for f in fig['arquivos'])
+        parts.append(f'<figure><img src="{html.escape(image)}" alt="{html.escape(fig["titulo"])}">'
+                     f'<figcaption>{html.escape(fig["titulo"])} ({fig["segundos"]:.2f} s) {others}'
+                     f'</figcaption></figure>')
+    parts.append('</body></html>')
+    Path(path).write_text('\n'.join(parts), encoding='utf-8')
+
+
+def render_report(df, out_dir, by=None, formats=DEFAULT_FORMATS, max_workers=None, dpi=100, verbose=True,
+                  names=None, current_year=CURRENT_YEAR, exact=False):
+    """
+    Gera o relatório do DataFrame inteiro e, com `by`, um por valor da coluna.
+    `names` restringe as figuras; `max_workers=0` desenha tudo no processo
+    atual (sem pool).
+    Devolve os tempos: dados por fatia, cada figura e total.
+    """
+    total_start = time.perf_counter()
+    out_dir = Path(out_dir)
+    slices = [('geral', 'Todos os veículos', np.ones(len(df), dtype=bool))]
+    if by is not None:
+        for value in pd.unique(df[by].dropna()):
+            slices.append((f'{by}={_slug(value)}', f'{by} = {value}', (df[by] == value).to_numpy()))
+
+    jobs = []
+    data_seconds = {}
+    sizes = {}
+    for key, _, mask in slices:
+        start = time.perf_counter()
+        part = df if mask.all() else df[mask]
+        figures = chart_data(part, names, current_year, exact)
+        data_seconds[key] = time.perf_counter() - start
+        sizes[key] = len(part)
+        (out_dir / key).mkdir(parents=True, exist_ok=True)
+        for name, (title, payload) in figures.items():
+            jobs.append((key, name, title, payload, str(out_dir / key / name)))
+
+    results = {key: [] for key, _, _ in slices}
+
+    def _done(key, result):
+        results[key].append(result)
+        if verbose:
+            print(f"  {key:30s} {result['figura']:28s} {result['segundos']:6.2f}s")
+
+    if max_workers == 0:
+        _init_worker()
+        for key, name, title, payload, base in jobs:
+            _done(key, render_figure(name, title, payload, base, formats, dpi))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(render_figure, name, title, payload, base, formats, dpi): key
+                       for key, name, title, payload, base in jobs}
+            for future in as_completed(futures):
+                _done(futures[future], future.result())
+
+    order = list(DRAWERS)
+    for key, label, _ in slices:
+        results[key].sort(key=lambda r: order.index(r['figura']))
+        render_s = sum(r['segundos'] for r in results[key])
+        _write_html(out_dir / key / 'index.html', f'Relatório de veículos: {label}',
+                    f'{sizes[key]} veículos; dados em {data_seconds[key]:.2f}s, '
+                    f'figuras em {render_s:.2f}s (soma dos tempos de desenho).', results[key])
+
+    total = time.perf_counter() - total_start
+    timings = {
+        'total_s': total,
+        'fatias': {key: {'linhas': sizes[key], 'dados_s': data_seconds[key], 'figuras': results[key]}
+                   for key, _, _ in slices},
+    }
+    (out_dir / 'timings.json').write_text(json.dumps(timings, indent=2, ensure_ascii=False), encoding='utf-8')
+    _write_html(out_dir / 'index.html', 'Relatórios de veículos',
+                f'{len(slices)} relatório(s), {len(jobs)} figuras em {total:.1f}s.', [],
+                links=[(f'{key}/index.html', f'{label} ({sizes[key]} veículos)') for key, label, _ in slices])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatório headless dos gráficos do notebook de veículos.')
+    parser.add_argument('path', help='vehicle_price_prediction.csv')
+    parser.add_argument('--out', default='reports/veiculos', help='diretório de saída')
+    parser.add_argument('--by', default=None, help='coluna para gerar um relatório por valor (ex.: seller_type)')
+    parser.add_argument('--formats', nargs='+', default=list(DEFAULT_FORMATS), choices=['png', 'svg', 'pdf'])
+    parser.add_argument('--workers', type=int, default=None, help='processos do pool (0 = sem pool)')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--exact', action='store_true', help='boxplots com todos os valores (sem sketches)')
+    args = parser.parse_args()
+
+    df = load_vehicles(args.path, keep=[args.by] if args.by else ())
+    timings = render_report(df, args.out, by=args.by, formats=args.formats, max_workers=args.workers, dpi=args.dpi,
+                            exact=args.exact)
+    n_figures = sum(len(s['figuras']) for s in timings['fatias'].values())
+    print(f"{n_figures} figuras em {timings['total_s']:.1f}s -> {Path(args.out) / 'index.html'}")
+
+
+if __name__ == '__main__':
+    main()